@@ -0,0 +1,230 @@
+from __future__ import annotations
+import argparse
+import json
+import multiprocessing as mp
+import platform
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Tuple
+import numpy as np
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+BENCH_DIR = PROJECT_ROOT / "reports" / "benchmarks"
+# Quick default. The full 1e3-1e7 scaling run takes tens of minutes and several GB:
+#   python -m src.benchmarks.run_benchmarks --sizes 1000 10000 100000 1000000 10000000
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+MAX_EXPERT_CASES = 10_000  # the mocked expert path is per-case Python; cap it at large sizes
+
+
+class _MockExpertClient:
+    """Sync, zero-latency stand-in for ``OpenAI`` so call_gpt_batch is timed without network."""
+
+    def __init__(self):
+        reply = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(
+            content='{"prediction": 1, "confidence": 0.8, "rationale_1_sentence": "Mock."}'))])
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=lambda **kw: reply))
+
+
+def _fitted_pipe(seed: int):
+    from src.benchmarks.synthetic import make_synthetic
+    from src.models.baseline import train_logreg
+    return train_logreg(make_synthetic(10_000, seed + 1))
+
+
+# Each setup builds its inputs (untimed) and returns (callable to time, rows it processes).
+def _setup_train_logreg(n, seed):
+    from src.benchmarks.synthetic import make_synthetic
+    from src.models.baseline import train_logreg
+    df = make_synthetic(n, seed)
+    return (lambda: train_logreg(df)), n
+
+def _setup_evaluate(n, seed):
+    from src.benchmarks.synthetic import make_synthetic
+    from src.models.baseline import evaluate
+    df, pipe = make_synthetic(n, seed), _fitted_pipe(seed)
+    return (lambda: evaluate(pipe, df)), n
+
+def _setup_calibrate_threshold(n, seed):
+    from src.benchmarks.synthetic import make_synthetic
+    from src.models.conformal_prediction import calibrate_threshold
+    df, pipe = make_synthetic(n, seed), _fitted_pipe(seed)
+    return (lambda: calibrate_threshold(pipe, df, 0.1)), n
+
+def _setup_cp_partition(n, seed):
+    from src.benchmarks.synthetic import make_synthetic
+    from src.models.conformal_prediction import cp_partition
+    df, pipe = make_synthetic(n, seed), _fitted_pipe(seed)
+    return (lambda: cp_partition(pipe, df, 0.3)), n
+
+def _setup_cp_sweep(n, seed):
+    from src.benchmarks.synthetic import make_synthetic
+    from src.models.conformal_prediction import cp_sweep
+    calib, test, pipe = make_synthetic(n, seed), make_synthetic(n, seed + 2), _fitted_pipe(seed)
+    alphas = np.linspace(0.01, 0.5, 100)
+    return (lambda: cp_sweep(pipe, calib, test, alphas)), 2 * n
+
+def _setup_bootstrap_baseline(n, seed):
+    from src.evaluation.bootstrap_baseline import bootstrap_baseline
+    rng = np.random.default_rng(seed)
+    y = rng.integers(0, 2, n)
+    p = np.clip(0.3 * y + 0.7 * rng.random(n), 0, 1)
+    return (lambda: bootstrap_baseline(y, p, n_boot=200)), 200 * n
+
+def _setup_bootstrap_sensitivity_ci(n, seed):
+    from src.models.expert_integration import bootstrap_sensitivity_ci
+    rng = np.random.default_rng(seed)
+    y = rng.integers(0, 2, n)
+    preds = (rng.random((5, n)) < 0.8).astype(int)
+    return (lambda: bootstrap_sensitivity_ci(preds, y, n_boot=1000)), 1000 * n
+
+def _setup_call_gpt_batch(n, seed):
+    from src.benchmarks.synthetic import make_synthetic
+    from src.models.expert_integration import call_gpt_batch, format_case_cards
+    m = min(n, MAX_EXPERT_CASES)
+    cards = format_case_cards(make_synthetic(m, seed), cache=None)
+    client = _MockExpertClient()
+    return (lambda: call_gpt_batch(client, "mock", cards, fewshot_block="")), m
+
+def _setup_format_case_cards(n, seed):
+    from src.benchmarks.synthetic import make_synthetic
+    from src.models.expert_integration import format_case_cards
+    df = make_synthetic(n, seed)
+    return (lambda: format_case_cards(df, cache=None)), n
+
+
+BENCHMARKS: Dict[str, Callable[[int, int], Tuple[Callable, int]]] = {
+    "train_logreg": _setup_train_logreg,
+    "evaluate": _setup_evaluate,
+    "calibrate_threshold": _setup_calibrate_threshold,
+    "cp_partition": _setup_cp_partition,
+    "cp_sweep": _setup_cp_sweep,
+    "bootstrap_baseline": _setup_bootstrap_baseline,
+    "bootstrap_sensitivity_ci": _setup_bootstrap_sensitivity_ci,
+    "call_gpt_batch": _setup_call_gpt_batch,
+    "format_case_cards": _setup_format_case_cards,
+}
+
+
+def _peak_rss_mb() -> float | None:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB on Linux
+
+
+def _traced_peak_mb(fn: Callable) -> float:
+    # peak Python/numpy allocations of one call, excluding whatever setup already holds
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    try:
+        fn()
+        return (tracemalloc.get_traced_memory()[1] - base) / 1024**2
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+
+def run_case(name: str, n: int, repeat: int = 3, seed: int = 0) -> Dict:
+    """Median wall time over ``repeat`` calls plus ``peak_mem_mb``, the peak allocation of one
+    separate traced call above the setup's footprint. ``peak_rss_mb`` is the whole process, setup included."""
+    fn, rows = BENCHMARKS[name](n, seed)
+    fn()  # warm-up (imports, caches)
+    peak_mem = _traced_peak_mb(fn)  # own call: tracing slows the timed ones down
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    wall = float(np.median(times))
+    return {"name": name, "n": n, "rows": rows, "repeat": repeat,
+            "wall_s": wall, "wall_min_s": float(min(times)),
+            "rows_per_sec": rows / wall if wall > 0 else None,
+            "peak_mem_mb": peak_mem, "peak_rss_mb": _peak_rss_mb()}
+
+
+def run_benchmarks(names: List[str], sizes: List[int], repeat: int = 3, seed: int = 0,
+                   isolate: bool = True) -> Dict:
+    """Time each (benchmark, size); with ``isolate`` every case runs in a fresh process so peak RSS is its own.
+
+    Memory regressions show up in ``peak_mem_mb``; ``peak_rss_mb`` also counts the synthetic-data setup.
+    """
+    results = []
+    for name in names:
+        for n in sizes:
+            if isolate:
+                with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn")) as ex:
+                    res = ex.submit(run_case, name, n, repeat, seed).result()
+            else:
+                res = run_case(name, n, repeat, seed)
+            print(f"{name:<26} n={n:<10} {res['wall_s']*1000:10.2f} ms  {res['rows_per_sec'] or 0:14.0f} rows/s"
+                  f"  peak_mem={res['peak_mem_mb']:.1f} MB  peak_rss={res['peak_rss_mb'] or float('nan'):.0f} MB")
+            results.append(res)
+    meta = {"python": platform.python_version(), "numpy": np.__version__, "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "seed": seed, "isolated": isolate}
+    return {"meta": meta, "results": results}
+
+
+def compare(current: Dict, baseline: Dict, threshold: float = 0.2) -> List[Dict]:
+    """Cases whose median wall time or traced peak memory grew by more than ``threshold`` (fractional)."""
+    base = {(r["name"], r["n"]): r for r in baseline["results"]}
+    regressions = []
+    for r in current["results"]:
+        b = base.get((r["name"], r["n"]))
+        if b is None:
+            continue
+        for metric in ("wall_s", "peak_mem_mb"):
+            # the memory floor keeps allocator noise on tiny cases from counting
+            floor = 1.0 if metric == "peak_mem_mb" else 0.0
+            old, new = b.get(metric), r.get(metric)
+            if old is None or new is None or old <= 0 or max(old, new) < floor:
+                continue
+            ratio = new / old
+            if ratio > 1.0 + threshold:
+                regressions.append({"name": r["name"], "n": r["n"], "metric": metric, "baseline": old,
+                                    "current": new, "ratio": ratio})
+    return regressions
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark the CP, bootstrap, training and expert hot paths.")
+    ap.add_argument("--bench", nargs="*", default=list(BENCHMARKS), choices=list(BENCHMARKS))
+    ap.add_argument("--sizes", nargs="*", type=int, default=list(DEFAULT_SIZES),
+                    help="rows per case; the full scaling run is --sizes 1000 10000 100000 1000000 10000000")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--no-isolate", action="store_true", help="run all cases in this process")
+    ap.add_argument("--out", type=Path, default=BENCH_DIR / "latest.json")
+    ap.add_argument("--baseline", type=Path, default=BENCH_DIR / "baseline.json")
+    ap.add_argument("--threshold", type=float, default=0.2, help="allowed fractional slowdown")
+    ap.add_argument("--update-baseline", action="store_true")
+    args = ap.parse_args(argv)
+
+    report = run_benchmarks(args.bench, args.sizes, args.repeat, args.seed, isolate=not args.no_isolate)
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    args.out.write_text(json.dumps(report, indent=2))
+    print("Saved results to:", args.out)
+
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2))
+        print("Updated baseline:", args.baseline)
+        return 0
+    if args.baseline.exists():
+        regressions = compare(report, json.loads(args.baseline.read_text()), args.threshold)
+        for r in regressions:
+            print(f"REGRESSION {r['name']} n={r['n']} {r['metric']}: {r['baseline']:.4g} -> {r['current']:.4g} "
+                  f"({r['ratio']:.2f}x)")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+# Per-class (normal, glaucoma) mean / std of ds_whole.csv, rounded.
+_CONT = {
+    "age":              ((51.5, 16.5), (60.5, 13.5)),
+    "ocular_pressure":  ((16.4, 3.4),  (24.1, 9.5)),
+    "MD":               ((-2.0, 2.7),  (-13.2, 11.1)),
+    "PSD":              ((2.2, 0.9),   (7.8, 4.2)),
+    "cornea_thickness": ((547.4, 34.8), (535.5, 31.9)),
+    "RNFL4.mean":       ((105.2, 14.0), (67.2, 20.0)),
+}
+_GHT_P = ((0.70, 0.13, 0.17), (0.09, 0.04, 0.87))
+_POS_RATE = 0.595
+_INT_COLS = ("age", "ocular_pressure", "cornea_thickness")
+
+
+def make_synthetic(n: int, seed: int = 0) -> pd.DataFrame:
+    """Rows with the ds_whole.csv schema and roughly its class-conditional feature distributions."""
+    rng = np.random.default_rng(seed)
+    y = (rng.random(n) < _POS_RATE).astype(int)
+    data = {"RL": np.where(rng.random(n) < 0.5, "OD", "OS"), "glaucoma": y}
+    for col, ((m0, s0), (m1, s1)) in _CONT.items():
+        v = np.where(y == 1, rng.normal(m1, s1, n), rng.normal(m0, s0, n))
+        if col in _INT_COLS:
+            v = np.clip(np.round(v), 1, None).astype(int)
+        elif col == "PSD":
+            v = np.abs(v)
+        data[col] = v
+    u = rng.random(n)
+    c0 = np.where(y == 1, _GHT_P[1][0], _GHT_P[0][0])
+    c1 = c0 + np.where(y == 1, _GHT_P[1][1], _GHT_P[0][1])
+    data["GHT"] = np.where(u < c0, 0, np.where(u < c1, 1, 2))
+    cols = ["RL", "glaucoma", "age", "ocular_pressure", "MD", "PSD", "GHT", "cornea_thickness", "RNFL4.mean"]
+    return pd.DataFrame(data)[cols]
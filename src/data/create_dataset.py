@@ -1,17 +1,28 @@
 from pathlib import Path
 import pandas as pd
 from sklearn.model_selection import train_test_split
+from src.data.patient_groups import GroupIndex, derive_patient_ids
+from src.instrumentation import instrument
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 RAW_CSV = PROJECT_ROOT / "data" / "raw" / "ds_whole.csv"
 PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
 
-def split_and_save(test_size=0.2, calib_size=0.2, random_state=42):
+@instrument
+def split_and_save(test_size=0.2, calib_size=0.2, random_state=42, group_by_patient=False):
     PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
 
     df = pd.read_csv(RAW_CSV)
     y = df["glaucoma"].astype(int)
     X = df.drop(columns=["glaucoma"])
+    if group_by_patient:
+        # keep both eyes (and repeat visits) of a patient in the same split; frames are laid out
+        # as below (features, then glaucoma; original row labels as index)
+        gi = GroupIndex(derive_patient_ids(df), y.values)
+        rows = gi.split(test_size, calib_size, random_state)
+        for name in ("train", "calib", "test"):
+            pd.concat([X.iloc[rows[name]], y.iloc[rows[name]]], axis=1).to_pickle(PROCESSED_DIR / f"{name}.pkl")
+        return
 
     X_train, X_temp, y_train, y_temp = train_test_split(
         X, y,
@@ -0,0 +1,148 @@
+from pathlib import Path
+from functools import lru_cache
+import hashlib
+import json
+from typing import Dict, Iterable, Optional
+import numpy as np
+import pandas as pd
+from src.data.preprocess import CONT_COLS, CAT_COLS
+from src.data.patient_groups import GroupIndex, derive_patient_ids
+from src.instrumentation import instrument
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+RAW_CSV = PROJECT_ROOT / "data" / "raw" / "ds_whole.csv"
+STORE_DIR = PROJECT_ROOT / "data" / "processed" / "store"
+LABEL_COL = "glaucoma"
+MODEL_COLS = CONT_COLS + CAT_COLS + [LABEL_COL]
+SPLITS = ("train", "calib", "test")
+
+
+def _file_hash(path: Path, block: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(block), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _col_file(name: str) -> str:
+    return name.replace("/", "_") + ".npy"
+
+
+@instrument
+def build_store(raw_csv: Path = RAW_CSV, store_dir: Path = STORE_DIR, force: bool = False) -> dict:
+    """Convert the raw CSV once into one typed ``.npy`` per column plus ``manifest.json``.
+
+    String columns are stored as int codes with their categories in the manifest.
+    Skipped when the manifest already records the same CSV hash.
+    """
+    store_dir = Path(store_dir)
+    manifest_path = store_dir / "manifest.json"
+    src_hash = _file_hash(raw_csv)
+    if not force and manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text())
+        if manifest.get("source_sha256") == src_hash:
+            return manifest
+
+    store_dir.mkdir(parents=True, exist_ok=True)
+    df = pd.read_csv(raw_csv)
+    columns = {}
+    for name in df.columns:
+        col = df[name]
+        entry = {"file": _col_file(name)}
+        if pd.api.types.is_numeric_dtype(col):
+            arr = col.to_numpy()
+        else:
+            cat = pd.Categorical(col)
+            cats = list(cat.categories)
+            code_dtype = np.int8 if len(cats) < 127 else np.int32
+            arr = cat.codes.astype(code_dtype)
+            entry["categories"] = cats
+        entry["dtype"] = str(arr.dtype)
+        np.save(store_dir / entry["file"], arr)
+        columns[name] = entry
+
+    manifest = {"source": str(raw_csv), "source_sha256": src_hash, "n_rows": int(len(df)), "columns": columns}
+    manifest_path.write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def load_manifest(store_dir: Path = STORE_DIR) -> dict:
+    return json.loads((Path(store_dir) / "manifest.json").read_text())
+
+
+def load_columns(cols: Iterable[str] = MODEL_COLS, store_dir: Path = STORE_DIR) -> Dict[str, np.ndarray]:
+    """Memory-map the requested columns (raw stored arrays; categoricals stay as codes)."""
+    store_dir = Path(store_dir)
+    manifest = load_manifest(store_dir)
+    return {c: np.load(store_dir / manifest["columns"][c]["file"], mmap_mode="r") for c in cols}
+
+
+@lru_cache(maxsize=8)
+def _patient_index(store_dir: str, source_sha256: str) -> GroupIndex:
+    # built once per store version and reused across seeds
+    cols = load_split("all", cols=["RL", "age", "cornea_thickness", LABEL_COL], store_dir=Path(store_dir),
+                      rows=np.arange(load_manifest(store_dir)["n_rows"]))
+    return GroupIndex(derive_patient_ids(cols), cols[LABEL_COL].to_numpy())
+
+
+@instrument
+def split_indices(test_size=0.2, calib_size=0.2, random_state=42, store_dir: Path = STORE_DIR,
+                  group_by_patient: bool = False) -> Dict[str, np.ndarray]:
+    if group_by_patient:
+        gi = _patient_index(str(store_dir), load_manifest(store_dir)["source_sha256"])
+        return gi.split(test_size, calib_size, random_state)
+    from sklearn.model_selection import train_test_split
+    # Same two-stage stratified split as split_and_save, done on row indices instead of frames.
+    y = np.asarray(load_columns([LABEL_COL], store_dir)[LABEL_COL]).astype(int)
+    idx = np.arange(len(y))
+    idx_train, idx_temp = train_test_split(
+        idx, test_size=(test_size + calib_size), stratify=y, random_state=random_state
+    )
+    rel = calib_size / (test_size + calib_size)
+    idx_calib, idx_test = train_test_split(
+        idx_temp, test_size=rel, stratify=y[idx_temp], random_state=random_state
+    )
+    return {"train": idx_train, "calib": idx_calib, "test": idx_test}
+
+
+def save_split_indices(test_size=0.2, calib_size=0.2, random_state=42, store_dir: Path = STORE_DIR,
+                       group_by_patient: bool = False) -> Path:
+    splits = split_indices(test_size, calib_size, random_state, store_dir, group_by_patient)
+    tag = f"grouped_seed{random_state}" if group_by_patient else f"seed{random_state}"
+    split_dir = Path(store_dir) / "splits" / tag
+    split_dir.mkdir(parents=True, exist_ok=True)
+    for name in SPLITS:
+        np.save(split_dir / f"{name}.npy", splits[name])
+    return split_dir
+
+
+@instrument(rows="rows")
+def load_split(name: str, random_state: int = 42, cols: Iterable[str] = MODEL_COLS,
+               store_dir: Path = STORE_DIR, rows: Optional[np.ndarray] = None,
+               group_by_patient: bool = False) -> pd.DataFrame:
+    """DataFrame of one split (as saved by ``save_split_indices``), reading only ``cols``.
+
+    Pass ``rows`` to use an in-memory index array instead of a saved split.
+    """
+    store_dir = Path(store_dir)
+    if rows is None:
+        tag = f"grouped_seed{random_state}" if group_by_patient else f"seed{random_state}"
+        rows = np.load(store_dir / "splits" / tag / f"{name}.npy")
+    manifest = load_manifest(store_dir)
+    data = {}
+    for c, arr in load_columns(cols, store_dir).items():
+        vals = arr[rows]
+        cats = manifest["columns"][c].get("categories")
+        if cats is not None:
+            vals = np.asarray(vals)
+            decoded = np.asarray(cats, dtype=object)[vals]
+            decoded[vals < 0] = np.nan  # code -1 = missing, as read_csv would give
+            vals = decoded
+        data[c] = vals
+    return pd.DataFrame(data, index=rows)
+
+
+if __name__ == "__main__":
+    build_store()
+    save_split_indices()
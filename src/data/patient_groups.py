@@ -0,0 +1,81 @@
+from __future__ import annotations
+from typing import Dict, Optional
+import numpy as np
+import pandas as pd
+
+PATIENT_COL = "patient_id"
+
+
+def derive_patient_ids(df: pd.DataFrame) -> np.ndarray:
+    """Patient id per row; uses ``patient_id`` if present, otherwise infers it from row order.
+
+    ds_whole.csv has no id column. Its rows come as an OD row followed by the
+    OS row of the same patient (same age), and repeat visits follow each other
+    with the same age and per-eye corneal thickness. An OS row joins the OD row
+    just before it when the ages match; consecutive pairs share a patient when
+    the ages match and at least one eye's corneal thickness repeats.
+    """
+    if PATIENT_COL in df.columns:
+        return pd.factorize(df[PATIENT_COL])[0]
+    rl = df["RL"].astype(str).to_numpy()
+    age = df["age"].to_numpy()
+    cct = df["cornea_thickness"].to_numpy(dtype=float)
+
+    joins_prev = np.zeros(len(df), dtype=bool)
+    joins_prev[1:] = (rl[1:] == "OS") & (rl[:-1] == "OD") & (age[1:] == age[:-1])
+    pair = np.cumsum(~joins_prev) - 1
+
+    pairs = pd.DataFrame({"pair": pair, "RL": rl, "age": age, "cct": cct})
+    per_pair = pairs.pivot_table(index="pair", columns="RL", values="cct", aggfunc="first")
+    od = per_pair["OD"].to_numpy() if "OD" in per_pair else np.full(len(per_pair), np.nan)
+    os_ = per_pair["OS"].to_numpy() if "OS" in per_pair else np.full(len(per_pair), np.nan)
+    pair_age = pairs.groupby("pair")["age"].first().to_numpy()
+
+    same = np.zeros(len(per_pair), dtype=bool)
+    same[1:] = (pair_age[1:] == pair_age[:-1]) & ((od[1:] == od[:-1]) | (os_[1:] == os_[:-1]))
+    patient_of_pair = np.cumsum(~same) - 1
+    return patient_of_pair[pair]
+
+
+class GroupIndex:
+    """Group -> rows lookup built once (CSR layout) for vectorized group selection and resampling."""
+
+    def __init__(self, groups: np.ndarray, y: Optional[np.ndarray] = None):
+        codes, uniques = pd.factorize(np.asarray(groups))
+        self.group_of_row = codes
+        self.n_groups = len(uniques)
+        self.order = np.argsort(codes, kind="stable")
+        self.counts = np.bincount(codes, minlength=self.n_groups)
+        self.starts = np.concatenate(([0], np.cumsum(self.counts)[:-1]))
+        # a patient counts as positive if any of their eyes is
+        self.group_label = None if y is None else \
+            np.maximum.reduceat(np.asarray(y).astype(int)[self.order], self.starts)
+
+    def rows(self, group_ids: np.ndarray) -> np.ndarray:
+        g = np.asarray(group_ids, dtype=np.int64)
+        cnt = self.counts[g]
+        offsets = np.repeat(self.starts[g] - (np.cumsum(cnt) - cnt), cnt)
+        return self.order[offsets + np.arange(cnt.sum())]
+
+    def split(self, test_size=0.2, calib_size=0.2, random_state=42) -> Dict[str, np.ndarray]:
+        """Stratified (by patient label) train/calib/test split of patients, returned as row indices."""
+        rng = np.random.default_rng(random_state)
+        labels = self.group_label if self.group_label is not None else np.zeros(self.n_groups, dtype=int)
+        parts = {"train": [], "calib": [], "test": []}
+        for c in np.unique(labels):
+            g = rng.permutation(np.flatnonzero(labels == c))
+            # cut points on cumulative row counts so splits are sized in rows, not patients
+            cum = np.cumsum(self.counts[g]) / self.counts[g].sum()
+            n_train = int(np.searchsorted(cum, 1.0 - test_size - calib_size, side="right"))
+            n_calib = int(np.searchsorted(cum, 1.0 - test_size, side="right"))
+            parts["train"].append(g[:n_train])
+            parts["calib"].append(g[n_train:n_calib])
+            parts["test"].append(g[n_calib:])
+        return {k: np.sort(self.rows(np.concatenate(v))) for k, v in parts.items()}
+
+    def bootstrap_weights(self, rng: np.random.Generator, n_boot: int) -> np.ndarray:
+        """(n_boot, n_rows) row multiplicities from resampling whole groups with replacement."""
+        G = self.n_groups
+        idx = rng.integers(0, G, size=(n_boot, G))
+        Wg = np.bincount((idx + G * np.arange(n_boot)[:, None]).ravel(), minlength=n_boot * G).reshape(n_boot, G)
+        return Wg[:, self.group_of_row]
@@ -1,6 +1,5 @@
 import pandas as pd
-from sklearn.compose import ColumnTransformer
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from src.instrumentation import instrument
 
 CONT_COLS = [
     "age",
@@ -14,6 +13,8 @@ CONT_COLS = [
 CAT_COLS = ["RL", "GHT"]
 
 def build_preprocessor():
+    from sklearn.compose import ColumnTransformer  # lazy: keeps split_X_y importable without sklearn
+    from sklearn.preprocessing import OneHotEncoder, StandardScaler
     ct = ColumnTransformer(
         transformers=[
             ("num", StandardScaler(), CONT_COLS),
@@ -23,6 +24,7 @@ def build_preprocessor():
     )
     return ct
 
+@instrument(rows="df")
 def split_X_y(df: pd.DataFrame):
     y = df["glaucoma"].astype(int).values
     X = df.drop(columns=["glaucoma"])
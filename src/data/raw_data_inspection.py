@@ -1,10 +1,12 @@
 from pathlib import Path
 import pandas as pd
+from src.instrumentation import instrument
 
 PROJECT_ROOT = Path(__file__).resolve().parents[2]
 RAW_CSV = PROJECT_ROOT / "data" / "raw" / "ds_whole.csv"
 PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
 
+@instrument
 def inspect_raw_data(path: Path):
     df = pd.read_csv(path)
 
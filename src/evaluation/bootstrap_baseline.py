@@ -1,40 +1,74 @@
 from __future__ import annotations
 import numpy as np
 import pandas as pd
-from sklearn.metrics import (
-    roc_auc_score,
-    precision_recall_fscore_support,
-    confusion_matrix,
-    accuracy_score,
-)
+from src.data.patient_groups import GroupIndex
+from src.instrumentation import instrument
 
-def _metrics_from_scores(y_true: np.ndarray, proba_pos: np.ndarray, threshold: float = 0.5) -> dict:
-    y_true = np.asarray(y_true).astype(int).ravel()
-    proba_pos = np.asarray(proba_pos).ravel()
-    y_hat = (proba_pos >= threshold).astype(int)
+def _batched_metrics(W: np.ndarray, y_true: np.ndarray, y_hat: np.ndarray,
+                     order: np.ndarray, starts: np.ndarray) -> dict:
+    # W[b, i] = multiplicity of case i in replicate b; every metric is a weighted reduction.
+    pos = y_true == 1
+    pred = y_hat == 1
+    tp = W @ (pos & pred)
+    fn = W @ (pos & ~pred)
+    fp = W @ (~pos & pred)
+    tn = W @ (~pos & ~pred)
+    n = W.sum(axis=1)
 
-    tn, fp, fn, tp = confusion_matrix(y_true, y_hat, labels=[0, 1]).ravel()
-    acc = accuracy_score(y_true, y_hat)
-    auroc = roc_auc_score(y_true, proba_pos) if len(np.unique(y_true)) == 2 else np.nan
-    precision, recall, f1, _ = precision_recall_fscore_support(
-        y_true, y_hat, average="binary", zero_division=0
-    )
+    # AUROC = Mann-Whitney U over score groups sorted once; ties count one half.
+    W_sorted = W[:, order].astype(float)
+    pos_sorted = pos[order]
+    P = np.add.reduceat(W_sorted * pos_sorted, starts, axis=1)
+    N = np.add.reduceat(W_sorted * ~pos_sorted, starts, axis=1)
+    N_below = np.cumsum(N, axis=1) - N
+    n_pos, n_neg = P.sum(axis=1), N.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        auroc = np.where((n_pos > 0) & (n_neg > 0),
+                         (P * (N_below + 0.5 * N)).sum(axis=1) / (n_pos * n_neg), np.nan)
+        recall = np.where(tp + fn > 0, tp / (tp + fn), 0.0)
+        precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+        f1 = np.where(2 * tp + fp + fn > 0, 2 * tp / (2 * tp + fp + fn), 0.0)
     return {
-        "ACC": acc,
+        "ACC": (tp + tn) / n,
         "AUROC": auroc,
         "TP": tp, "FP": fp, "TN": tn, "FN": fn,
         "RECALL": recall, "PRECISION": precision, "F1": f1,
     }
 
-def bootstrap_baseline(y_true: np.ndarray, proba_pos: np.ndarray, n_boot: int = 500, threshold: float = 0.5, random_state: int = 42):
+@instrument(rows="y_true")
+def bootstrap_baseline(y_true: np.ndarray, proba_pos: np.ndarray, n_boot: int = 500, threshold: float = 0.5,
+                       random_state: int = 42, chunk_size: int | None = None, max_cells: int = 2**24,
+                       groups: np.ndarray | None = None):
+    """Bootstrap of the threshold metrics; pass ``groups`` (e.g. patient ids) to resample whole groups."""
+    y_true = np.asarray(y_true).astype(int).ravel()
+    proba_pos = np.asarray(proba_pos).ravel()
     rng = np.random.default_rng(random_state)
     n = len(y_true)
-    rows = []
-    for _ in range(n_boot):
-        idx = rng.integers(0, n, size=n)
-        rows.append(_metrics_from_scores(y_true[idx], proba_pos[idx], threshold))
+    y_hat = (proba_pos >= threshold).astype(int)
+
+    order = np.argsort(proba_pos, kind="stable")
+    s_sorted = proba_pos[order]
+    starts = np.flatnonzero(np.r_[True, s_sorted[1:] != s_sorted[:-1]])
+
+    if groups is not None and len(groups) != n:
+        raise ValueError(f"groups has {len(groups)} entries for {n} cases")
+    gi = GroupIndex(groups) if groups is not None else None
+
+    # Replicates are drawn in the same stream order as one rng.integers call per replicate,
+    # in chunks small enough that a chunk's (chunk x n) count matrix stays under max_cells.
+    if chunk_size is None:
+        chunk_size = max(1, max_cells // max(n, 1))
+    parts = []
+    for start in range(0, n_boot, chunk_size):
+        b = min(chunk_size, n_boot - start)
+        if gi is not None:
+            W = gi.bootstrap_weights(rng, b)
+        else:
+            idx = rng.integers(0, n, size=(b, n))
+            W = np.bincount((idx + n * np.arange(b)[:, None]).ravel(), minlength=b * n).reshape(b, n)
+        parts.append(pd.DataFrame(_batched_metrics(W, y_true, y_hat, order, starts)))
 
-    df = pd.DataFrame(rows)
+    df = pd.concat(parts, ignore_index=True)
     summary = pd.DataFrame({
         "mean": df.mean(),
         "ci_low": df.quantile(0.025),
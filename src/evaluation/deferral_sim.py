@@ -0,0 +1,76 @@
+from __future__ import annotations
+from typing import Dict, Mapping, Sequence, Union
+import numpy as np
+import pandas as pd
+from src.evaluation.metrics import new_errors
+from src.instrumentation import instrument
+
+COUNT_COLS = ("FN_confident", "FP_confident", "U_pos", "U_neg", "U_size")
+
+
+def _counts(sweep: Union[Mapping, pd.DataFrame]) -> Dict[str, np.ndarray]:
+    return {k: np.asarray(sweep[k], dtype=float).ravel() for k in ("alpha",) + COUNT_COLS}
+
+
+@instrument
+def simulate_deferral(sweep: Union[Mapping, pd.DataFrame], s: Sequence[float], t: Sequence[float] = (1.0,),
+                      n_sims: int = 0, band: float = 0.95, random_state: int = 42,
+                      cost_fn: float = 0.0, cost_fp: float = 0.0,
+                      cost_expert: float = 0.0) -> Dict[str, np.ndarray]:
+    """``new_errors`` evaluated on the full (alpha, s, t) grid in one broadcast pass.
+
+    ``sweep`` is ``cp_sweep``/``cp_sweep_from_proba`` output (or a DataFrame of it):
+    one row of summarize_counts fields per alpha. Returns arrays of shape
+    (n_alpha, n_s, n_t) for ``FN``, ``FP`` and ``errors`` (expected values, as
+    ``new_errors``), ``workload`` (deferred cases) and, when any cost is non-zero,
+    ``cost = cost_fn*FN + cost_fp*FP + cost_expert*workload``. Grid axes are
+    returned as ``alpha``, ``s``, ``t``.
+
+    With ``n_sims > 0`` the expert's misses are drawn as
+    ``Binomial(U_pos, 1 - s)`` / ``Binomial(U_neg, 1 - t)`` and ``FN_lo/FN_hi``,
+    ``FP_lo/FP_hi`` give the central ``band`` interval. FN only depends on
+    (alpha, s) and FP on (alpha, t), so the draws cost n_sims*(A*S + A*T), not
+    n_sims*A*S*T; their bands have shape (A, S, 1) and (A, 1, T).
+    """
+    c = _counts(sweep)
+    s = np.asarray(s, dtype=float).ravel()
+    t = np.asarray(t, dtype=float).ravel()
+    A, S, T = len(c["alpha"]), len(s), len(t)
+
+    fn, fp = new_errors(c["FN_confident"][:, None, None], c["FP_confident"][:, None, None],
+                        c["U_pos"][:, None, None], c["U_neg"][:, None, None],
+                        s[None, :, None], t[None, None, :])  # (A, S, 1), (A, 1, T)
+    shape = (A, S, T)
+    out = {
+        "alpha": c["alpha"], "s": s, "t": t,
+        "FN": np.broadcast_to(fn, shape),
+        "FP": np.broadcast_to(fp, shape),
+        "errors": fn + fp,
+        "workload": np.broadcast_to(c["U_size"][:, None, None], shape),
+    }
+    if cost_fn or cost_fp or cost_expert:
+        out["cost"] = cost_fn * fn + cost_fp * fp + cost_expert * out["workload"]
+
+    if n_sims > 0:
+        rng = np.random.default_rng(random_state)
+        lo, hi = (1.0 - band) / 2.0, 1.0 - (1.0 - band) / 2.0
+        miss_pos = rng.binomial(c["U_pos"].astype(np.int64)[None, :, None],
+                                np.clip(1.0 - s, 0.0, 1.0)[None, None, :], size=(n_sims, A, S))
+        miss_neg = rng.binomial(c["U_neg"].astype(np.int64)[None, :, None],
+                                np.clip(1.0 - t, 0.0, 1.0)[None, None, :], size=(n_sims, A, T))
+        fn_q = np.quantile(miss_pos, [lo, hi], axis=0) + c["FN_confident"][None, :, None]
+        fp_q = np.quantile(miss_neg, [lo, hi], axis=0) + c["FP_confident"][None, :, None]
+        out["FN_lo"], out["FN_hi"] = fn_q[0][:, :, None], fn_q[1][:, :, None]
+        out["FP_lo"], out["FP_hi"] = fp_q[0][:, None, :], fp_q[1][:, None, :]
+    return out
+
+
+def surface_frame(surface: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """Tidy one-row-per-(alpha, s, t) view of ``simulate_deferral`` output."""
+    A, S, T = len(surface["alpha"]), len(surface["s"]), len(surface["t"])
+    a, s, t = np.meshgrid(surface["alpha"], surface["s"], surface["t"], indexing="ij")
+    data = {"alpha": a.ravel(), "s": s.ravel(), "t": t.ravel()}
+    for k, v in surface.items():
+        if k not in ("alpha", "s", "t"):
+            data[k] = np.broadcast_to(v, (A, S, T)).ravel()
+    return pd.DataFrame(data)
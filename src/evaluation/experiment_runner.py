@@ -0,0 +1,100 @@
+from __future__ import annotations
+import hashlib
+import json
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Sequence
+import numpy as np
+import pandas as pd
+from src.data.dataset_store import STORE_DIR, build_store, load_manifest, split_indices, load_split
+from src.data.preprocess import split_X_y
+from src.evaluation.metrics import new_errors
+from src.models.baseline import train_logreg
+from src.models.conformal_prediction import cp_sweep_from_proba
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+CACHE_DIR = PROJECT_ROOT / "data" / "cache" / "experiments"
+# train_logreg has fixed hyperparameters; bump this when they (or the split logic) change.
+MODEL_SPEC = {"model": "train_logreg", "version": 1}
+
+
+def artifact_key(data_hash: str, seed: int, test_size: float, calib_size: float, spec: Dict = MODEL_SPEC,
+                 group_by_patient: bool = False) -> str:
+    payload = {"data": data_hash, "seed": int(seed), "test_size": test_size,
+               "calib_size": calib_size, "spec": spec}
+    if group_by_patient:
+        payload["grouped"] = True  # ungrouped keys stay as before
+    payload = json.dumps(payload, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def _fit_and_score(seed: int, test_size: float, calib_size: float, store_dir: str, out_dir: str,
+                   group_by_patient: bool = False) -> str:
+    out = Path(out_dir)
+    if (out / "done").exists():
+        return out_dir
+    rows = split_indices(test_size, calib_size, seed, store_dir, group_by_patient)
+    train, calib, test = (load_split(name, store_dir=store_dir, rows=rows[name]) for name in ("train", "calib", "test"))
+    pipe = train_logreg(train)
+    Xc, yc = split_X_y(calib)
+    Xt, yt = split_X_y(test)
+
+    out.mkdir(parents=True, exist_ok=True)
+    with open(out / "pipe.pkl", "wb") as f:
+        pickle.dump(pipe, f)
+    np.save(out / "proba_calib.npy", pipe.predict_proba(Xc)[:, 1])
+    np.save(out / "y_calib.npy", yc)
+    np.save(out / "proba_test.npy", pipe.predict_proba(Xt)[:, 1])
+    np.save(out / "y_test.npy", yt)
+    (out / "done").touch()  # written last so a crashed job is recomputed
+    return out_dir
+
+
+def load_artifacts(out_dir: Path | str) -> Dict[str, np.ndarray]:
+    out = Path(out_dir)
+    return {name: np.load(out / f"{name}.npy") for name in ("proba_calib", "y_calib", "proba_test", "y_test")}
+
+
+def load_pipeline(out_dir: Path | str):
+    with open(Path(out_dir) / "pipe.pkl", "rb") as f:
+        return pickle.load(f)
+
+
+def run_experiments(seeds: Iterable[int], alphas: Sequence[float], expert_s: Sequence[float] = (1.0,),
+                    test_size: float = 0.2, calib_size: float = 0.2, n_jobs: int = 1,
+                    group_by_patient: bool = False, store_dir: Path = STORE_DIR, cache_dir: Path = CACHE_DIR) -> pd.DataFrame:
+    """Repeat split -> train_logreg -> CP sweep over seeds, caching each seed's fitted model and scores.
+
+    Returns one tidy row per (seed, alpha, s) with the summarize_counts fields,
+    the baseline FN at threshold 0.5 and ``FN_expert`` from ``new_errors``.
+    """
+    seeds = [int(s) for s in seeds]
+    build_store(store_dir=store_dir)
+    data_hash = load_manifest(store_dir)["source_sha256"]
+    dirs = {s: str(Path(cache_dir) / artifact_key(data_hash, s, test_size, calib_size,
+                                                  group_by_patient=group_by_patient)) for s in seeds}
+    todo = [s for s in seeds if not (Path(dirs[s]) / "done").exists()]
+
+    args = [(s, test_size, calib_size, str(store_dir), dirs[s], group_by_patient) for s in todo]
+    if n_jobs == 1 or len(todo) <= 1:
+        for a in args:
+            _fit_and_score(*a)
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as ex:
+            list(ex.map(_fit_and_score, *zip(*args)))
+
+    expert_s = np.asarray(expert_s, dtype=float)
+    frames = []
+    for s in seeds:
+        art = load_artifacts(dirs[s])
+        sweep = cp_sweep_from_proba(art["proba_calib"], art["y_calib"], art["proba_test"], art["y_test"], alphas)
+        df = pd.DataFrame(sweep)
+        df["FN_baseline"] = int(np.sum((art["y_test"] == 1) & (art["proba_test"] < 0.5)))
+        df["seed"] = s
+        df["n_test"] = len(art["y_test"])
+        df = df.merge(pd.DataFrame({"s": expert_s}), how="cross")
+        df["FN_expert"] = new_errors(df["FN_confident"], df["FP_confident"], df["U_pos"], df["U_neg"],
+                                     df["s"], 1.0)[0]
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
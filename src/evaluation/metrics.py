@@ -4,6 +4,7 @@ import numpy as np
 import pandas as pd
 from math import sqrt
 from dataclasses import dataclass
+from src.instrumentation import instrument
 
 def confusion_from_preds(y_true: np.ndarray, y_pred: np.ndarray) -> Dict[str, int]:
     y_true = np.asarray(y_true).astype(int)
@@ -29,7 +30,26 @@ def wilson_ci(p: float, n: int, z: float = 1.96) -> Tuple[float, float]:
     margin = (z / denom) * sqrt((p*(1-p)/n) + (z**2)/(4*n**2))
     return (max(0.0, center - margin), min(1.0, center + margin))
 
+def wilson_ci_array(p, n, z: float = 1.96) -> Tuple[np.ndarray, np.ndarray]:
+    """``wilson_ci`` over arrays of proportions and sizes (NaN where n == 0 or p is NaN)."""
+    p = np.asarray(p, dtype=float); n = np.asarray(n, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        denom = 1 + (z**2)/n
+        center = (p + (z**2)/(2*n)) / denom
+        margin = (z / denom) * np.sqrt((p*(1-p)/n) + (z**2)/(4*n**2))
+    bad = (n == 0) | np.isnan(p)
+    lo = np.where(bad, np.nan, np.maximum(0.0, center - margin))
+    hi = np.where(bad, np.nan, np.minimum(1.0, center + margin))
+    return lo, hi
+
+@instrument
 def new_errors(FN_confident, FP_confident, U_pos, U_neg, s, t):
-    FN_new = FN_confident + (1.0 - s) * U_pos
-    FP_new = FP_confident + (1.0 - t) * U_neg
-    return float(FN_new), float(FP_new)
\ No newline at end of file
+    """Expected FN/FP once the U cases go to an expert with sensitivity ``s`` and specificity ``t``.
+
+    Scalars give floats; arrays/Series broadcast numpy-style and are returned as such.
+    """
+    FN_new = FN_confident + (1.0 - np.asarray(s, dtype=float)) * U_pos
+    FP_new = FP_confident + (1.0 - np.asarray(t, dtype=float)) * U_neg
+    if np.ndim(FN_new) == 0 and np.ndim(FP_new) == 0:
+        return float(FN_new), float(FP_new)
+    return FN_new, FP_new
\ No newline at end of file
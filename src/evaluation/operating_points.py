@@ -0,0 +1,116 @@
+from __future__ import annotations
+from typing import Dict
+import numpy as np
+import pandas as pd
+from src.evaluation.metrics import wilson_ci_array
+
+
+class OperatingPoints:
+    """Confusion counts at every distinct threshold of ``proba_pos`` from one sort.
+
+    Predictions are positive when ``proba_pos >= threshold`` (as in ``evaluate``).
+    Row ``i`` of the threshold table is the i-th largest distinct score, preceded
+    by ``+inf`` (everything negative); ``tp``/``fp`` are cumulative counts over the
+    descending scores, so any single-threshold query is a binary search.
+    """
+
+    def __init__(self, y_true, proba_pos):
+        y = np.asarray(y_true).astype(int).ravel()
+        s = np.asarray(proba_pos, dtype=float).ravel()
+        order = np.argsort(-s, kind="mergesort")
+        self.scores = s[order]  # descending
+        self.labels = y[order]
+        n = len(s)
+        ends = np.r_[np.flatnonzero(np.diff(self.scores)), n - 1] if n else np.empty(0, dtype=int)
+        tp = np.cumsum(self.labels)[ends] if n else np.empty(0)
+        self.thresholds = np.r_[np.inf, self.scores[ends]]
+        self.tp = np.r_[0, tp].astype(np.int64)
+        self.fp = np.r_[0, ends + 1 - tp].astype(np.int64)
+        self.P = int(self.labels.sum())
+        self.N = int(n - self.P)
+
+    def __len__(self):
+        return len(self.thresholds)
+
+    def _row(self, threshold: float) -> int:
+        # thresholds are descending: count how many are >= threshold
+        return int(np.searchsorted(-self.thresholds, -threshold, side="right")) - 1
+
+    @property
+    def auroc(self) -> float:
+        """Trapezoidal area under the ROC points (ties count one half, as ``roc_auc_score``)."""
+        if self.P == 0 or self.N == 0:
+            return np.nan
+        tpr, fpr = self.tp / self.P, self.fp / self.N
+        return float(np.sum(np.diff(fpr) * (tpr[1:] + tpr[:-1]) / 2.0))
+
+    def frame(self, z: float = 1.96) -> pd.DataFrame:
+        """One row per distinct threshold with counts, rates and Wilson CIs."""
+        tp, fp = self.tp, self.fp
+        fn, tn = self.P - tp, self.N - fp
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sens = np.where(self.P > 0, tp / self.P, np.nan)
+            spec = np.where(self.N > 0, tn / self.N, np.nan)
+            ppv = np.where(tp + fp > 0, tp / (tp + fp), np.nan)
+            npv = np.where(tn + fn > 0, tn / (tn + fn), np.nan)
+            f1 = np.where(2 * tp + fp + fn > 0, 2 * tp / (2 * tp + fp + fn), 0.0)
+        out = pd.DataFrame({
+            "threshold": self.thresholds,
+            "TP": tp, "FP": fp, "TN": tn, "FN": fn,
+            "sensitivity": sens, "specificity": spec, "PPV": ppv, "NPV": npv, "F1": f1,
+            "ACC": (tp + tn) / max(self.P + self.N, 1),
+        })
+        for name, n in (("sensitivity", self.P), ("specificity", self.N), ("PPV", tp + fp)):
+            out[f"{name}_lo"], out[f"{name}_hi"] = wilson_ci_array(out[name].to_numpy(), n, z)
+        return out
+
+    def at(self, threshold: float) -> Dict[str, float]:
+        """``evaluate``-style metrics at one threshold in O(log n)."""
+        i = self._row(threshold)
+        tp, fp = int(self.tp[i]), int(self.fp[i])
+        fn, tn = self.P - tp, self.N - fp
+        return {
+            "ACC": (tp + tn) / max(self.P + self.N, 1),
+            "AUROC": self.auroc,
+            "TP": tp, "FP": fp, "TN": tn, "FN": fn,
+            "RECALL": tp / (tp + fn + 1e-12),
+            "PRECISION": tp / (tp + fp + 1e-12),
+            "F1": (2*tp) / (2*tp + fp + fn + 1e-12),
+        }
+
+    def threshold_for_max_fn(self, max_fn: int) -> float:
+        """Highest threshold (fewest positives called) whose FN count is at most ``max_fn``."""
+        ok = self.P - self.tp <= max_fn  # FN only falls as the threshold drops
+        if not ok.any():
+            raise ValueError(f"no threshold reaches FN <= {max_fn}")
+        return float(self.thresholds[int(np.argmax(ok))])
+
+    def calibration(self, n_bins: int = 10, strategy: str = "uniform") -> pd.DataFrame:
+        """Reliability bins as ``sklearn.calibration.calibration_curve`` (empty bins dropped).
+
+        Per-bin sums come from prefix sums over the sorted scores. ``ece`` and
+        ``mce`` (count-weighted mean / max |frac_pos - mean_pred|) are in ``.attrs``.
+        """
+        s_asc, y_asc = self.scores[::-1], self.labels[::-1]
+        if strategy == "quantile":
+            edges = np.percentile(s_asc, np.linspace(0, 100, n_bins + 1))
+        elif strategy == "uniform":
+            edges = np.linspace(0.0, 1.0, n_bins + 1)
+        else:
+            raise ValueError(f"Unknown strategy: {strategy}")
+        # calibration_curve puts a score into bin k = #interior edges strictly below it
+        bounds = np.r_[0, np.searchsorted(s_asc, edges[1:-1], side="right"), len(s_asc)]
+        cs_p = np.r_[0.0, np.cumsum(s_asc)]
+        cs_y = np.r_[0, np.cumsum(y_asc)]
+        count = np.diff(bounds)
+        keep = count > 0
+        lo, hi, count = bounds[:-1][keep], bounds[1:][keep], count[keep]
+        out = pd.DataFrame({
+            "bin_lo": edges[:-1][keep], "bin_hi": edges[1:][keep], "count": count,
+            "mean_pred": (cs_p[hi] - cs_p[lo]) / count,
+            "frac_pos": (cs_y[hi] - cs_y[lo]) / count,
+        })
+        gap = np.abs(out["frac_pos"] - out["mean_pred"])
+        out.attrs["ece"] = float(np.sum(count * gap) / max(count.sum(), 1))
+        out.attrs["mce"] = float(gap.max()) if len(out) else np.nan
+        return out
@@ -0,0 +1,197 @@
+"""Opt-in timing/memory instrumentation for the pipeline entry points.
+
+Functions decorated with ``@instrument`` cost one global flag check per call
+until ``enable()`` is called (or ``MEDAI_PROFILE=1`` is set). When enabled each
+call records its latency into a power-of-two histogram, rows processed and,
+with ``enable(memory=True)``, tracemalloc allocations. Results are available
+as a summary DataFrame or a Chrome trace (chrome://tracing, Perfetto).
+Memory peaks of a call that contains other instrumented calls only cover the
+part after its last nested call.
+"""
+from __future__ import annotations
+import functools
+import inspect
+import json
+import math
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Union
+
+_N_BUCKETS = 48  # bucket k holds calls of 2^(k-1) .. 2^k ns
+
+_enabled = False
+_memory = False
+_trace = False
+_max_events = 1_000_000
+_lock = threading.Lock()
+_stats: Dict[str, "_Stat"] = {}
+_events: List[dict] = []
+_t0 = time.perf_counter_ns()
+
+
+class _Stat:
+    __slots__ = ("count", "total_ns", "min_ns", "max_ns", "rows", "mem_net", "mem_peak", "hist")
+
+    def __init__(self):
+        self.count = 0
+        self.total_ns = 0
+        self.min_ns = None
+        self.max_ns = 0
+        self.rows = 0
+        self.mem_net = 0
+        self.mem_peak = 0
+        self.hist = [0] * _N_BUCKETS
+
+
+def enable(memory: bool = False, trace: bool = False, max_events: int = 1_000_000):
+    """Start recording. ``memory`` turns on tracemalloc (slow); ``trace`` keeps per-call events for Chrome traces."""
+    global _enabled, _memory, _trace, _max_events
+    _memory, _trace, _max_events = memory, trace, max_events
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+    if _memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    with _lock:
+        _stats.clear()
+        _events.clear()
+
+
+def _record(name: str, start_ns: int, dur_ns: int, rows: int, mem_net: int, mem_peak: int):
+    with _lock:
+        st = _stats.get(name)
+        if st is None:
+            st = _stats[name] = _Stat()
+        st.count += 1
+        st.total_ns += dur_ns
+        st.min_ns = dur_ns if st.min_ns is None else min(st.min_ns, dur_ns)
+        st.max_ns = max(st.max_ns, dur_ns)
+        st.rows += rows
+        st.mem_net += mem_net
+        st.mem_peak = max(st.mem_peak, mem_peak)
+        st.hist[min(max(dur_ns, 1).bit_length(), _N_BUCKETS - 1)] += 1
+        if _trace and len(_events) < _max_events:
+            _events.append({"name": name, "ph": "X", "ts": (start_ns - _t0) / 1000.0, "dur": dur_ns / 1000.0,
+                            "pid": os.getpid(), "tid": threading.get_ident(), "args": {"rows": rows}})
+
+
+def _n_rows(obj) -> int:
+    shape = getattr(obj, "shape", None)
+    if shape:
+        return int(shape[0])
+    try:
+        return len(obj)
+    except TypeError:
+        return 0
+
+
+@contextmanager
+def timed(name: str, rows: int = 0):
+    """Record a block, e.g. ``with timed("load_pickles"): ...``. No-op while disabled."""
+    if not _enabled:
+        yield
+        return
+    if _memory:
+        mem_before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    start = time.perf_counter_ns()
+    try:
+        yield
+    finally:
+        dur = time.perf_counter_ns() - start
+        net = peak = 0
+        if _memory:
+            cur, pk = tracemalloc.get_traced_memory()
+            net, peak = cur - mem_before, pk - mem_before
+        _record(name, start, dur, rows, net, peak)
+
+
+def instrument(fn: Optional[Callable] = None, *, name: Optional[str] = None, rows: Union[str, Callable, None] = None):
+    """Decorator; ``rows`` names the argument whose length counts as rows processed, or is a callable of the bound args."""
+    def deco(f):
+        label = name or f"{f.__module__.rsplit('.', 1)[-1]}.{f.__qualname__}"
+        sig = inspect.signature(f) if isinstance(rows, str) or callable(rows) else None
+
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return f(*args, **kwargs)
+            n = 0
+            if sig is not None:
+                try:
+                    bound = sig.bind_partial(*args, **kwargs).arguments
+                    n = rows(bound) if callable(rows) else _n_rows(bound.get(rows))
+                except Exception:
+                    n = 0
+            with timed(label, n):
+                return f(*args, **kwargs)
+        return wrapper
+    return deco(fn) if fn is not None else deco
+
+
+def _hist_percentile(hist: List[int], q: float) -> float:
+    total = sum(hist)
+    target = q * total
+    acc = 0
+    for k, c in enumerate(hist):
+        acc += c
+        if acc >= target and c:
+            return float(2 ** k)  # upper edge of the bucket, ns
+    return math.nan
+
+
+def summary():
+    """One row per instrumented name, sorted by cumulative time (latencies in ms; percentiles are bucket upper bounds)."""
+    import pandas as pd
+    with _lock:
+        rows = []
+        for name, st in _stats.items():
+            rows.append({
+                "name": name,
+                "calls": st.count,
+                "total_ms": st.total_ns / 1e6,
+                "mean_ms": st.total_ns / st.count / 1e6,
+                "min_ms": (st.min_ns or 0) / 1e6,
+                "p50_ms": min(_hist_percentile(st.hist, 0.5), st.max_ns) / 1e6,
+                "p99_ms": min(_hist_percentile(st.hist, 0.99), st.max_ns) / 1e6,
+                "max_ms": st.max_ns / 1e6,
+                "rows": st.rows,
+                "rows_per_sec": st.rows / (st.total_ns / 1e9) if st.total_ns else math.nan,
+                "mem_net_mb": st.mem_net / 1024**2,
+                "mem_peak_mb": st.mem_peak / 1024**2,
+            })
+    df = pd.DataFrame(rows)
+    return df.sort_values("total_ms", ascending=False).reset_index(drop=True) if len(df) else df
+
+
+def histograms() -> Dict[str, List[int]]:
+    with _lock:
+        return {name: list(st.hist) for name, st in _stats.items()}
+
+
+def write_chrome_trace(path: Union[str, Path]):
+    """Write recorded call events (needs ``enable(trace=True)``) in Chrome trace-event JSON."""
+    with _lock:
+        payload = {"traceEvents": list(_events), "displayTimeUnit": "ms"}
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    Path(path).write_text(json.dumps(payload))
+
+
+if os.environ.get("MEDAI_PROFILE", "") not in ("", "0"):
+    enable(memory=os.environ.get("MEDAI_PROFILE_MEMORY", "") not in ("", "0"), trace=True)
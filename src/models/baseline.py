@@ -1,10 +1,15 @@
+from pathlib import Path
+from typing import Callable, Iterable, Union
 import numpy as np
 import pandas as pd
 from sklearn.pipeline import Pipeline
-from sklearn.linear_model import LogisticRegression
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import roc_auc_score, confusion_matrix, classification_report
-from src.data.preprocess import build_preprocessor, split_X_y
+from src.data.preprocess import build_preprocessor, split_X_y, CONT_COLS, CAT_COLS
+from src.instrumentation import instrument
 
+@instrument(rows="train_df")
 def train_logreg(train_df: pd.DataFrame):
     X_tr, y_tr = split_X_y(train_df)
     preproc = build_preprocessor()
@@ -13,6 +18,7 @@ def train_logreg(train_df: pd.DataFrame):
     pipe.fit(X_tr, y_tr)
     return pipe
 
+@instrument(rows="df")
 def evaluate(pipe, df: pd.DataFrame, threshold=0.5):
     X, y = split_X_y(df)
     proba = pipe.predict_proba(X)[:, 1]
@@ -31,4 +37,96 @@ def evaluate(pipe, df: pd.DataFrame, threshold=0.5):
         "PRECISION": TP / (TP + FP + 1e-12),
         "F1": (2*TP) / (2*TP + FP + FN + 1e-12)
     }
-    return metrics, proba, yhat
\ No newline at end of file
+    return metrics, proba, yhat
+
+ChunkSource = Union[str, Path, Callable[[], Iterable[pd.DataFrame]]]
+
+def _iter_chunks(source: ChunkSource, chunksize: int) -> Iterable[pd.DataFrame]:
+    if callable(source):
+        return source()
+    return pd.read_csv(source, chunksize=chunksize)
+
+def _fit_preprocessor_streaming(source: ChunkSource, chunksize: int):
+    # Pass 1: scaler moments and the category sets, one chunk in memory at a time.
+    scaler = StandardScaler()
+    cats = {c: set() for c in CAT_COLS}
+    first = None
+    n = 0
+    for chunk in _iter_chunks(source, chunksize):
+        if first is None:
+            first = chunk
+        scaler.partial_fit(chunk[CONT_COLS])
+        for c in CAT_COLS:
+            cats[c].update(chunk[c].dropna().unique().tolist())
+        n += len(chunk)
+    if first is None:
+        raise ValueError("No training chunks.")
+
+    preproc = build_preprocessor()
+    preproc.set_params(cat__categories=[sorted(cats[c]) for c in CAT_COLS])
+    X0, _ = split_X_y(first)
+    preproc.fit(X0)
+    num = preproc.named_transformers_["num"]
+    for attr in ("mean_", "var_", "scale_", "n_samples_seen_"):
+        setattr(num, attr, getattr(scaler, attr))
+    return preproc, n
+
+@instrument
+def train_logreg_streaming(source: ChunkSource, chunksize: int = 100_000, solver: str = "lbfgs",
+                           C: float = 1.0, max_iter: int = 200, tol: float = 1e-4, n_epochs: int = 5,
+                           random_state: int = 42):
+    """Out-of-core ``train_logreg``: ``source`` is a CSV path or a callable returning fresh DataFrame chunks.
+
+    ``solver="lbfgs"`` minimises the same objective as ``LogisticRegression``
+    (mean log loss + ||w||^2 / (2 C n)) with the same L-BFGS settings and stopping
+    rule, with gradients summed over chunks, so one full data pass per iteration;
+    up to floating-point summation order it reproduces ``train_logreg``.
+    ``solver="sgd"`` runs ``n_epochs`` of ``SGDClassifier.partial_fit`` instead: it is
+    approximate, does not reproduce the baseline coefficients and may score lower.
+    The result is a ``Pipeline`` usable with ``evaluate``, ``calibrate_threshold`` and ``plot_logreg_coeffs``.
+    """
+    preproc, n = _fit_preprocessor_streaming(source, chunksize)
+
+    if solver == "sgd":
+        clf = SGDClassifier(loss="log_loss", alpha=1.0 / (C * n), random_state=random_state)
+        for _ in range(n_epochs):
+            for chunk in _iter_chunks(source, chunksize):
+                X, y = split_X_y(chunk)
+                clf.partial_fit(preproc.transform(X), y, classes=np.array([0, 1]))
+        return Pipeline([("prep", preproc), ("clf", clf)])
+    if solver != "lbfgs":
+        raise ValueError(f"Unknown solver: {solver}")
+
+    from scipy.optimize import minimize
+    n_feat = len(preproc.get_feature_names_out())
+
+    l2 = 1.0 / (C * n)
+
+    def _loss_grad(theta):
+        w, b = theta[:-1], theta[-1]
+        loss = 0.0
+        grad = np.zeros_like(theta)
+        for chunk in _iter_chunks(source, chunksize):
+            X, y = split_X_y(chunk)
+            Xt = preproc.transform(X)
+            z = Xt @ w + b
+            # log(1 + exp(-z)) for y=1 and log(1 + exp(z)) for y=0, computed stably
+            loss += np.sum(np.logaddexp(0.0, np.where(y == 1, -z, z)))
+            r = 1.0 / (1.0 + np.exp(-z)) - y
+            grad[:-1] += Xt.T @ r
+            grad[-1] += r.sum()
+        loss = loss / n + 0.5 * l2 * np.dot(w, w)
+        grad /= n
+        grad[:-1] += l2 * w
+        return loss, grad
+
+    # same options as sklearn's lbfgs path
+    res = minimize(_loss_grad, np.zeros(n_feat + 1), jac=True, method="L-BFGS-B",
+                   options={"maxiter": max_iter, "maxls": 50, "gtol": tol, "ftol": 64 * np.finfo(float).eps})
+    clf = LogisticRegression(C=C, max_iter=max_iter, tol=tol)
+    clf.classes_ = np.array([0, 1])
+    clf.coef_ = res.x[:-1].reshape(1, -1)
+    clf.intercept_ = res.x[-1:]
+    clf.n_iter_ = np.array([res.nit])
+    clf.n_features_in_ = n_feat
+    return Pipeline([("prep", preproc), ("clf", clf)])
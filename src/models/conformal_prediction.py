@@ -1,30 +1,166 @@
 import numpy as np
 import pandas as pd
-from typing import Dict, Tuple
+from pathlib import Path
+from collections import deque
+from typing import Dict, Optional, Sequence, Tuple
 from src.data.preprocess import split_X_y
+from src.instrumentation import instrument
 
-def calibrate_threshold(pipe, calib_df: pd.DataFrame, alpha: float) -> float:
-    Xc, yc = split_X_y(calib_df)
-    proba = pipe.predict_proba(Xc)
-    p_true = proba[np.arange(len(yc)), yc]
-    A = 1.0 - p_true
+def _true_class_proba(proba: np.ndarray, y: np.ndarray) -> np.ndarray:
+    # proba is either (n, 2) from predict_proba or the (n,) positive-class column.
+    if proba.ndim == 1:
+        return np.where(y == 1, proba, 1.0 - proba)
+    return proba[np.arange(len(y)), y]
+
+def _pred_and_maxp(proba: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    if proba.ndim == 1:
+        # argmax over [1-p, p] keeps class 0 on ties
+        return (proba > 0.5).astype(int), np.maximum(proba, 1.0 - proba)
+    return proba.argmax(axis=1), proba.max(axis=1)
+
+def load_scores(path, mmap_mode: Optional[str] = "r") -> np.ndarray:
+    """Load an archived ``proba`` (or label) array saved with ``np.save``, memory-mapped by default."""
+    return np.load(Path(path), mmap_mode=mmap_mode)
+
+@instrument(rows="proba")
+def calibrate_threshold_from_proba(proba: np.ndarray, y: np.ndarray, alpha: float) -> float:
+    proba = np.asarray(proba)
+    y = np.asarray(y).astype(int)
+    A = 1.0 - _true_class_proba(proba, y)
     q = np.quantile(A, 1.0 - alpha, method="higher")
     return float(q)
 
-def cp_partition(pipe, df: pd.DataFrame, q: float) -> Dict[str, np.ndarray]:
-    X, y = split_X_y(df)
-    proba = pipe.predict_proba(X)
-    yhat = proba.argmax(axis=1)
-    maxp = proba.max(axis=1)
+@instrument(rows="proba")
+def cp_partition_from_proba(proba: np.ndarray, q: float, y: Optional[np.ndarray] = None) -> Dict[str, np.ndarray]:
+    proba = np.asarray(proba)
+    yhat, maxp = _pred_and_maxp(proba)
     conf_mask = (1.0 - maxp) <= q
     region = np.where(conf_mask, "C", "U")
     return {
-        "y_true": y,
+        "y_true": None if y is None else np.asarray(y).astype(int),
         "y_pred": yhat,
         "proba": proba,
         "region": region
     }
 
+@instrument(rows="calib_df")
+def calibrate_threshold(pipe, calib_df: pd.DataFrame, alpha: float) -> float:
+    Xc, yc = split_X_y(calib_df)
+    return calibrate_threshold_from_proba(pipe.predict_proba(Xc), yc, alpha)
+
+def _higher_rank(n: int, alpha: float) -> int:
+    # same index np.quantile(..., method="higher") picks from a sorted array
+    return int(np.ceil((n - 1) * (1.0 - alpha)))
+
+class StreamingCalibrator:
+    """Incremental replacement for ``calibrate_threshold`` over chunks of nonconformity scores.
+
+    With ``eps=None`` an exact sorted buffer is kept and ``threshold`` matches
+    ``np.quantile(scores, 1 - alpha, method="higher")``. With ``eps`` set, scores
+    (which lie in [0, 1]) are counted in bins of width <= eps and ``threshold``
+    returns the upper edge of the selected bin, i.e. at most ``eps`` above the
+    exact value and never below it.
+
+    ``window`` keeps only the most recent scores. The exact buffer evicts score by
+    score; the binned sketch evicts whole chunks, so it may briefly hold up to
+    one chunk more than ``window``.
+
+    Memory: the exact buffer holds every score in the window, so without a
+    ``window`` it grows as O(n); use ``eps`` for unbounded streams, which needs
+    O(1/eps) (plus one bin-count vector per chunk still inside a ``window``).
+    """
+
+    def __init__(self, window: Optional[int] = None, eps: Optional[float] = None):
+        if window is not None and window <= 0:
+            raise ValueError("window must be positive")
+        if eps is not None and not 0 < eps <= 1:
+            raise ValueError("eps must be in (0, 1]")
+        self.window = window
+        self.eps = eps
+        self._chunks = deque()
+        self._n = 0
+        if eps is None:
+            self._sorted = np.empty(0, dtype=float)
+        else:
+            self._n_bins = int(np.ceil(1.0 / eps))
+            self._counts = np.zeros(self._n_bins, dtype=np.int64)
+            self._cum = None
+
+    def __len__(self) -> int:
+        return self._n
+
+    def _bin(self, scores: np.ndarray) -> np.ndarray:
+        return np.clip((scores * self._n_bins).astype(np.int64), 0, self._n_bins - 1)
+
+    def update(self, scores) -> "StreamingCalibrator":
+        scores = np.asarray(scores, dtype=float).ravel()
+        if scores.size == 0:
+            return self
+        if self.eps is None:
+            self._sorted = np.sort(np.concatenate([self._sorted, scores]), kind="mergesort")
+            if self.window is not None:  # chunks are only needed to know what to evict
+                self._chunks.append(scores)
+        else:
+            counts = np.bincount(self._bin(scores), minlength=self._n_bins)
+            self._counts += counts
+            if self.window is not None:
+                self._chunks.append((scores.size, counts))
+            self._cum = None
+        self._n += scores.size
+        if self.window is not None:
+            self._evict()
+        return self
+
+    def update_from_proba(self, proba: np.ndarray, y: np.ndarray) -> "StreamingCalibrator":
+        proba = np.asarray(proba)
+        y = np.asarray(y).astype(int)
+        return self.update(1.0 - _true_class_proba(proba, y))
+
+    def _evict(self):
+        if self.eps is None:
+            excess = self._n - self.window
+            if excess <= 0:
+                return
+            old = []
+            while excess > 0:
+                chunk = self._chunks[0]
+                if chunk.size <= excess:
+                    old.append(self._chunks.popleft())
+                    excess -= chunk.size
+                else:
+                    old.append(chunk[:excess])
+                    self._chunks[0] = chunk[excess:]
+                    excess = 0
+            old = np.sort(np.concatenate(old))
+            # drop one occurrence per evicted value; equal values are interchangeable
+            first = np.searchsorted(self._sorted, old, side="left")
+            dup = np.arange(old.size) - np.searchsorted(old, old, side="left")
+            self._sorted = np.delete(self._sorted, first + dup)
+            self._n = self._sorted.size
+        else:
+            while self._chunks and self._n - self._chunks[0][0] >= self.window:
+                size, counts = self._chunks.popleft()
+                self._counts -= counts
+                self._n -= size
+            self._cum = None
+
+    def threshold(self, alpha: float) -> float:
+        if self._n == 0:
+            raise ValueError("no calibration scores yet")
+        k = _higher_rank(self._n, alpha)
+        if self.eps is None:
+            return float(self._sorted[k])
+        if self._cum is None:
+            self._cum = np.cumsum(self._counts)
+        b = int(np.searchsorted(self._cum, k + 1, side="left"))
+        return float(min(1.0, (b + 1) / self._n_bins))
+
+@instrument(rows="df")
+def cp_partition(pipe, df: pd.DataFrame, q: float) -> Dict[str, np.ndarray]:
+    X, y = split_X_y(df)
+    return cp_partition_from_proba(pipe.predict_proba(X), q, y)
+
+@instrument(rows="y_true")
 def summarize_counts(y_true, y_pred, region) -> Dict[str, int]:
     y_true = np.asarray(y_true); y_pred = np.asarray(y_pred); region = np.asarray(region)
     C = region == "C"; U = ~C
@@ -45,4 +181,250 @@ def summarize_counts(y_true, y_pred, region) -> Dict[str, int]:
         "U_neg": int(U_neg),
         "C_size": int(C.sum()),
         "U_size": int(U.sum())
-    }
\ No newline at end of file
+    }
+
+
+@instrument(rows="proba")
+def cp_sweep_from_proba(proba_calib: np.ndarray, y_calib: np.ndarray,
+                        proba: np.ndarray, y: np.ndarray, alphas: Sequence[float],
+                        return_masks: bool = False) -> Dict[str, np.ndarray]:
+    alphas = np.asarray(alphas, dtype=float).ravel()
+    proba_calib = np.asarray(proba_calib); proba = np.asarray(proba)
+    y_calib = np.asarray(y_calib).astype(int)
+    y = np.asarray(y).astype(int)
+
+    A = 1.0 - _true_class_proba(proba_calib, y_calib)
+    q = np.quantile(A, 1.0 - alphas, method="higher")
+
+    # Test scores are sorted once; the confident set for every q is then a prefix.
+    yhat, maxp = _pred_and_maxp(proba)
+    score = 1.0 - maxp
+    order = np.argsort(score, kind="stable")
+    n_C = np.searchsorted(score[order], q, side="right")
+
+    def _prefix(ind):
+        return np.concatenate(([0], np.cumsum(ind[order])))
+
+    pos, pred_pos = (y == 1), (yhat == 1)
+    cum_tp = _prefix(pos & pred_pos)
+    cum_fn = _prefix(pos & ~pred_pos)
+    cum_fp = _prefix(~pos & pred_pos)
+    cum_tn = _prefix(~pos & ~pred_pos)
+    cum_pos = cum_tp + cum_fn
+    cum_neg = cum_fp + cum_tn
+
+    out = {
+        "alpha": alphas,
+        "q": q,
+        "TP_confident": cum_tp[n_C],
+        "FN_confident": cum_fn[n_C],
+        "FP_confident": cum_fp[n_C],
+        "TN_confident": cum_tn[n_C],
+        "U_pos": cum_pos[-1] - cum_pos[n_C],
+        "U_neg": cum_neg[-1] - cum_neg[n_C],
+        "C_size": n_C,
+        "U_size": len(y) - n_C,
+    }
+    if return_masks:
+        out["C_mask"] = score[None, :] <= q[:, None]
+    return out
+
+@instrument(rows="df")
+def cp_sweep(pipe, calib_df: pd.DataFrame, df: pd.DataFrame, alphas: Sequence[float],
+             return_masks: bool = False) -> Dict[str, np.ndarray]:
+    """Thresholds and summarize_counts fields for every alpha, one column per field.
+
+    Calib and test are scored once. ``C_mask`` (n_alphas x n_rows) is only built
+    when ``return_masks`` is set; ``pd.DataFrame`` of the other keys matches the
+    per-alpha records the notebook assembles for ``plot_cp_results``.
+    """
+    Xc, yc = split_X_y(calib_df)
+    X, y = split_X_y(df)
+    return cp_sweep_from_proba(pipe.predict_proba(Xc), yc, pipe.predict_proba(X), y,
+                               alphas, return_masks=return_masks)
+
+
+def _stratum_index(labels, groups, by_class: bool) -> pd.Index:
+    # groups: None, one array, a list of arrays or a DataFrame of group columns
+    arrays = [np.asarray(labels)] if by_class else []
+    if groups is not None:
+        if isinstance(groups, pd.DataFrame):
+            arrays += [groups[c].to_numpy() for c in groups.columns]
+        elif isinstance(groups, (list, tuple)):
+            arrays += [np.asarray(g) for g in groups]
+        else:
+            arrays.append(np.asarray(groups))
+    if not arrays:
+        raise ValueError("Need by_class=True and/or groups.")
+    return pd.Index(arrays[0]) if len(arrays) == 1 else pd.MultiIndex.from_arrays(arrays)
+
+class MondrianThresholds:
+    """Per-stratum CP thresholds; ``q`` has one row per stratum in ``keys`` and one column per alpha.
+
+    Strata are the true class at calibration / the predicted class at partition
+    time (``by_class``), optionally crossed with group columns such as ``GHT`` or
+    ``RL``. Strata unseen during calibration fall back to the global threshold.
+    """
+
+    def __init__(self, keys: pd.Index, q: np.ndarray, global_q: np.ndarray, alphas: np.ndarray,
+                 by_class: bool, counts: np.ndarray):
+        self.keys, self.q, self.global_q = keys, q, global_q
+        self.alphas, self.by_class, self.counts = alphas, by_class, counts
+
+    def codes(self, y_pred, groups=None) -> np.ndarray:
+        """Stratum row of ``q`` per case; unseen strata map to ``len(keys)`` (the global row)."""
+        codes = self.keys.get_indexer(_stratum_index(y_pred, groups, self.by_class))
+        return np.where(codes < 0, len(self.keys), codes)
+
+    def table(self) -> np.ndarray:
+        return np.vstack([self.q, self.global_q[None, :]])
+
+    def row_thresholds(self, y_pred, groups=None, alpha_idx: int = 0) -> np.ndarray:
+        return self.table()[self.codes(y_pred, groups), alpha_idx]
+
+@instrument(rows="proba")
+def mondrian_calibrate_from_proba(proba: np.ndarray, y: np.ndarray, alpha, groups=None,
+                                  by_class: bool = True) -> MondrianThresholds:
+    proba = np.asarray(proba)
+    y = np.asarray(y).astype(int)
+    alphas = np.atleast_1d(np.asarray(alpha, dtype=float))
+    A = 1.0 - _true_class_proba(proba, y)
+
+    codes, keys = pd.factorize(_stratum_index(y, groups, by_class))
+    keys = pd.Index(keys) if not isinstance(keys, pd.Index) else keys
+    # one sort by (stratum, score); each stratum's "higher" quantile is an offset into its segment
+    A_sorted = A[np.lexsort((A, codes))]
+    counts = np.bincount(codes, minlength=len(keys))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    rank = starts[:, None] + np.ceil((counts[:, None] - 1) * (1.0 - alphas[None, :])).astype(np.int64)
+    q = A_sorted[rank]
+    global_q = np.quantile(A, 1.0 - alphas, method="higher")
+    return MondrianThresholds(keys, q, global_q, alphas, by_class, counts)
+
+@instrument(rows="proba")
+def mondrian_partition_from_proba(proba: np.ndarray, thresholds: MondrianThresholds, groups=None,
+                                  y: Optional[np.ndarray] = None, alpha_idx: int = 0) -> Dict[str, np.ndarray]:
+    proba = np.asarray(proba)
+    yhat, maxp = _pred_and_maxp(proba)
+    q_row = thresholds.row_thresholds(yhat, groups, alpha_idx)
+    region = np.where((1.0 - maxp) <= q_row, "C", "U")
+    return {
+        "y_true": None if y is None else np.asarray(y).astype(int),
+        "y_pred": yhat,
+        "proba": proba,
+        "region": region,
+        "q": q_row,
+        "stratum": thresholds.codes(yhat, groups),
+    }
+
+def mondrian_calibrate(pipe, calib_df: pd.DataFrame, alpha, group_cols: Optional[Sequence[str]] = None,
+                       by_class: bool = True) -> MondrianThresholds:
+    Xc, yc = split_X_y(calib_df)
+    groups = calib_df[list(group_cols)] if group_cols else None
+    return mondrian_calibrate_from_proba(pipe.predict_proba(Xc), yc, alpha, groups, by_class)
+
+def mondrian_partition(pipe, df: pd.DataFrame, thresholds: MondrianThresholds,
+                       group_cols: Optional[Sequence[str]] = None, alpha_idx: int = 0) -> Dict[str, np.ndarray]:
+    X, y = split_X_y(df)
+    groups = df[list(group_cols)] if group_cols else None
+    return mondrian_partition_from_proba(pipe.predict_proba(X), thresholds, groups, y, alpha_idx)
+
+def summarize_counts_by_stratum(y_true, y_pred, region, strata, proba=None, q=None) -> pd.DataFrame:
+    """``summarize_counts`` per stratum, plus C/U fractions and, given ``proba`` and per-row ``q``,
+    the empirical CP coverage ``P(1 - p_true <= q)``."""
+    y_true = np.asarray(y_true).astype(int); y_pred = np.asarray(y_pred); region = np.asarray(region)
+    codes, keys = pd.factorize(pd.Index(strata) if not isinstance(strata, pd.Index) else strata)
+    m = len(keys)
+    C = region == "C"; pos = y_true == 1; pp = y_pred == 1
+
+    def _cnt(mask):
+        return np.bincount(codes, weights=mask, minlength=m).astype(int)
+
+    out = pd.DataFrame({
+        "stratum": list(keys),
+        "TP_confident": _cnt(pos & pp & C),
+        "FN_confident": _cnt(pos & ~pp & C),
+        "FP_confident": _cnt(~pos & pp & C),
+        "TN_confident": _cnt(~pos & ~pp & C),
+        "U_pos": _cnt(pos & ~C),
+        "U_neg": _cnt(~pos & ~C),
+        "C_size": _cnt(C),
+        "U_size": _cnt(~C),
+    })
+    n = out["C_size"] + out["U_size"]
+    out["C_frac"] = out["C_size"] / n
+    out["U_frac"] = out["U_size"] / n
+    if proba is not None and q is not None:
+        covered = (1.0 - _true_class_proba(np.asarray(proba), y_true)) <= np.asarray(q)
+        out["coverage"] = _cnt(covered) / n
+    return out
+
+@instrument(rows="proba")
+def mondrian_sweep_from_proba(proba_calib: np.ndarray, y_calib: np.ndarray, proba: np.ndarray, y: np.ndarray,
+                              alphas: Sequence[float], groups_calib=None, groups=None,
+                              by_class: bool = True) -> pd.DataFrame:
+    """Per-(alpha, stratum) counts and coverage for every alpha in one pass.
+
+    Test rows are sorted once by (stratum, score); the thresholds of all alphas
+    are merged into the same ordering, so each confident set is a prefix of its
+    stratum segment and counts come from cumulative sums.
+    """
+    proba = np.asarray(proba)
+    y = np.asarray(y).astype(int)
+    th = mondrian_calibrate_from_proba(proba_calib, y_calib, alphas, groups_calib, by_class)
+    Q = th.table()                      # (n_strata + 1, n_alphas)
+    n_s, n_a = Q.shape
+    yhat, maxp = _pred_and_maxp(proba)
+    score = 1.0 - maxp
+    a_true = 1.0 - _true_class_proba(proba, y)
+    codes = th.codes(yhat, groups)
+
+    counts = np.bincount(codes, minlength=n_s)
+    seg = np.concatenate(([0], np.cumsum(counts)))
+
+    def _n_le(values):
+        # per (stratum, alpha): number of the stratum's values <= its threshold
+        q_code = np.repeat(np.arange(n_s), n_a)
+        val = np.concatenate([values, Q.ravel()])
+        code = np.concatenate([codes, q_code])
+        flag = np.concatenate([np.zeros(len(values), dtype=int), np.ones(Q.size, dtype=int)])
+        order = np.lexsort((flag, val, code))
+        n_before = np.cumsum(flag[order] == 0)
+        pos_of = np.empty(len(order), dtype=np.int64)
+        pos_of[order] = np.arange(len(order))
+        return (n_before[pos_of[len(values):]] - seg[q_code]).reshape(n_s, n_a)
+
+    n_C = _n_le(score)
+    n_cov = _n_le(a_true)
+
+    order_t = np.lexsort((score, codes))
+
+    def _prefix(ind):
+        return np.concatenate(([0], np.cumsum(ind[order_t])))
+
+    pos, pred_pos = (y == 1), (yhat == 1)
+    lo = seg[:-1, None]
+    hi = lo + n_C
+    fields = {}
+    for name, ind in (("TP_confident", pos & pred_pos), ("FN_confident", pos & ~pred_pos),
+                      ("FP_confident", ~pos & pred_pos), ("TN_confident", ~pos & ~pred_pos)):
+        cum = _prefix(ind)
+        fields[name] = cum[hi] - cum[lo]
+    cum_pos = _prefix(pos)
+    fields["U_pos"] = cum_pos[seg[1:, None]] - cum_pos[hi]
+    fields["U_neg"] = (counts[:, None] - n_C) - fields["U_pos"]
+    fields["C_size"] = n_C
+    fields["U_size"] = counts[:, None] - n_C
+
+    keys = list(th.keys) + ["<unseen>"]
+    out = pd.DataFrame({
+        "alpha": np.tile(th.alphas, n_s),
+        "stratum": np.repeat(np.asarray(keys, dtype=object), n_a),
+        "q": Q.ravel(),
+        **{k: v.ravel() for k, v in fields.items()},
+        "n": np.repeat(counts, n_a),
+    })
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out["C_frac"] = out["C_size"] / out["n"]
+        out["coverage"] = n_cov.ravel() / out["n"]
+    return out[out["n"] > 0].reset_index(drop=True)
@@ -0,0 +1,102 @@
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+from sklearn.model_selection import StratifiedKFold, StratifiedGroupKFold
+from src.data.preprocess import split_X_y
+from src.models.baseline import train_logreg
+from src.models.fast_scorer import StackedLogRegScorer
+
+
+def _fit_fold(train_df: pd.DataFrame):
+    return train_logreg(train_df)
+
+
+class CrossConformal:
+    """K-fold cross-conformal CP: every labeled row is used for training and, out-of-fold, for calibration.
+
+    Fold ``k``'s model scores its held-out rows; those nonconformity scores are
+    kept sorted per fold as float32. A new case with prediction ``y_hat``
+    (from the fold-averaged probability) gets the cross-conformal p-value
+    ``(1 + sum_k #{A_i in fold k : A_i >= 1 - p_k(y_hat | x)}) / (n + 1)``
+    and is confident (``C``) when that p-value exceeds ``alpha``.
+    """
+
+    def __init__(self, n_folds: int = 5, random_state: int = 42, n_jobs: int = 1):
+        self.n_folds = n_folds
+        self.random_state = random_state
+        self.n_jobs = n_jobs
+        self.pipes: List = []
+        self.scorer: Optional[StackedLogRegScorer] = None
+        self.oof_scores: Optional[np.ndarray] = None   # concatenated, sorted within each fold
+        self.fold_offsets: Optional[np.ndarray] = None
+
+    def fit(self, df: pd.DataFrame, groups: Optional[np.ndarray] = None) -> "CrossConformal":
+        """Fit the fold models; pass ``groups`` (e.g. patient ids) to keep a group within one fold."""
+        df = df.reset_index(drop=True)
+        X, y = split_X_y(df)
+        if groups is None:
+            cv = StratifiedKFold(self.n_folds, shuffle=True, random_state=self.random_state)
+        else:
+            cv = StratifiedGroupKFold(self.n_folds, shuffle=True, random_state=self.random_state)
+        folds = [te for _, te in cv.split(X, y, groups)]
+        train_parts = [df.drop(index=te) for te in folds]
+
+        if self.n_jobs == 1:
+            self.pipes = [_fit_fold(t) for t in train_parts]
+        else:
+            with ProcessPoolExecutor(max_workers=self.n_jobs) as ex:
+                self.pipes = list(ex.map(_fit_fold, train_parts))
+        self.scorer = StackedLogRegScorer.from_pipelines(self.pipes)
+
+        # one batched scoring call over all rows, then pick each row's own out-of-fold column
+        fold_of = np.empty(len(df), dtype=np.int64)
+        for k, te in enumerate(folds):
+            fold_of[te] = k
+        p_pos = self.scorer.predict_proba_pos(X)[np.arange(len(df)), fold_of]
+        A = 1.0 - np.where(y == 1, p_pos, 1.0 - p_pos)
+        order = np.lexsort((A, fold_of))
+        self.oof_scores = A[order].astype(np.float32)
+        self.fold_offsets = np.concatenate(([0], np.cumsum(np.bincount(fold_of, minlength=self.n_folds))))
+        return self
+
+    def predict_proba(self, X) -> np.ndarray:
+        p = self.scorer.predict_proba_pos(X).mean(axis=1)
+        return np.column_stack([1.0 - p, p])
+
+    def p_values(self, X) -> Dict[str, np.ndarray]:
+        p_k = self.scorer.predict_proba_pos(X)          # (n, K)
+        p_mean = p_k.mean(axis=1)
+        yhat = (p_mean > 0.5).astype(int)
+        s_k = 1.0 - np.where(yhat[:, None] == 1, p_k, 1.0 - p_k)
+        ge = np.zeros(len(yhat), dtype=np.int64)
+        for k in range(self.n_folds):
+            fold = self.oof_scores[self.fold_offsets[k]:self.fold_offsets[k + 1]]
+            ge += len(fold) - np.searchsorted(fold, s_k[:, k].astype(np.float32), side="left")
+        n = int(self.fold_offsets[-1])
+        return {"p_value": (ge + 1.0) / (n + 1.0), "y_pred": yhat, "proba": np.column_stack([1.0 - p_mean, p_mean])}
+
+    def partition(self, df: pd.DataFrame, alpha: float) -> Dict[str, np.ndarray]:
+        """``cp_partition``-style output; ``y_true`` is filled when ``df`` has the label column."""
+        if "glaucoma" in df.columns:
+            X, y = split_X_y(df)
+        else:
+            X, y = df, None
+        out = self.p_values(X)
+        return {
+            "y_true": y,
+            "y_pred": out["y_pred"],
+            "proba": out["proba"],
+            "region": np.where(out["p_value"] > alpha, "C", "U"),
+            "p_value": out["p_value"],
+        }
+
+    def save_scores(self, path: Path | str):
+        np.savez_compressed(path, oof_scores=self.oof_scores, fold_offsets=self.fold_offsets)
+
+    def load_scores(self, path: Path | str) -> "CrossConformal":
+        data = np.load(path)
+        self.oof_scores, self.fold_offsets = data["oof_scores"], data["fold_offsets"]
+        return self
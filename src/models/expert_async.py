@@ -0,0 +1,175 @@
+from __future__ import annotations
+import asyncio
+import hashlib
+import inspect
+import json
+import numbers
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+from src.models.expert_integration import build_messages, parse_response, parse_error, format_case_cards
+from src.models.expert_store import MISSING, outputs_to_arrays
+from src.models.response_cache import CacheMissError
+
+
+class TokenBucket:
+    """Async token bucket: ``rate`` requests per second with bursts of up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+
+class FakeChatClient:
+    """Stand-in for ``AsyncOpenAI`` that simulates latency and failures without network calls.
+
+    The prediction is a deterministic function of the prompt, so repeated runs
+    agree; ``error_rate`` of calls raise and ``malformed_rate`` return non-JSON text.
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.5, error_rate: float = 0.0,
+                 malformed_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _reply(self, messages) -> str:
+        h = hashlib.sha256(messages[-1]["content"].encode("utf-8")).digest()
+        return json.dumps({"prediction": h[0] & 1, "confidence": round(0.5 + h[1] / 510, 2),
+                           "rationale_1_sentence": "Simulated response."})
+
+    async def _create(self, model: str, messages, temperature: float = 0.0, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency * (1.0 + self.jitter * (2 * self._rng.random() - 1)))
+        if self._rng.random() < self.error_rate:
+            raise RuntimeError("simulated API error")
+        text = "not json" if self._rng.random() < self.malformed_rate else self._reply(messages)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+async def _create(client, **kwargs):
+    create = client.chat.completions.create
+    if inspect.iscoroutinefunction(create):
+        return await create(**kwargs)
+    return await asyncio.to_thread(create, **kwargs)
+
+
+async def acall_gpt_batch(client, model: str, cases: List[str], fewshot_block: str, temperature: float = 0.2,
+                          max_retries: int = 3, concurrency: int = 16, rate_per_sec: Optional[float] = None,
+                          timeout: float = 60.0, backoff_base: float = 0.5, backoff_max: float = 20.0,
+                          cache=None, run_index=0) -> List[Dict]:
+    """Concurrent ``call_gpt_batch``: same output schema, results in input order.
+
+    Works with async clients (``AsyncOpenAI``) and, through a worker thread per
+    in-flight call, with sync ones (``OpenAI``). ``run_index`` may be a single
+    int or one per case, and keys the optional ``ResponseCache``.
+    """
+    sem = asyncio.Semaphore(concurrency)
+    bucket = TokenBucket(rate_per_sec) if rate_per_sec else None
+
+    run_indices = [run_index] * len(cases) if isinstance(run_index, numbers.Integral) else list(run_index)
+
+    async def _one(card: str, run: int) -> Dict:
+        messages = build_messages(card, fewshot_block)
+        if cache is not None:
+            key = cache.make_key(model, temperature, messages, run)
+            hit = cache.get(key)
+            if hit is not None:
+                return hit
+            if cache.read_only:
+                raise CacheMissError(key)
+        last_err = None
+        for attempt in range(max_retries):
+            async with sem:  # held per attempt only, so backoff does not block other requests
+                try:
+                    if bucket is not None:
+                        await bucket.acquire()
+                    resp = await asyncio.wait_for(
+                        _create(client, model=model, temperature=temperature, messages=messages),
+                        timeout=timeout,
+                    )
+                    parsed = parse_response(resp)
+                    if cache is not None:
+                        cache.put(key, parsed)
+                    return parsed
+                except asyncio.TimeoutError:
+                    last_err = TimeoutError(f"no response within {timeout}s")
+                except Exception as e:
+                    last_err = e
+            if attempt < max_retries - 1:
+                # full jitter on an exponentially growing cap
+                await asyncio.sleep(random.uniform(0, min(backoff_max, backoff_base * 2 ** attempt)))
+        return parse_error(last_err)
+
+    return list(await asyncio.gather(*(_one(card, run) for card, run in zip(cases, run_indices))))
+
+
+def _run(coro):
+    # asyncio.run refuses to start inside a running loop (e.g. Jupyter); use a helper thread there.
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(coro)
+    box = {}
+
+    def _target():
+        try:
+            box["result"] = asyncio.run(coro)
+        except BaseException as e:
+            box["error"] = e
+
+    t = threading.Thread(target=_target)
+    t.start(); t.join()
+    if "error" in box:
+        raise box["error"]
+    return box["result"]
+
+
+def call_gpt_batch_concurrent(client, model: str, cases: List[str], fewshot_block: str, **kwargs) -> List[Dict]:
+    return _run(acall_gpt_batch(client, model, cases, fewshot_block, **kwargs))
+
+
+def gpt_multiple_runs_concurrent(client, model_name: str, test_u: pd.DataFrame, fewshot_block: str,
+                                 n_runs: int = 5, temperature: float = 0.3, store=None, **kwargs) -> np.ndarray:
+    """``gpt_multiple_runs`` with all runs and cases in flight at once (bounded by ``concurrency``).
+
+    Returns the same object array and, with ``store``, appends the runs in order once all have finished.
+    """
+    case_cards = format_case_cards(test_u)
+
+    async def _all():
+        # one shared engine call keeps the concurrency bound global across runs
+        runs = [r for r in range(n_runs) for _ in case_cards]
+        flat = await acall_gpt_batch(client, model_name, case_cards * n_runs, fewshot_block,
+                                     temperature=temperature, run_index=runs, **kwargs)
+        return [flat[i * len(case_cards):(i + 1) * len(case_cards)] for i in range(n_runs)]
+
+    all_preds = []
+    for gpt_out in _run(_all()):
+        preds, conf = outputs_to_arrays(gpt_out)
+        if store is not None:
+            store.append(preds, conf if store.with_confidence else None)
+        all_preds.append([None if p == MISSING else int(p) for p in preds.tolist()])
+    return np.array(all_preds, dtype=object)
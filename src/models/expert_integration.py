@@ -1,12 +1,12 @@
 from __future__ import annotations
 from dataclasses import dataclass
 from typing import List, Dict, Tuple, Optional
-from src.evaluation.metrics import confusion_from_preds, sensitivity_specificity
-from src.evaluation.metrics import confusion_from_preds, sensitivity_specificity
+from src.models.response_cache import CacheMissError
+from src.models.expert_store import MISSING, outputs_to_arrays, run_confusion, to_int8
 import json, time, random
 import numpy as np
 import pandas as pd
-from tqdm.auto import trange
+from src.instrumentation import instrument
 
 FEATURE_DOC = {
     "age": "Age (years)",
@@ -20,6 +20,7 @@ FEATURE_DOC = {
     "RL": "Eye laterality (OS=left, OD=right)"
 }
 
+@instrument
 def format_case_row(row: pd.Series):
     rnfl_key = "RNFL4.mean" if "RNFL4.mean" in row.index else "RNFL.mean"
     return (
@@ -33,7 +34,47 @@ def format_case_row(row: pd.Series):
         f"- Eye (RL): {str(row['RL'])}"
     )
 
-def build_prompt(case_card: str):
+# Column-wise version of format_case_row: (FEATURE_DOC column, card label, %-format).
+# "%d" truncates like int().
+CARD_FIELDS = [
+    ("age", "Age", "%d"),
+    ("ocular_pressure", "Ocular pressure (mmHg)", "%d"),
+    ("MD", "Visual field MD (dB)", "%.2f"),
+    ("PSD", "Visual field PSD", "%.2f"),
+    ("GHT", "GHT (0/1/2)", "%d"),
+    ("cornea_thickness", "Cornea thickness (µm)", "%d"),
+    ("RNFL4.mean", "RNFL mean (µm)", "%.2f"),
+    ("RL", "Eye (RL)", "%s"),
+]
+CARD_TEMPLATE = "\n".join(f"- {label}: {fmt}" for _, label, fmt in CARD_FIELDS)
+_CARD_CACHE: Dict[int, str] = {}
+_CARD_CACHE_MAX = 1_000_000
+
+@instrument(rows="df")
+def format_case_cards(df: pd.DataFrame, cache: Optional[Dict[int, str]] = _CARD_CACHE) -> List[str]:
+    """``[format_case_row(r) for _, r in df.iterrows()]`` without iterrows, memoized by row hash.
+
+    Pass ``cache=None`` to skip memoization.
+    """
+    cols = [c for c, _, _ in CARD_FIELDS]
+    if "RNFL4.mean" not in df.columns:
+        cols[cols.index("RNFL4.mean")] = "RNFL.mean"
+    sub = df[cols]
+    if cache is None:
+        values = zip(*(sub[c].tolist() for c in cols))
+        return [CARD_TEMPLATE % v for v in values]
+    keys = pd.util.hash_pandas_object(sub, index=False).tolist()
+    out = [cache.get(k) for k in keys]
+    miss = [i for i, card in enumerate(out) if card is None]
+    if miss:
+        if len(cache) + len(miss) > _CARD_CACHE_MAX:
+            cache.clear()
+        rows = sub.iloc[miss]
+        for i, v in zip(miss, zip(*(rows[c].tolist() for c in cols))):
+            out[i] = cache[keys[i]] = CARD_TEMPLATE % v
+    return out
+
+def _build_prompt_template(case_card: str):
     return f"""
         You are an ophthalmology triage assistant. Decide whether this patient likely has glaucoma (1) or is normal (0) based ONLY on the structured features below. 
         Be conservative about false negatives (missing glaucoma). Use domain intuition, but stick to provided fields.
@@ -48,6 +89,12 @@ def build_prompt(case_card: str):
         {{"prediction": 1, "confidence": 0.82, "rationale_1_sentence": "High IOP and RNFL thinning with abnormal GHT."}}
     """.strip()
 
+# formatted once; build_prompt only concatenates around the card
+_PROMPT_HEAD, _PROMPT_TAIL = _build_prompt_template("\0").split("\0")
+
+def build_prompt(case_card: str):
+    return _PROMPT_HEAD + case_card + _PROMPT_TAIL
+
 @dataclass
 class FewShotExample:
     case_card: str
@@ -63,15 +110,42 @@ def build_fewshot_block(examples: List[FewShotExample]):
         )
     return "\n\n".join(blocks)
 
-def call_gpt_batch(client, model: str, cases: List[str], fewshot_block: str, temperature: float = 0.2, max_retries: int = 3):
+SYSTEM_MSG = (
+    "You are a precise medical classifier. "
+    "Follow the JSON output spec strictly; output exactly one line per request."
+)
+
+def build_messages(card: str, fewshot_block: str) -> List[Dict[str, str]]:
+    user_msg = build_prompt(card)
+    content = fewshot_block + "\n\n" + user_msg if fewshot_block else user_msg
+    return [
+        {"role": "system", "content": SYSTEM_MSG},
+        {"role": "user", "content": content},
+    ]
+
+def parse_response(resp) -> Dict:
+    text = resp.choices[0].message.content.strip()
+    line = text.splitlines()[0]
+    return json.loads(line)
+
+def parse_error(err) -> Dict:
+    return {"prediction": None, "confidence": None, "rationale_1_sentence": f"PARSE_ERROR: {err}"}
+
+@instrument(rows="cases")
+def call_gpt_batch(client, model: str, cases: List[str], fewshot_block: str, temperature: float = 0.2, max_retries: int = 3,
+                   cache=None, run_index: int = 0):
     out = []
-    sys_msg = (
-        "You are a precise medical classifier. "
-        "Follow the JSON output spec strictly; output exactly one line per request."
-    )
     for card in cases:
-        user_msg = build_prompt(card)
-        content = fewshot_block + "\n\n" + user_msg if fewshot_block else user_msg
+        messages = build_messages(card, fewshot_block)
+
+        if cache is not None:
+            key = cache.make_key(model, temperature, messages, run_index)
+            hit = cache.get(key)
+            if hit is not None:
+                out.append(hit)
+                continue
+            if cache.read_only:
+                raise CacheMissError(key)
 
         last_err = None
         for _ in range(max_retries):
@@ -79,23 +153,157 @@ def call_gpt_batch(client, model: str, cases: List[str], fewshot_block: str, tem
                 resp = client.chat.completions.create(
                     model=model,
                     temperature=temperature,
-                    messages=[
-                        {"role": "system", "content": sys_msg},
-                        {"role": "user", "content": content},
-                    ]
+                    messages=messages
                 )
-                text = resp.choices[0].message.content.strip()
-                line = text.splitlines()[0]
-                parsed = json.loads(line)
+                parsed = parse_response(resp)
+                if cache is not None:
+                    cache.put(key, parsed)
                 out.append(parsed)
                 break
             except Exception as e:
                 last_err = e
                 time.sleep(0.8 + random.random()*0.6)
         else:
-            out.append({"prediction": None, "confidence": None, "rationale_1_sentence": f"PARSE_ERROR: {last_err}"})
+            out.append(parse_error(last_err))
+    return out
+
+BATCH_SYSTEM_MSG = (
+    "You are a precise medical classifier. "
+    "Follow the JSON output spec strictly; output exactly one line per case, in case order."
+)
+
+def build_batch_prompt(case_cards: List[str]):
+    cases = "\n\n".join(f"Case {i}:\n{card}" for i, card in enumerate(case_cards))
+    return f"""
+You are an ophthalmology triage assistant. For EACH patient below, decide whether they likely have glaucoma (1) or are normal (0) based ONLY on the structured features.
+Be conservative about false negatives (missing glaucoma). Use domain intuition, but stick to provided fields.
+
+Patient cases (structured):
+{cases}
+
+Rules:
+- Output exactly {len(case_cards)} lines, one JSON object per line, with fields: id (the case number), prediction (0 or 1), confidence (0-1 float), rationale_1_sentence (<=20 words).
+- Do not output anything except those JSON lines.
+Example:
+{{"id": 0, "prediction": 1, "confidence": 0.82, "rationale_1_sentence": "High IOP and RNFL thinning with abnormal GHT."}}
+""".strip()
+
+def build_batch_messages(case_cards: List[str], fewshot_block: str) -> List[Dict[str, str]]:
+    user_msg = build_batch_prompt(case_cards)
+    content = fewshot_block + "\n\n" + user_msg if fewshot_block else user_msg
+    return [
+        {"role": "system", "content": BATCH_SYSTEM_MSG},
+        {"role": "user", "content": content},
+    ]
+
+CHARS_PER_TOKEN = 4.0  # rough average for this English/number prompt; no tokenizer dependency
+
+def _lengths(texts: List[str]) -> np.ndarray:
+    return np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+
+def prompt_token_estimates(case_cards: List[str], fewshot_block: str = "") -> np.ndarray:
+    """Estimated prompt tokens of each single-case request built by ``build_messages``."""
+    overhead = len(SYSTEM_MSG) + len(_PROMPT_HEAD) + len(_PROMPT_TAIL) + (len(fewshot_block) + 2 if fewshot_block else 0)
+    return np.ceil((_lengths(case_cards) + overhead) / CHARS_PER_TOKEN).astype(np.int64)
+
+def pack_by_token_budget(case_cards: List[str], budget: int, fewshot_block: str = "",
+                         max_cases: Optional[int] = None) -> List[np.ndarray]:
+    """Split case indices, in order, into ``build_batch_messages`` groups estimated to fit in ``budget`` tokens.
+
+    A case that alone exceeds the budget still gets its own group.
+    """
+    n = len(case_cards)
+    overhead = len(BATCH_SYSTEM_MSG) + len(build_batch_prompt([])) + (len(fewshot_block) + 2 if fewshot_block else 0)
+    per_case = _lengths(case_cards) + len("Case 000000:\n\n\n")
+    cum = np.cumsum(per_case)
+    room = budget * CHARS_PER_TOKEN - overhead
+    groups, start = [], 0
+    while start < n:
+        before = cum[start - 1] if start else 0
+        end = max(int(np.searchsorted(cum, before + room, side="right")), start + 1)
+        if max_cases is not None:
+            end = min(end, start + max_cases)
+        groups.append(np.arange(start, end))
+        start = end
+    return groups
+
+def parse_batch_response(text: str, n_cases: int) -> Dict[int, Dict]:
+    """Map case id -> parsed answer; lines that are not a valid answer for an unseen id are skipped."""
+    out = {}
+    for line in text.splitlines():
+        start, end = line.find("{"), line.rfind("}")
+        if start < 0 or end <= start:
+            continue
+        try:
+            item = json.loads(line[start:end + 1])
+            idx = int(item.pop("id"))
+            pred = int(item["prediction"])
+        except Exception:
+            continue
+        if 0 <= idx < n_cases and pred in (0, 1) and idx not in out:
+            item["prediction"] = pred
+            out[idx] = item
     return out
 
+@instrument(rows="cases")
+def call_gpt_batched(client, model: str, cases: List[str], fewshot_block: str, batch_size: int = 10,
+                     temperature: float = 0.2, max_retries: int = 3, token_budget: Optional[int] = None,
+                     cache=None, run_index: int = 0):
+    """``call_gpt_batch`` packing ``batch_size`` cards per request; only missing/malformed cases are re-asked.
+
+    With ``token_budget`` set, requests are packed by estimated prompt tokens
+    instead (still at most ``batch_size`` cards each). With ``cache``, answers
+    are looked up and stored per case (keyed on that case's single-case batched
+    prompt, so they do not depend on how cases were grouped); only misses are sent.
+    """
+    out: List[Optional[Dict]] = [None] * len(cases)
+    last_err: Dict[int, object] = {}
+    keys: Dict[int, str] = {}
+    todo = list(range(len(cases)))
+    if cache is not None:
+        todo = []
+        for i, card in enumerate(cases):
+            keys[i] = cache.make_key(model, temperature, build_batch_messages([card], fewshot_block), run_index)
+            hit = cache.get(keys[i])
+            if hit is not None:
+                out[i] = hit
+            elif cache.read_only:
+                raise CacheMissError(keys[i])
+            else:
+                todo.append(i)
+    if token_budget is not None:
+        groups = [[todo[j] for j in g] for g in
+                  pack_by_token_budget([cases[i] for i in todo], token_budget, fewshot_block, max_cases=batch_size)]
+    else:
+        groups = [todo[start:start + batch_size] for start in range(0, len(todo), batch_size)]
+    for group in groups:
+        pending = [int(i) for i in group]
+        for _ in range(max_retries):
+            messages = build_batch_messages([cases[i] for i in pending], fewshot_block)
+            try:
+                resp = client.chat.completions.create(
+                    model=model,
+                    temperature=temperature,
+                    messages=messages
+                )
+                answers = parse_batch_response(resp.choices[0].message.content, len(pending))
+            except Exception as e:
+                answers = {}
+                for i in pending:
+                    last_err[i] = e
+            for j, item in answers.items():
+                out[pending[j]] = item
+                if cache is not None:
+                    cache.put(keys[pending[j]], item)
+            missing = [i for j, i in enumerate(pending) if j not in answers]
+            for i in missing:
+                last_err.setdefault(i, "missing or malformed line in batched reply")
+            pending = missing
+            if not pending:
+                break
+            time.sleep(0.8 + random.random()*0.6)
+    return [item if item is not None else parse_error(last_err.get(i)) for i, item in enumerate(out)]
+
 def stratified_sample_U(df_u: pd.DataFrame, label_col: str = "glaucoma", n_per_class: int = 25, seed: int = 42):    
     rng = np.random.default_rng(seed)
     dev_parts = []
@@ -110,52 +318,126 @@ def stratified_sample_U(df_u: pd.DataFrame, label_col: str = "glaucoma", n_per_c
     return dev_u, test_u
 
 
-def gpt_multiple_runs(client, model_name: str, test_u: pd.DataFrame, fewshot_block: str, n_runs: int = 5, temperature: float = 0.3):
-    case_cards = [format_case_row(r) for _, r in test_u.iterrows()]
+@instrument(rows="test_u")
+def gpt_multiple_runs(client, model_name: str, test_u: pd.DataFrame, fewshot_block: str, n_runs: int = 5, temperature: float = 0.3,
+                      cache=None, batch_size: int | None = None, store=None):
+    """``n_runs`` x len(test_u) predictions (object array, None = no answer).
+
+    Pass an ``ExpertRunStore`` as ``store`` to also append each run (with
+    confidences) to disk as soon as it finishes.
+    """
+    from tqdm.auto import trange
+    case_cards = format_case_cards(test_u)
     all_preds = []
-    for _ in trange(n_runs, desc="GPT runs"):
-        gpt_out = call_gpt_batch(client, model=model_name, cases=case_cards,
-                                 fewshot_block=fewshot_block, temperature=temperature)
-        preds = []
-        for item in gpt_out:
-            try:
-                preds.append(int(item["prediction"]))
-            except Exception:
-                preds.append(None)
-        all_preds.append(preds)
+    for run in trange(n_runs, desc="GPT runs"):
+        if batch_size:
+            gpt_out = call_gpt_batched(client, model=model_name, cases=case_cards, fewshot_block=fewshot_block,
+                                       batch_size=batch_size, temperature=temperature,
+                                       cache=cache, run_index=run)
+        else:
+            gpt_out = call_gpt_batch(client, model=model_name, cases=case_cards,
+                                     fewshot_block=fewshot_block, temperature=temperature,
+                                     cache=cache, run_index=run)
+        preds, conf = outputs_to_arrays(gpt_out)
+        if store is not None:
+            store.append(preds, conf if store.with_confidence else None)
+        all_preds.append([None if p == MISSING else int(p) for p in preds.tolist()])
     return np.array(all_preds, dtype=object)
 
 
+@instrument(rows="y_true")
 def evaluate_gpt_runs(all_preds: np.ndarray, y_true) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Per-run sensitivity on the cases answered in every run; ``all_preds`` may hold None or ``MISSING``."""
     y_true = np.asarray(y_true).astype(int)
-    mask_valid = ~np.any(all_preds == None, axis=0) 
+    preds = to_int8(all_preds) if np.asarray(all_preds).dtype == object else np.asarray(all_preds, dtype=np.int8)
+    mask_valid = np.all(preds != MISSING, axis=0)
     y_true_eval = y_true[mask_valid]
-    preds_eval = np.asarray(all_preds[:, mask_valid], dtype=int)
+    preds_eval = preds[:, mask_valid].astype(int)
+    s_list = run_confusion(preds_eval, y_true_eval)["sensitivity"].to_numpy()
+    return s_list, y_true_eval, preds_eval
+
+
+def _sensitivity_replicates(tp_case: np.ndarray, pos: np.ndarray, n_boot: int, seed,
+                            chunk_size: int) -> np.ndarray:
+    # A case's majority vote does not depend on which other cases were drawn, so each
+    # replicate only needs the multiplicities of the positive / true-positive cases.
+    rng = np.random.default_rng(seed)
+    n = len(pos)
+    out = np.empty(n_boot)
+    for start in range(0, n_boot, chunk_size):
+        b = min(chunk_size, n_boot - start)
+        idx = rng.integers(0, n, size=(b, n))
+        W = np.bincount((idx + n * np.arange(b)[:, None]).ravel(), minlength=b * n).reshape(b, n)
+        n_pos = W @ pos
+        with np.errstate(divide="ignore", invalid="ignore"):
+            out[start:start + b] = np.where(n_pos > 0, (W @ tp_case) / n_pos, np.nan)
+    return out
 
-    s_list = []
-    for r in preds_eval:
-        cm = confusion_from_preds(y_true_eval, r)
-        s, _ = sensitivity_specificity(cm)
-        s_list.append(s)
-    return np.asarray(s_list), y_true_eval, preds_eval
 
+def _sensitivity_worker(args) -> np.ndarray:
+    return _sensitivity_replicates(*args)
 
-def bootstrap_sensitivity_ci(preds_eval: np.ndarray, y_true_eval: np.ndarray, n_boot: int = 1000, alpha: float = 0.05, random_state: int = 42):
-    rng = np.random.default_rng(random_state)
+
+@instrument(rows="y_true_eval")
+def bootstrap_sensitivity_ci(preds_eval: np.ndarray, y_true_eval: np.ndarray, n_boot: int = 1000, alpha: float = 0.05,
+                             random_state: int = 42, method: str = "percentile", n_jobs: int = 1,
+                             chunk_size: int | None = None, max_cells: int = 2**24):
+    """CI for the majority-vote sensitivity; ``method`` is "percentile" or "bca".
+
+    With ``n_jobs=1`` replicates follow the same random stream as one
+    ``rng.integers`` draw per replicate. With ``n_jobs>1`` the replicates are split
+    over a process pool, each worker seeded from ``SeedSequence(random_state).spawn``,
+    so results are deterministic for a given ``(random_state, n_jobs)``.
+    """
+    if method not in ("percentile", "bca"):
+        raise ValueError(f"Unknown method: {method}")
+    y_true_eval = np.asarray(y_true_eval).astype(int)
+    vote = (np.asarray(preds_eval).mean(axis=0) >= 0.5)
+    pos = (y_true_eval == 1).astype(np.int64)
+    tp_case = (pos & vote).astype(np.int64)
     n = len(y_true_eval)
-    s_boot = []
-    for _ in range(n_boot):
-        idx = rng.integers(0, n, size=n)
-        y_b = y_true_eval[idx]
-        pred_b = (preds_eval[:, idx].mean(axis=0) >= 0.5).astype(int)
-        cm = confusion_from_preds(y_b, pred_b)
-        s, _ = sensitivity_specificity(cm)
-        s_boot.append(s)
+    if chunk_size is None:
+        chunk_size = max(1, max_cells // max(n, 1))
+
+    if n_jobs == 1:
+        s_boot = _sensitivity_replicates(tp_case, pos, n_boot, random_state, chunk_size)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        seeds = np.random.SeedSequence(random_state).spawn(n_jobs)
+        sizes = [n_boot // n_jobs + (i < n_boot % n_jobs) for i in range(n_jobs)]
+        jobs = [(tp_case, pos, k, sd, chunk_size) for k, sd in zip(sizes, seeds) if k > 0]
+        with ProcessPoolExecutor(max_workers=n_jobs) as ex:
+            s_boot = np.concatenate(list(ex.map(_sensitivity_worker, jobs)))
 
     low, high = alpha / 2, 1 - alpha / 2
-    return (float(np.nanpercentile(s_boot, low * 100)),
-            float(np.nanpercentile(s_boot, high * 100)))
+    if method == "percentile":
+        return (float(np.nanpercentile(s_boot, low * 100)),
+                float(np.nanpercentile(s_boot, high * 100)))
+
+    # BCa: bias correction from the bootstrap distribution, acceleration from the
+    # jackknife (dropping a negative case leaves sensitivity unchanged).
+    from statistics import NormalDist
+    nd = NormalDist()
+    P, TP = int(pos.sum()), int(tp_case.sum())
+    s_boot = s_boot[~np.isnan(s_boot)]
+    if P < 2 or s_boot.size == 0:
+        return (np.nan, np.nan)
+    theta = TP / P
+    jk = np.where(pos == 1, (TP - tp_case) / (P - 1), theta)
+    d = jk.mean() - jk
+    denom = 6.0 * np.sum(d ** 2) ** 1.5
+    a = float(np.sum(d ** 3) / denom) if denom > 0 else 0.0
+    frac = np.clip(np.mean(s_boot < theta) + 0.5 * np.mean(s_boot == theta), 1e-12, 1 - 1e-12)
+    z0 = nd.inv_cdf(float(frac))
+
+    def _adj(p):
+        z = nd.inv_cdf(p)
+        return nd.cdf(z0 + (z0 + z) / (1 - a * (z0 + z)))
+
+    return (float(np.percentile(s_boot, _adj(low) * 100)),
+            float(np.percentile(s_boot, _adj(high) * 100)))
 
 
+@instrument
 def new_fn_after_deferral(FN_confident: int, U_pos: int, s: float) -> float:
     return FN_confident + (1.0 - s) * U_pos
\ No newline at end of file
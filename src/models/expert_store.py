@@ -0,0 +1,222 @@
+from __future__ import annotations
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+import numpy as np
+import pandas as pd
+from src.instrumentation import instrument
+
+MISSING = -1  # int8 sentinel for a case the expert did not answer
+_PREDS_FILE, _CONF_FILE, _META_FILE = "preds.i8", "conf.f16", "meta.json"
+
+
+def to_int8(all_preds) -> np.ndarray:
+    """Object array / nested lists of 0, 1 and None (``gpt_multiple_runs`` output) as int8 with ``MISSING``."""
+    arr = np.asarray(all_preds, dtype=object)
+    return np.where(arr == None, MISSING, arr).astype(np.int8)  # noqa: E711
+
+
+def outputs_to_arrays(gpt_out: List[Dict]):
+    """One run of ``call_gpt_batch`` items -> (int8 predictions, float16 confidences; NaN when missing)."""
+    preds = np.full(len(gpt_out), MISSING, dtype=np.int8)
+    conf = np.full(len(gpt_out), np.nan, dtype=np.float16)
+    for i, item in enumerate(gpt_out):
+        try:
+            preds[i] = int(item["prediction"])
+        except Exception:
+            continue
+        try:
+            conf[i] = float(item.get("confidence"))
+        except Exception:
+            pass
+    return preds, conf
+
+
+class ExpertRunStore:
+    """Append-only on-disk store of expert runs: one int8 row per run (plus float16 confidences).
+
+    Rows are appended to raw files and read back as a ``(n_runs, n_cases)``
+    memmap, so 50 runs x 10^6 cases take 50 MB (150 MB with confidences).
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        meta = json.loads((self.path / _META_FILE).read_text())
+        self.n_cases = int(meta["n_cases"])
+        self.with_confidence = bool(meta["with_confidence"])
+        self.meta = meta
+
+    @classmethod
+    def create(cls, path: Union[str, Path], n_cases: int, with_confidence: bool = False,
+               **info) -> "ExpertRunStore":
+        """New empty store; ``info`` (model, temperature, ...) is kept in meta.json."""
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        if (path / _META_FILE).exists():
+            raise FileExistsError(f"store already exists: {path}")
+        (path / _PREDS_FILE).touch()
+        if with_confidence:
+            (path / _CONF_FILE).touch()
+        meta = {"n_cases": int(n_cases), "with_confidence": with_confidence, "n_runs": 0, **info}
+        (path / _META_FILE).write_text(json.dumps(meta, indent=2))
+        return cls(path)
+
+    def __len__(self) -> int:
+        return (self.path / _PREDS_FILE).stat().st_size // self.n_cases if self.n_cases else 0
+
+    def append(self, preds, confidence=None) -> "ExpertRunStore":
+        """Add one run (or a ``(k, n_cases)`` block of runs)."""
+        preds = np.atleast_2d(to_int8(preds) if np.asarray(preds).dtype == object else np.asarray(preds, np.int8))
+        if preds.shape[1] != self.n_cases:
+            raise ValueError(f"expected {self.n_cases} cases, got {preds.shape[1]}")
+        if self.with_confidence:
+            conf = np.full(preds.shape, np.nan, np.float16) if confidence is None \
+                else np.atleast_2d(np.asarray(confidence, dtype=np.float16))
+            if conf.shape != preds.shape:
+                raise ValueError("confidence shape does not match predictions")
+            with open(self.path / _CONF_FILE, "ab") as f:
+                f.write(np.ascontiguousarray(conf).tobytes())
+        with open(self.path / _PREDS_FILE, "ab") as f:  # written last: it defines the run count
+            f.write(np.ascontiguousarray(preds).tobytes())
+        self.meta["n_runs"] = len(self)
+        (self.path / _META_FILE).write_text(json.dumps(self.meta, indent=2))
+        return self
+
+    def append_outputs(self, gpt_out: List[Dict]) -> "ExpertRunStore":
+        preds, conf = outputs_to_arrays(gpt_out)
+        return self.append(preds, conf if self.with_confidence else None)
+
+    def _map(self, name: str, dtype) -> np.ndarray:
+        n_runs = len(self)
+        if n_runs == 0:
+            return np.empty((0, self.n_cases), dtype=dtype)
+        return np.memmap(self.path / name, dtype=dtype, mode="r", shape=(n_runs, self.n_cases))
+
+    @property
+    def preds(self) -> np.ndarray:
+        return self._map(_PREDS_FILE, np.int8)
+
+    @property
+    def confidence(self) -> Optional[np.ndarray]:
+        return self._map(_CONF_FILE, np.float16) if self.with_confidence else None
+
+
+def _chunks(n: int, chunk_size: int):
+    for start in range(0, n, chunk_size):
+        yield slice(start, min(start + chunk_size, n))
+
+
+def case_votes(preds: np.ndarray, chunk_size: int = 1 << 18):
+    """Per case: number of positive votes and of valid (non-missing) votes."""
+    n = preds.shape[1]
+    n_pos = np.empty(n, dtype=np.int32)
+    n_valid = np.empty(n, dtype=np.int32)
+    for sl in _chunks(n, chunk_size):
+        block = np.asarray(preds[:, sl])
+        n_pos[sl] = (block == 1).sum(axis=0)
+        n_valid[sl] = (block != MISSING).sum(axis=0)
+    return n_pos, n_valid
+
+
+def run_confusion(preds: np.ndarray, y_true, complete_only: bool = True, chunk_size: int = 1 << 18) -> pd.DataFrame:
+    """Per-run TP/FN/TN/FP with sensitivity and specificity.
+
+    With ``complete_only`` only cases answered in every run count, as in
+    ``evaluate_gpt_runs``; otherwise each run uses its own answered cases.
+    """
+    y = np.asarray(y_true).astype(int)
+    n_runs, n = preds.shape
+    counts = np.zeros((n_runs, 4), dtype=np.int64)  # TP, FN, TN, FP
+    for sl in _chunks(n, chunk_size):
+        block = np.asarray(preds[:, sl])
+        pos = y[sl] == 1
+        valid = block != MISSING
+        if complete_only:
+            valid = np.broadcast_to(valid.all(axis=0), block.shape)
+        hit = block == 1
+        counts[:, 0] += (hit & valid & pos).sum(axis=1)
+        counts[:, 1] += (~hit & valid & pos).sum(axis=1)
+        counts[:, 2] += (~hit & valid & ~pos).sum(axis=1)
+        counts[:, 3] += (hit & valid & ~pos).sum(axis=1)
+    out = pd.DataFrame(counts, columns=["TP", "FN", "TN", "FP"])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out["sensitivity"] = out["TP"] / (out["TP"] + out["FN"])
+        out["specificity"] = out["TN"] / (out["TN"] + out["FP"])
+    return out
+
+
+def majority_vote(n_pos: np.ndarray, n_valid: np.ndarray) -> np.ndarray:
+    """1 when at least half of the valid votes are positive (ties -> 1); ``MISSING`` without votes."""
+    vote = (2 * n_pos >= n_valid).astype(np.int8)
+    vote[n_valid == 0] = MISSING
+    return vote
+
+
+def weighted_vote(preds: np.ndarray, confidence: np.ndarray, chunk_size: int = 1 << 18) -> np.ndarray:
+    """Confidence-weighted vote: positive when the confidence mass on 1 is at least that on 0.
+
+    Votes with a missing (NaN) confidence weigh 0.5.
+    """
+    n = preds.shape[1]
+    out = np.empty(n, dtype=np.int8)
+    for sl in _chunks(n, chunk_size):
+        block = np.asarray(preds[:, sl])
+        w = np.asarray(confidence[:, sl], dtype=np.float32)
+        w = np.where(np.isnan(w), 0.5, w) * (block != MISSING)
+        margin = (w * (2 * (block == 1) - 1)).sum(axis=0)
+        out[sl] = np.where(w.sum(axis=0) > 0, (margin >= 0).astype(np.int8), MISSING)
+    return out
+
+
+def fleiss_kappa(n_pos: np.ndarray, n_valid: np.ndarray, n_runs: int) -> float:
+    """Fleiss' kappa over cases answered in all ``n_runs`` runs (binary categories, runs as raters)."""
+    R = int(n_runs)
+    full = n_valid == R
+    if R < 2 or not full.any():
+        return np.nan
+    n1 = n_pos[full].astype(float)
+    n0 = R - n1
+    P_i = (n1 * (n1 - 1) + n0 * (n0 - 1)) / (R * (R - 1))
+    p1 = n1.sum() / (full.sum() * R)
+    P_e = p1 ** 2 + (1 - p1) ** 2
+    return float((P_i.mean() - P_e) / (1 - P_e)) if P_e < 1 else np.nan
+
+
+def vote_entropy(n_pos: np.ndarray, n_valid: np.ndarray) -> np.ndarray:
+    """Per-case binary entropy (bits) of the positive-vote share; NaN without votes."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = n_pos / n_valid
+        h = -(np.where(p > 0, p * np.log2(p), 0.0) + np.where(p < 1, (1 - p) * np.log2(1 - p), 0.0))
+    return np.where(n_valid > 0, h, np.nan)
+
+
+def _sens_spec(vote: np.ndarray, y: np.ndarray):
+    ok = vote != MISSING
+    pos, hit = (y == 1) & ok, vote == 1
+    neg = (y == 0) & ok
+    s = (hit & pos).sum() / pos.sum() if pos.any() else np.nan
+    t = (~hit & neg).sum() / neg.sum() if neg.any() else np.nan
+    return float(s), float(t)
+
+
+@instrument(rows="y_true")
+def evaluate_runs(preds: np.ndarray, y_true, confidence: Optional[np.ndarray] = None,
+                  chunk_size: int = 1 << 18) -> Dict:
+    """Per-run and aggregate sensitivity/specificity plus inter-run agreement for an int8 run matrix."""
+    y = np.asarray(y_true).astype(int)
+    per_run = run_confusion(preds, y, complete_only=True, chunk_size=chunk_size)
+    n_pos, n_valid = case_votes(preds, chunk_size)
+    entropy = vote_entropy(n_pos, n_valid)
+    out = {
+        "per_run": per_run,
+        "s_mean": float(per_run["sensitivity"].mean()), "t_mean": float(per_run["specificity"].mean()),
+        "n_complete": int((n_valid == preds.shape[0]).sum()),
+        "fleiss_kappa": fleiss_kappa(n_pos, n_valid, preds.shape[0]),
+        "mean_vote_entropy": float(np.nanmean(entropy)) if np.any(n_valid > 0) else np.nan,
+        "vote_entropy": entropy,
+    }
+    out["majority_sensitivity"], out["majority_specificity"] = _sens_spec(majority_vote(n_pos, n_valid), y)
+    if confidence is not None:
+        out["weighted_sensitivity"], out["weighted_specificity"] = _sens_spec(
+            weighted_vote(preds, confidence, chunk_size), y)
+    return out
@@ -0,0 +1,145 @@
+from __future__ import annotations
+import math
+from dataclasses import dataclass, field
+from typing import Dict, List, Mapping
+import numpy as np
+import pandas as pd
+from src.data.preprocess import CONT_COLS, CAT_COLS
+
+
+def _expit(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -500, 500)))
+
+
+def _category_codes(values: pd.Index, col) -> np.ndarray:
+    # hash lookup without casting: NaN, unseen values and other dtypes give -1
+    return values.get_indexer(pd.Index(np.asarray(col).ravel()))
+
+
+@dataclass
+class FusedLogRegScorer:
+    """``train_logreg`` pipeline folded into one affine map plus sigmoid.
+
+    Scaling is folded into ``weights``/``intercept``; each categorical column
+    becomes a lookup from category value to its logit contribution (0 for the
+    dropped first level and for unseen values, as with ``handle_unknown="ignore"``).
+    """
+    cont_cols: List[str]
+    weights: np.ndarray
+    intercept: float
+    cat_cols: List[str]
+    cat_values: List[np.ndarray]
+    cat_contrib: List[np.ndarray]
+    _lookup: List[Dict] = field(init=False, repr=False)
+    _index: List[pd.Index] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self._lookup = [dict(zip(v.tolist(), c.tolist()))
+                        for v, c in zip(self.cat_values, self.cat_contrib)]
+        self._index = [pd.Index(v) for v in self.cat_values]
+
+    @classmethod
+    def from_pipeline(cls, pipe) -> "FusedLogRegScorer":
+        prep = pipe.named_steps["prep"]
+        clf = pipe.named_steps["clf"]
+        scaler = prep.named_transformers_["num"]
+        ohe = prep.named_transformers_["cat"]
+        coef = clf.coef_.ravel()
+        n_cont = len(CONT_COLS)
+
+        w = coef[:n_cont] / scaler.scale_
+        b = float(clf.intercept_[0] - np.dot(w, scaler.mean_))
+
+        cat_values, cat_contrib = [], []
+        pos = n_cont
+        drop_idx = ohe.drop_idx_ if ohe.drop_idx_ is not None else [None] * len(CAT_COLS)
+        for cats, drop in zip(ohe.categories_, drop_idx):
+            contrib = np.zeros(len(cats))
+            keep = [i for i in range(len(cats)) if drop is None or i != drop]
+            contrib[keep] = coef[pos:pos + len(keep)]
+            pos += len(keep)
+            cat_values.append(np.asarray(cats))
+            cat_contrib.append(contrib)
+        if pos != len(coef):
+            raise ValueError("Pipeline feature layout does not match CONT_COLS + one-hot CAT_COLS.")
+        return cls(list(CONT_COLS), w, b, list(CAT_COLS), cat_values, cat_contrib)
+
+    def _cat_logit(self, j: int, col: np.ndarray) -> np.ndarray:
+        idx = _category_codes(self._index[j], col)
+        return np.where(idx >= 0, self.cat_contrib[j][idx], 0.0)
+
+    def decision_function(self, X) -> np.ndarray:
+        if isinstance(X, pd.DataFrame):
+            cont = X[self.cont_cols].to_numpy(dtype=float)
+        else:
+            cont = np.column_stack([np.asarray(X[c], dtype=float) for c in self.cont_cols])
+        z = cont @ self.weights + self.intercept
+        for j, c in enumerate(self.cat_cols):
+            z = z + self._cat_logit(j, np.asarray(X[c]).ravel())
+        return z
+
+    def predict_proba(self, X) -> np.ndarray:
+        """Drop-in for ``pipe.predict_proba`` on a DataFrame or a mapping of column arrays."""
+        p = _expit(self.decision_function(X))
+        return np.column_stack([1.0 - p, p])
+
+    def predict_proba_row(self, row: Mapping) -> float:
+        """Positive-class probability for a single dict row, in plain Python."""
+        z = self.intercept
+        for c, w in zip(self.cont_cols, self.weights.tolist()):
+            z += w * float(row[c])
+        for j, c in enumerate(self.cat_cols):
+            z += self._lookup[j].get(row[c], 0.0)
+        return 1.0 / (1.0 + math.exp(-max(min(z, 500.0), -500.0)))
+
+    def verify(self, pipe, X: pd.DataFrame, atol: float = 1e-9) -> float:
+        """Max |fused - pipe| over ``X``; raises if it exceeds ``atol``."""
+        diff = float(np.max(np.abs(self.predict_proba(X) - pipe.predict_proba(X))))
+        if diff > atol:
+            raise ValueError(f"Fused scorer deviates from pipeline by {diff:.3g} (atol={atol}).")
+        return diff
+
+
+@dataclass
+class StackedLogRegScorer:
+    """Several fused logreg models (e.g. CV folds) scored together: one (n, K) logit matrix per call."""
+    cont_cols: List[str]
+    weights: np.ndarray          # (n_cont, K)
+    intercepts: np.ndarray       # (K,)
+    cat_cols: List[str]
+    cat_values: List[np.ndarray]  # union of categories seen by any model
+    cat_tables: List[np.ndarray]  # (n_values, K) logit contribution per model
+    _index: List[pd.Index] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self._index = [pd.Index(v) for v in self.cat_values]
+
+    @classmethod
+    def from_pipelines(cls, pipes) -> "StackedLogRegScorer":
+        fused = [FusedLogRegScorer.from_pipeline(p) for p in pipes]
+        K = len(fused)
+        values, tables = [], []
+        for j in range(len(CAT_COLS)):
+            union = np.unique(np.concatenate([f.cat_values[j] for f in fused]))
+            table = np.zeros((len(union), K))
+            for k, f in enumerate(fused):
+                table[np.searchsorted(union, f.cat_values[j]), k] = f.cat_contrib[j]
+            values.append(union)
+            tables.append(table)
+        return cls(list(CONT_COLS), np.column_stack([f.weights for f in fused]),
+                   np.array([f.intercept for f in fused]), list(CAT_COLS), values, tables)
+
+    def decision_function(self, X) -> np.ndarray:
+        if isinstance(X, pd.DataFrame):
+            cont = X[self.cont_cols].to_numpy(dtype=float)
+        else:
+            cont = np.column_stack([np.asarray(X[c], dtype=float) for c in self.cont_cols])
+        z = cont @ self.weights + self.intercepts
+        for j, c in enumerate(self.cat_cols):
+            idx = _category_codes(self._index[j], X[c])
+            z += np.where((idx >= 0)[:, None], self.cat_tables[j][idx], 0.0)
+        return z
+
+    def predict_proba_pos(self, X) -> np.ndarray:
+        """(n, K) positive-class probability under each model."""
+        return _expit(self.decision_function(X))
@@ -0,0 +1,149 @@
+from __future__ import annotations
+import queue
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterable, Iterator, List
+import numpy as np
+import pandas as pd
+from src.models.conformal_prediction import cp_partition_from_proba
+
+_END = object()
+
+
+def _to_frame(item) -> pd.DataFrame:
+    if isinstance(item, pd.DataFrame):
+        return item
+    if isinstance(item, np.ndarray) and item.dtype.names:
+        return pd.DataFrame(np.atleast_1d(item))
+    if hasattr(item, "to_pandas"):  # pyarrow RecordBatch / Table
+        return item.to_pandas()
+    raise TypeError(f"unsupported row/batch type: {type(item).__name__}")
+
+
+def _n_rows(item) -> int:
+    return 1 if isinstance(item, dict) else len(item)
+
+
+class BatchInferenceService:
+    """Scores a stream of unlabeled rows in micro-batches and tags each with its CP region.
+
+    Items may be dict rows, DataFrames, NumPy structured arrays or Arrow record
+    batches. A batch is flushed once it holds ``batch_size`` rows or its oldest
+    row has waited ``max_latency_ms``; the stream is read on a background thread
+    so the deadline fires even while the source is idle. An optional
+    ``monitor`` (``DriftMonitor``) is updated with every scored batch.
+    """
+
+    def __init__(self, pipe, q: float, batch_size: int = 256, max_latency_ms: float = 10.0,
+                 stats_window: int = 100_000, monitor=None):
+        self.pipe = pipe
+        self.q = float(q)
+        self.monitor = monitor
+        self.batch_size = int(batch_size)
+        self.max_latency = max_latency_ms / 1000.0
+        self._latencies = deque(maxlen=stats_window)
+        self._rows = 0
+        self._busy = 0.0
+        self._t_start = None
+        self._t_end = None
+
+    def score_frame(self, X: pd.DataFrame) -> Dict[str, np.ndarray]:
+        proba = self.pipe.predict_proba(X)
+        out = cp_partition_from_proba(proba, self.q)
+        return {"proba": proba[:, 1], "y_pred": out["y_pred"], "region": out["region"]}
+
+    def _flush(self, pending: List, arrivals: List[float]) -> Iterator[dict]:
+        t0 = time.perf_counter()
+        frames, dicts = [], []
+        for item in pending:
+            if isinstance(item, dict):
+                dicts.append(item)
+                continue
+            if dicts:
+                frames.append(pd.DataFrame.from_records(dicts)); dicts = []
+            frames.append(item)
+        if dicts:
+            frames.append(pd.DataFrame.from_records(dicts))
+        X = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+        res = self.score_frame(X)
+        if self.monitor is not None:
+            self.monitor.update(X, res["region"])
+        t1 = time.perf_counter()
+
+        sizes = [_n_rows(item) for item in pending]
+        self._latencies.extend(np.repeat(t1 - np.asarray(arrivals), sizes).tolist())
+        self._rows += len(X)
+        self._busy += t1 - t0
+        for p, yp, r in zip(res["proba"].tolist(), res["y_pred"].tolist(), res["region"].tolist()):
+            yield {"proba": p, "y_pred": yp, "region": r}
+
+    def run(self, stream: Iterable) -> Iterator[dict]:
+        """Yield ``{proba, y_pred, region}`` per input row, in input order."""
+        buf: queue.Queue = queue.Queue(maxsize=4 * self.batch_size)
+        stop = threading.Event()  # set when the consumer stops iterating, even early
+
+        def _put(entry) -> bool:
+            while not stop.is_set():
+                try:
+                    buf.put(entry, timeout=0.1)
+                    return True
+                except queue.Full:
+                    pass
+            return False
+
+        def _reader():
+            try:
+                for item in stream:
+                    if not _put((time.perf_counter(), item)):
+                        return
+            except BaseException as e:
+                _put((None, e))
+            _put((None, _END))
+
+        threading.Thread(target=_reader, daemon=True).start()
+        self._t_start = time.perf_counter()
+        pending, arrivals, n_pending = [], [], 0
+        try:
+            while True:
+                timeout = None if not pending else max(0.0, arrivals[0] + self.max_latency - time.perf_counter())
+                try:
+                    t_arr, item = buf.get(timeout=timeout)
+                except queue.Empty:
+                    yield from self._flush(pending, arrivals)
+                    pending, arrivals, n_pending = [], [], 0
+                    continue
+                if t_arr is None:
+                    if pending:
+                        yield from self._flush(pending, arrivals)
+                    self._t_end = time.perf_counter()
+                    if item is not _END:
+                        raise item
+                    return
+                if not isinstance(item, dict):
+                    item = _to_frame(item)
+                pending.append(item); arrivals.append(t_arr)
+                n_pending += _n_rows(item)
+                if n_pending >= self.batch_size:
+                    yield from self._flush(pending, arrivals)
+                    pending, arrivals, n_pending = [], [], 0
+        finally:
+            # unblock the reader and let it exit instead of waiting on a full queue forever
+            stop.set()
+            while True:
+                try:
+                    buf.get_nowait()
+                except queue.Empty:
+                    break
+
+    def stats(self) -> Dict[str, float]:
+        lat = np.asarray(self._latencies, dtype=float) * 1000.0
+        end = self._t_end if self._t_end is not None else time.perf_counter()
+        wall = (end - self._t_start) if self._t_start is not None else np.nan
+        return {
+            "rows": self._rows,
+            "p50_latency_ms": float(np.percentile(lat, 50)) if lat.size else np.nan,
+            "p99_latency_ms": float(np.percentile(lat, 99)) if lat.size else np.nan,
+            "rows_per_sec": self._rows / wall if wall and wall > 0 else np.nan,
+            "model_rows_per_sec": self._rows / self._busy if self._busy > 0 else np.nan,
+        }
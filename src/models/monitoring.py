@@ -0,0 +1,225 @@
+from __future__ import annotations
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Sequence
+import numpy as np
+import pandas as pd
+from src.data.preprocess import CONT_COLS, CAT_COLS
+from src.evaluation.metrics import wilson_ci
+from src.models.conformal_prediction import _true_class_proba
+
+_EPS = 1e-4  # floor for bin proportions in PSI
+
+
+class _RollingCounts:
+    """Per-column bin counts over the last ``window`` rows, kept with a ring buffer of bin codes."""
+
+    def __init__(self, window: int, n_cols: int, n_bins: int):
+        self.window, self.n_cols, self.n_bins = window, n_cols, n_bins
+        self.codes = np.zeros((window, n_cols), dtype=np.int32)
+        self.counts = np.zeros((n_cols, n_bins), dtype=np.int64)
+        self.n = 0  # rows pushed so far
+
+    def __len__(self) -> int:
+        return min(self.n, self.window)
+
+    def _count(self, codes: np.ndarray) -> np.ndarray:
+        flat = (codes + self.n_bins * np.arange(self.n_cols)).ravel()
+        return np.bincount(flat, minlength=self.n_cols * self.n_bins).reshape(self.n_cols, self.n_bins)
+
+    def push(self, codes: np.ndarray):
+        codes = np.asarray(codes, dtype=np.int32).reshape(len(codes), self.n_cols)
+        b = len(codes)
+        if b >= self.window:
+            last = codes[-self.window:]
+            g = self.n + b - self.window + np.arange(self.window)
+            self.codes[g % self.window] = last
+            self.counts = self._count(last)
+        elif b:
+            g = self.n + np.arange(b)
+            slots = g % self.window
+            old = g >= self.window  # slot holds a row that now leaves the window
+            if old.any():
+                self.counts -= self._count(self.codes[slots[old]])
+            self.codes[slots] = codes
+            self.counts += self._count(codes)
+        self.n += b
+
+
+class DriftMonitor:
+    """Constant-memory drift and CP-coverage monitor for scored production rows.
+
+    Continuous features are binned on the reference deciles (plus a missing
+    bin), categoricals on the reference categories (plus "other"). The last
+    ``window`` rows are kept as bin codes, so ``update`` costs O(1) per row and
+    per feature; Welford mean/variance cover all rows seen. PSI and a binned KS
+    (max CDF gap at the bin edges, a lower bound of the exact statistic) are
+    computed from the window counts every ``check_every`` rows, in O(bins).
+
+    Coverage uses labels as they arrive (``observe_labels``, which re-checks
+    coverage every ``check_every`` labels): a row is covered
+    when ``1 - p_true <= q``. An alert fires when the Wilson upper bound of the
+    rolling coverage drops below ``1 - alpha``, or when the rolling U rate moves
+    more than ``u_rate_tol`` from the reference U rate.
+    """
+
+    def __init__(self, reference: pd.DataFrame, q: float, alpha: float, reference_proba=None,
+                 cont_cols: Sequence[str] = CONT_COLS, cat_cols: Sequence[str] = CAT_COLS,
+                 n_bins: int = 10, window: int = 1000, check_every: int = 100, min_rows: int = 200,
+                 psi_alert: float = 0.2, ks_alert: float = 0.15, u_rate_tol: float = 0.1,
+                 on_alert: Optional[Callable[[dict], None]] = None, max_alerts: int = 1000):
+        self.q, self.alpha = float(q), float(alpha)
+        self.cont_cols, self.cat_cols = list(cont_cols), list(cat_cols)
+        self.window, self.check_every, self.min_rows = window, check_every, min_rows
+        self.psi_alert, self.ks_alert, self.u_rate_tol = psi_alert, ks_alert, u_rate_tol
+        self.on_alert = on_alert
+        self.alerts: deque = deque(maxlen=max_alerts)
+
+        ref = reference[self.cont_cols].to_numpy(dtype=float)
+        self._edges = [np.unique(np.nanquantile(ref[:, j], np.linspace(0, 1, n_bins + 1)[1:-1]))
+                       for j in range(ref.shape[1])]
+        self._cont_bins = max((len(e) + 2 for e in self._edges), default=1)  # bins + missing
+        self._cats = [sorted(reference[c].dropna().unique().tolist(), key=str) for c in self.cat_cols]
+        self._cat_bins = max((len(c) + 1 for c in self._cats), default=1)  # categories + other
+
+        self.ref_cont = self._proportions(self._cont_codes(reference), self._cont_bins)
+        self.ref_cat = self._proportions(self._cat_codes(reference), self._cat_bins)
+        self.ref_mean = np.nanmean(ref, axis=0)
+        self.ref_std = np.nanstd(ref, axis=0, ddof=1)
+        self.ref_u_rate = None
+        if reference_proba is not None:
+            maxp = np.maximum(np.asarray(reference_proba), 1.0 - np.asarray(reference_proba))
+            self.ref_u_rate = float(np.mean((1.0 - maxp) > self.q))
+
+        self._cont = _RollingCounts(window, len(self.cont_cols), self._cont_bins)
+        self._cat = _RollingCounts(window, len(self.cat_cols), self._cat_bins)
+        self._region = _RollingCounts(window, 1, 2)   # 1 = U
+        self._covered = _RollingCounts(window, 1, 2)  # 1 = covered
+        self.n = 0
+        self.n_labels = 0
+        self._next_label_check = check_every
+        self._mean = np.zeros(len(self.cont_cols))
+        self._m2 = np.zeros(len(self.cont_cols))
+        self._count = np.zeros(len(self.cont_cols))
+        self._next_check = check_every
+
+    def _cont_codes(self, df: pd.DataFrame) -> np.ndarray:
+        X = df[self.cont_cols].to_numpy(dtype=float)
+        codes = np.empty(X.shape, dtype=np.int32)
+        for j, e in enumerate(self._edges):
+            codes[:, j] = np.where(np.isnan(X[:, j]), len(e) + 1, np.searchsorted(e, X[:, j], side="right"))
+        return codes
+
+    def _cat_codes(self, df: pd.DataFrame) -> np.ndarray:
+        codes = np.empty((len(df), len(self.cat_cols)), dtype=np.int32)
+        for j, (c, cats) in enumerate(zip(self.cat_cols, self._cats)):
+            k = pd.Categorical(df[c], categories=cats).codes
+            codes[:, j] = np.where(k < 0, len(cats), k)
+        return codes
+
+    @staticmethod
+    def _proportions(codes: np.ndarray, n_bins: int) -> np.ndarray:
+        out = np.stack([np.bincount(codes[:, j], minlength=n_bins) for j in range(codes.shape[1])]) \
+            if codes.shape[1] else np.zeros((0, n_bins))
+        return out / max(len(codes), 1)
+
+    def _welford(self, X: np.ndarray):
+        # Chan et al. merge of the batch moments into the running ones
+        ok = ~np.isnan(X)
+        nb = ok.sum(axis=0)
+        with np.errstate(invalid="ignore"):
+            mb = np.where(nb > 0, np.nansum(X, axis=0) / np.maximum(nb, 1), 0.0)
+            m2b = np.nansum((X - mb) ** 2 * ok, axis=0)
+        n = self._count + nb
+        delta = mb - self._mean
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self._mean = np.where(n > 0, self._mean + delta * nb / np.maximum(n, 1), 0.0)
+            self._m2 = self._m2 + m2b + delta ** 2 * self._count * nb / np.maximum(n, 1)
+        self._count = n
+
+    def update(self, X: pd.DataFrame, region: Optional[Sequence[str]] = None):
+        """Add scored rows (features and, if known, their CP region "C"/"U")."""
+        if len(X) == 0:
+            return self
+        self._welford(X[self.cont_cols].to_numpy(dtype=float))
+        self._cont.push(self._cont_codes(X))
+        self._cat.push(self._cat_codes(X))
+        if region is not None:
+            self._region.push((np.asarray(region) == "U").astype(np.int32))
+        self.n += len(X)
+        if self.n >= self._next_check:
+            self._next_check = self.n + self.check_every
+            self.check()
+        return self
+
+    def observe_labels(self, proba_pos, y_true):
+        """Record outcomes for previously scored rows; ``proba_pos`` is the positive-class score."""
+        covered = (1.0 - _true_class_proba(np.asarray(proba_pos, dtype=float), np.asarray(y_true).astype(int))) <= self.q
+        self._covered.push(covered.astype(np.int32))
+        self.n_labels += len(covered)
+        if self.n_labels >= self._next_label_check:
+            self._next_label_check = self.n_labels + self.check_every
+            self._emit(self._coverage_alerts(self.coverage()))
+        return self
+
+    @staticmethod
+    def _psi_ks(counts: np.ndarray, ref: np.ndarray, n: int):
+        live = counts / max(n, 1)
+        a, e = np.maximum(live, _EPS), np.maximum(ref, _EPS)
+        psi = np.sum((a - e) * np.log(a / e), axis=1)
+        ks = np.max(np.abs(np.cumsum(live, axis=1) - np.cumsum(ref, axis=1)), axis=1)
+        return psi, ks
+
+    def drift_scores(self) -> pd.DataFrame:
+        """PSI/KS per feature over the window, plus running mean/std against the reference."""
+        psi_c, ks_c = self._psi_ks(self._cont.counts, self.ref_cont, len(self._cont))
+        psi_k, ks_k = self._psi_ks(self._cat.counts, self.ref_cat, len(self._cat))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(self._m2 / np.maximum(self._count - 1, 1))
+            shift = (self._mean - self.ref_mean) / self.ref_std
+        cont = pd.DataFrame({"feature": self.cont_cols, "kind": "continuous", "psi": psi_c, "ks": ks_c,
+                             "mean": self._mean, "std": std, "ref_mean": self.ref_mean,
+                             "ref_std": self.ref_std, "mean_shift_sd": shift})
+        cat = pd.DataFrame({"feature": self.cat_cols, "kind": "categorical", "psi": psi_k, "ks": ks_k})
+        return pd.concat([cont, cat], ignore_index=True)
+
+    def coverage(self) -> Dict[str, float]:
+        n_lab, n_reg = len(self._covered), len(self._region)
+        cov = self._covered.counts[0, 1] / n_lab if n_lab else np.nan
+        lo, hi = wilson_ci(cov, n_lab)
+        return {
+            "target": 1.0 - self.alpha, "coverage": float(cov), "coverage_lo": float(lo), "coverage_hi": float(hi),
+            "n_labeled": n_lab, "u_rate": float(self._region.counts[0, 1] / n_reg) if n_reg else np.nan,
+            "ref_u_rate": self.ref_u_rate, "n_scored": n_reg,
+        }
+
+    def _coverage_alerts(self, cov: Dict[str, float]) -> List[dict]:
+        new = []
+        if cov["n_labeled"] >= self.min_rows and cov["coverage_hi"] < cov["target"]:
+            new.append({"kind": "coverage", "feature": None, "value": cov["coverage"], "limit": cov["target"]})
+        return new
+
+    def _emit(self, new: List[dict]) -> List[dict]:
+        for a in new:
+            a["rows_seen"], a["time"] = self.n, time.time()
+            self.alerts.append(a)
+            if self.on_alert is not None:
+                self.on_alert(a)
+        return new
+
+    def check(self) -> List[dict]:
+        """Evaluate alert rules now; new alerts are stored in ``alerts`` and passed to ``on_alert``."""
+        new = []
+        if len(self._cont) >= self.min_rows:
+            scores = self.drift_scores()
+            for r in scores.itertuples():
+                if r.psi > self.psi_alert:
+                    new.append({"kind": "psi", "feature": r.feature, "value": float(r.psi), "limit": self.psi_alert})
+                if r.ks > self.ks_alert:
+                    new.append({"kind": "ks", "feature": r.feature, "value": float(r.ks), "limit": self.ks_alert})
+        cov = self.coverage()
+        new += self._coverage_alerts(cov)
+        if (self.ref_u_rate is not None and cov["n_scored"] >= self.min_rows
+                and abs(cov["u_rate"] - self.ref_u_rate) > self.u_rate_tol):
+            new.append({"kind": "u_rate", "feature": None, "value": cov["u_rate"], "limit": self.ref_u_rate})
+        return self._emit(new)
@@ -0,0 +1,130 @@
+from __future__ import annotations
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+DEFAULT_CACHE = PROJECT_ROOT / "data" / "cache" / "expert_responses.sqlite"
+
+
+class CacheMissError(KeyError):
+    """Raised in replay mode when a request has no cached response."""
+
+
+class ResponseCache:
+    """SQLite-backed store of parsed expert responses keyed on the full request.
+
+    Eviction is least-recently-used once ``max_entries`` or ``max_bytes`` is
+    exceeded. Access times of hits are buffered and written in one transaction
+    on the next ``put``, every ``flush_every`` hits and on ``flush``/``close``, so a
+    fully cached replay does not commit once per lookup. With ``read_only=True``
+    the database is opened read-only, lookups do not touch access times, and
+    callers should treat a miss as an error (replay).
+    Safe to share between the threads of one process.
+    """
+
+    def __init__(self, path: Path | str = DEFAULT_CACHE, max_entries: Optional[int] = None,
+                 max_bytes: Optional[int] = None, read_only: bool = False, flush_every: int = 1000):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.read_only = read_only
+        self.flush_every = flush_every
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}
+        if read_only:
+            self._conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+            self._conn.commit()
+
+    @staticmethod
+    def make_key(model: str, temperature: float, messages: List[Dict[str, str]], run_index: int = 0) -> str:
+        payload = json.dumps([model, float(temperature), messages, int(run_index)],
+                             ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if not self.read_only:
+                self._touched[key] = time.time()
+                if len(self._touched) >= self.flush_every:
+                    self._flush_access()
+                    self._conn.commit()
+        return json.loads(row[0])
+
+    def _flush_access(self):
+        if self._touched:
+            self._conn.executemany("UPDATE responses SET last_access = ? WHERE key = ?",
+                                   [(t, k) for k, t in self._touched.items()])
+            self._touched.clear()
+
+    def flush(self):
+        """Write buffered access times now."""
+        if self.read_only:
+            return
+        with self._lock:
+            self._flush_access()
+            self._conn.commit()
+
+    def put(self, key: str, value: Dict):
+        if self.read_only:
+            return
+        text = json.dumps(value, ensure_ascii=False)
+        with self._lock:
+            self._flush_access()  # eviction below must see current access times
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, text, len(text.encode("utf-8")), time.time()),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        if self.max_entries is not None:
+            (n,) = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if n > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE key IN "
+                    "(SELECT key FROM responses ORDER BY last_access LIMIT ?)", (n - self.max_entries,)
+                )
+        if self.max_bytes is not None:
+            (total,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+            excess = total - self.max_bytes
+            if excess > 0:
+                victims = []
+                for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_access"):
+                    victims.append((key,))
+                    excess -= size
+                    if excess <= 0:
+                        break
+                self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self)}
+
+    def close(self):
+        self.flush()
+        self._conn.close()
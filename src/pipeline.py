@@ -0,0 +1,251 @@
+"""Incremental command-line version of conformal_prediction.ipynb.
+
+Stages run in order data -> train -> calibrate -> partition -> expert -> report.
+Each stage writes into ``data/cache/pipeline/<stage>/<key>/``, where ``key``
+hashes the stage's own parameters and the *content* of its inputs' outputs, so
+a stage is recomputed only when something it reads changed (refitting to an
+identical model does not invalidate calibration). Heavy dependencies (sklearn,
+matplotlib, openai) are imported inside the stages that use them.
+
+    python -m src.pipeline --until partition --alpha 0.2   # recompute CP only
+    python -m src.pipeline --expert openai                  # full run incl. GPT
+"""
+from __future__ import annotations
+import argparse
+import hashlib
+import json
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Tuple
+import numpy as np
+from src.data.dataset_store import _file_hash
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+CACHE_DIR = PROJECT_ROOT / "data" / "cache" / "pipeline"
+RAW_CSV = PROJECT_ROOT / "data" / "raw" / "ds_whole.csv"
+FIG_DIR = PROJECT_ROOT / "reports" / "build" / "figures"  # not the committed reports/figures
+TRAIN_SPEC = {"model": "train_logreg", "version": 1}  # bump when train_logreg changes
+
+DEFAULTS = {
+    "seed": 42, "test_size": 0.2, "calib_size": 0.2, "group_by_patient": False,
+    "alpha": 0.30, "alphas": [0.05, 0.10, 0.15, 0.20, 0.30],
+    "expert": "none", "model": "gpt-4o-mini", "n_runs": 5, "temperature": 0.2, "n_fewshot": 4,
+    "s_gpt": 0.9,
+}
+
+
+def _dir_digest(path: Path) -> str:
+    h = hashlib.sha256()
+    for f in sorted(p for p in path.iterdir() if p.is_file() and p.name != "stage.json"):
+        h.update(f.name.encode())
+        h.update(_file_hash(f).encode())
+    return h.hexdigest()
+
+
+def _to_builtin(o):
+    return o.tolist() if isinstance(o, np.ndarray) else o.item()
+
+
+def _save_json(path: Path, obj):
+    path.write_text(json.dumps(obj, indent=2, default=_to_builtin))
+
+
+def _load_json(path: Path):
+    return json.loads(path.read_text())
+
+
+def _load_frames(data_dir: Path, names=("train", "calib", "test")):
+    from src.data.dataset_store import load_split
+    return {n: load_split(n, rows=np.load(data_dir / f"{n}.npy")) for n in names}
+
+
+def _load_pipe(train_dir: Path):
+    import pickle
+    with open(train_dir / "pipe.pkl", "rb") as f:
+        return pickle.load(f)
+
+
+# Each stage: fn(params, inputs, out_dir) with ``inputs`` mapping dependency name -> its output dir.
+
+def _stage_data(p, inputs, out: Path):
+    from src.data.dataset_store import build_store, split_indices
+    manifest = build_store(RAW_CSV)
+    # the store content is read downstream, so its hash must be part of this stage's output
+    _save_json(out / "source.json", {"source_sha256": manifest["source_sha256"]})
+    rows = split_indices(p["test_size"], p["calib_size"], p["seed"], group_by_patient=p["group_by_patient"])
+    for name, idx in rows.items():
+        np.save(out / f"{name}.npy", idx)
+
+
+def _stage_train(p, inputs, out: Path):
+    import pickle
+    from src.data.preprocess import split_X_y
+    from src.models.baseline import train_logreg
+    frames = _load_frames(inputs["data"])
+    pipe = train_logreg(frames["train"])
+    with open(out / "pipe.pkl", "wb") as f:
+        pickle.dump(pipe, f)
+    for name in ("calib", "test"):
+        X, y = split_X_y(frames[name])
+        np.save(out / f"proba_{name}.npy", pipe.predict_proba(X)[:, 1])
+        np.save(out / f"y_{name}.npy", y)
+
+
+def _stage_calibrate(p, inputs, out: Path):
+    from src.models.conformal_prediction import calibrate_threshold_from_proba, cp_sweep_from_proba
+    tr = inputs["train"]
+    pc, yc = np.load(tr / "proba_calib.npy"), np.load(tr / "y_calib.npy")
+    pt, yt = np.load(tr / "proba_test.npy"), np.load(tr / "y_test.npy")
+    _save_json(out / "q.json", {"alpha": p["alpha"], "q": calibrate_threshold_from_proba(pc, yc, p["alpha"])})
+    sweep = cp_sweep_from_proba(pc, yc, pt, yt, p["alphas"])
+    sweep["FN_baseline"] = np.full(len(sweep["alpha"]), int(np.sum((yt == 1) & (pt < 0.5))))
+    _save_json(out / "sweep.json", sweep)
+
+
+def _stage_partition(p, inputs, out: Path):
+    from src.models.conformal_prediction import cp_partition_from_proba, summarize_counts
+    tr = inputs["train"]
+    q = _load_json(inputs["calibrate"] / "q.json")["q"]
+    for name in ("calib", "test"):
+        part = cp_partition_from_proba(np.load(tr / f"proba_{name}.npy"), q, np.load(tr / f"y_{name}.npy"))
+        np.save(out / f"region_{name}.npy", part["region"] == "U")  # True = deferred
+        if name == "test":
+            _save_json(out / "counts.json", summarize_counts(part["y_true"], part["y_pred"], part["region"]))
+
+
+def _stage_expert(p, inputs, out: Path):
+    if p["expert"] == "none":
+        _save_json(out / "expert.json", {"skipped": True})
+        return
+    from src.models.expert_integration import (FewShotExample, build_fewshot_block, format_case_cards,
+                                               stratified_sample_U, gpt_multiple_runs, evaluate_gpt_runs,
+                                               bootstrap_sensitivity_ci)
+    from src.models.expert_store import to_int8
+    from src.models.response_cache import ResponseCache
+    frames = _load_frames(inputs["data"], ("calib", "test"))
+    part = inputs["partition"]
+    test_u = frames["test"][np.load(part / "region_test.npy")]
+    calib_u = frames["calib"][np.load(part / "region_calib.npy")]
+    dev_u, _ = stratified_sample_U(calib_u, n_per_class=p["n_fewshot"], seed=p["seed"])
+    fewshot_block = build_fewshot_block([FewShotExample(case_card=card, label=int(y))
+                                         for card, y in zip(format_case_cards(dev_u), dev_u["glaucoma"])])
+    if p["expert"] == "openai":
+        from dotenv import load_dotenv
+        from openai import OpenAI
+        load_dotenv()
+        client, cache = OpenAI(), ResponseCache()
+    else:  # "cache": replay recorded responses only, raising CacheMissError otherwise
+        client, cache = None, ResponseCache(read_only=True)
+    all_preds = gpt_multiple_runs(client, p["model"], test_u, fewshot_block, n_runs=p["n_runs"],
+                                  temperature=p["temperature"], cache=cache)
+    s_list, y_true_eval, preds_eval = evaluate_gpt_runs(all_preds, test_u["glaucoma"].values)
+    s_ci = bootstrap_sensitivity_ci(preds_eval, y_true_eval, n_boot=1000, alpha=0.05)
+    np.save(out / "preds.npy", to_int8(all_preds))  # -1 = no answer
+    _save_json(out / "expert.json", {"skipped": False, "n_cases": len(test_u), "s_list": s_list,
+                                     "s_mean": float(s_list.mean()), "s_ci": list(s_ci)})
+
+
+def _stage_report(p, inputs, out: Path):
+    import pandas as pd
+    from src.evaluation.metrics import new_errors
+    from src.visualization.report import build_report, notebook_report_specs
+    df_cp = pd.DataFrame(_load_json(inputs["calibrate"] / "sweep.json"))
+    expert = _load_json(inputs["expert"] / "expert.json")
+    s_gpt = p["s_gpt"] if expert["skipped"] else expert["s_mean"]
+    df_cp["FN_oracle"] = df_cp["FN_confident"].astype(float)
+    df_cp["FN_gpt"] = new_errors(df_cp["FN_confident"], df_cp["FP_confident"], df_cp["U_pos"], df_cp["U_neg"],
+                                 s_gpt, 1.0)[0]
+    df_cp.to_csv(out / "df_cp.csv", index=False)
+    test = _load_frames(inputs["data"], ("test",))["test"]
+    specs = notebook_report_specs(pd.read_csv(RAW_CSV), test, _load_pipe(inputs["train"]), df_cp, round(s_gpt, 3))
+    _save_json(out / "figures.json", build_report(specs, out_dir=FIG_DIR))
+
+
+# name -> (dependencies, parameter names, function)
+STAGES: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...], Callable]] = {
+    "data": ((), ("seed", "test_size", "calib_size", "group_by_patient"), _stage_data),
+    "train": (("data",), (), _stage_train),
+    "calibrate": (("train",), ("alpha", "alphas"), _stage_calibrate),
+    "partition": (("train", "calibrate"), (), _stage_partition),
+    "expert": (("data", "partition"), ("expert", "model", "n_runs", "temperature", "n_fewshot", "seed"), _stage_expert),
+    "report": (("data", "train", "calibrate", "expert"), ("s_gpt",), _stage_report),
+}
+
+
+def stage_key(name: str, params: Dict, dep_digests: Dict[str, str]) -> str:
+    deps, keys, fn = STAGES[name]
+    payload = {"stage": name, "params": {k: params[k] for k in keys}, "inputs": dep_digests}
+    if name == "data":
+        payload["raw_sha256"] = _file_hash(RAW_CSV)
+    elif name == "train":
+        payload["spec"] = TRAIN_SPEC
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def run_pipeline(until: str = "report", force: Iterable[str] = (), cache_dir: Path = CACHE_DIR,
+                 verbose: bool = True, **params) -> Dict[str, Path]:
+    """Run stages up to ``until``, reusing every stage whose key is already cached; returns stage -> output dir."""
+    unknown = set(params) - set(DEFAULTS)
+    if unknown:
+        raise ValueError(f"Unknown parameters: {sorted(unknown)}")
+    if until not in STAGES:
+        raise ValueError(f"Unknown stage: {until}")
+    p = {**DEFAULTS, **params}
+    force = set(force)
+    dirs: Dict[str, Path] = {}
+    digests: Dict[str, str] = {}
+    for name, (deps, _, fn) in STAGES.items():
+        key = stage_key(name, p, {d: digests[d] for d in deps})
+        out = Path(cache_dir) / name / key
+        t0 = time.perf_counter()
+        if (out / "stage.json").exists() and name not in force:
+            status = "cached"
+        else:
+            tmp = out.with_name(key + ".tmp")
+            shutil.rmtree(tmp, ignore_errors=True)
+            tmp.mkdir(parents=True)
+            fn(p, {d: dirs[d] for d in deps}, tmp)
+            _save_json(tmp / "stage.json", {"stage": name, "key": key, "digest": _dir_digest(tmp)})
+            shutil.rmtree(out, ignore_errors=True)
+            tmp.rename(out)  # only complete outputs ever appear under the key
+            status = "ran"
+        dirs[name] = out
+        digests[name] = _load_json(out / "stage.json")["digest"]
+        if verbose:
+            print(f"{name:<10} {status:<7} {time.perf_counter() - t0:7.2f}s  {out}")
+        if name == until:
+            break
+    return dirs
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Run the CP + expert-deferral pipeline, recomputing only changed stages.")
+    ap.add_argument("--until", default="report", choices=list(STAGES))
+    ap.add_argument("--force", nargs="*", default=[], choices=list(STAGES), help="recompute these stages")
+    ap.add_argument("--seed", type=int, default=DEFAULTS["seed"])
+    ap.add_argument("--test-size", type=float, default=DEFAULTS["test_size"])
+    ap.add_argument("--calib-size", type=float, default=DEFAULTS["calib_size"])
+    ap.add_argument("--group-by-patient", action="store_true")
+    ap.add_argument("--alpha", type=float, default=DEFAULTS["alpha"], help="alpha used for partition/expert")
+    ap.add_argument("--alphas", type=float, nargs="*", default=DEFAULTS["alphas"], help="alphas for the CP sweep")
+    ap.add_argument("--expert", choices=("none", "openai", "cache"), default=DEFAULTS["expert"],
+                    help="none: skip GPT; openai: query (with response cache); cache: replay cached responses only")
+    ap.add_argument("--model", default=DEFAULTS["model"])
+    ap.add_argument("--n-runs", type=int, default=DEFAULTS["n_runs"])
+    ap.add_argument("--temperature", type=float, default=DEFAULTS["temperature"])
+    ap.add_argument("--n-fewshot", type=int, default=DEFAULTS["n_fewshot"])
+    ap.add_argument("--s-gpt", type=float, default=DEFAULTS["s_gpt"], help="expert sensitivity when --expert none")
+    args = ap.parse_args(argv)
+
+    params = {k: getattr(args, k) for k in DEFAULTS}
+    dirs = run_pipeline(args.until, args.force, **params)
+    last = list(dirs)[-1]
+    if last == "partition":
+        print(json.dumps(_load_json(dirs["partition"] / "counts.json")))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
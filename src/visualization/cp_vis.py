@@ -4,7 +4,9 @@ import matplotlib.pyplot as plt
 from pathlib import Path
 import numpy as np
 import matplotlib.pyplot as plt
+from src.instrumentation import instrument
 
+@instrument(rows="df_cp")
 def plot_cp_results(df_cp, total_size: int, s_gpt: float, save_path: Path | None=None):
     xs = np.asarray(df_cp["alpha"], dtype=float)
     jitter = 0.002
@@ -46,6 +48,7 @@ def plot_cp_results(df_cp, total_size: int, s_gpt: float, save_path: Path | None
     plt.close()
 
 
+@instrument(rows="df_cp")
 def plot_cp_gpt_measured(df_cp, total_size: int, save_path: Path | None=None):
     xs = np.asarray(df_cp["alpha"], dtype=float)
     jitter = 0.003
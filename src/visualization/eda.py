@@ -4,6 +4,7 @@ from pathlib import Path
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
+from src.instrumentation import instrument
 
 CONT_COLS = ["age", "ocular_pressure", "MD", "PSD", "cornea_thickness", "RNFL4.mean"]
 CAT_COLS  = ["RL", "GHT"]
@@ -13,6 +14,7 @@ def _ensure_dir(p: Path | str | None):
     if p is None: return
     Path(p).parent.mkdir(parents=True, exist_ok=True)
 
+@instrument(rows="df")
 def plot_label_distribution(df: pd.DataFrame, save_path: Path | None = None):
     counts = df[LABEL_COL].value_counts().sort_index()
     props  = counts / counts.sum()
@@ -27,6 +29,7 @@ def plot_label_distribution(df: pd.DataFrame, save_path: Path | None = None):
     else: plt.show()
     plt.close()
 
+@instrument(rows="df")
 def plot_continuous_hists_by_label(df: pd.DataFrame, cols=CONT_COLS, bins=20, save_path: Path | None=None):
     pos = df[df[LABEL_COL]==1]; neg = df[df[LABEL_COL]==0]
     n = len(cols)
@@ -42,19 +45,21 @@ def plot_continuous_hists_by_label(df: pd.DataFrame, cols=CONT_COLS, bins=20, sa
     else: plt.show()
     plt.close()
 
+@instrument(rows="df")
 def plot_violin_by_label(df: pd.DataFrame, cols=("MD","PSD","RNFL4.mean"), save_path: Path | None=None):
     n = len(cols)
     fig, axes = plt.subplots(1, n, figsize=(4.2*n, 4))
     if n==1: axes=[axes]
     for ax, col in zip(axes, cols):
         data = [df[df[LABEL_COL]==0][col].values, df[df[LABEL_COL]==1][col].values]
-        ax.boxplot(data, labels=["0","1"], showfliers=True)
+        ax.boxplot(data, showfliers=True); ax.set_xticks([1, 2], ["0","1"])
         ax.set_title(f"{col} by label"); ax.set_xlabel("glaucoma"); ax.set_ylabel(col)
     plt.tight_layout()
     if save_path: _ensure_dir(save_path); plt.savefig(save_path, dpi=180)
     else: plt.show()
     plt.close()
 
+@instrument(rows="df")
 def plot_categorical_counts_by_label(df: pd.DataFrame, cols=CAT_COLS, save_path: Path | None=None):
     n = len(cols)
     fig, axes = plt.subplots(1, n, figsize=(4.2*n, 4))
@@ -72,6 +77,7 @@ def plot_categorical_counts_by_label(df: pd.DataFrame, cols=CAT_COLS, save_path:
     else: plt.show()
     plt.close()
 
+@instrument(rows="df")
 def plot_corr_heatmap(df: pd.DataFrame, cols=CONT_COLS, save_path: Path | None=None):
     M = df[cols].corr(method="spearman")
     fig, ax = plt.subplots(figsize=(5.8,5.2))
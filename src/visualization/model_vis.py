@@ -6,6 +6,7 @@ import matplotlib.pyplot as plt
 import pandas as pd
 from sklearn.metrics import confusion_matrix
 from sklearn.calibration import calibration_curve
+from src.instrumentation import instrument
 
 
 def _extract_y(y):
@@ -16,6 +17,7 @@ def _extract_y(y):
     return np.asarray(y).astype(int).ravel()
 
 
+@instrument(rows="y_true")
 def plot_confusion_matrix(y_true, y_pred, save_path: Path | None=None, title="Confusion Matrix"):
     y_true = _extract_y(y_true)
     y_pred = _extract_y(y_pred)
@@ -39,6 +41,7 @@ def plot_confusion_matrix(y_true, y_pred, save_path: Path | None=None, title="Co
     plt.close()
 
 
+@instrument(rows="y_true")
 def plot_prob_distribution(y_true, proba_pos, save_path: Path | None=None, threshold: float = 0.5,
                            highlight_range: tuple[float,float]=(0.4,0.6)):
     y_true = _extract_y(y_true)
@@ -65,9 +68,11 @@ def plot_prob_distribution(y_true, proba_pos, save_path: Path | None=None, thres
     plt.close()
 
 
+@instrument(rows="X_test")
 def plot_calibration(pipeline, X_test, y_test, n_bins: int = 10, save_path: Path | None=None,
-                     highlight_range: tuple[float,float]=(0.3,0.7)):
-    proba = pipeline.predict_proba(X_test)[:, 1]
+                     highlight_range: tuple[float,float]=(0.3,0.7), proba_pos=None):
+    # pass proba_pos to reuse already computed scores instead of predicting again
+    proba = pipeline.predict_proba(X_test)[:, 1] if proba_pos is None else np.asarray(proba_pos)
     frac_pos, mean_pred = calibration_curve(_extract_y(y_test), proba, n_bins=n_bins, strategy="quantile")
 
     fig, ax = plt.subplots(figsize=(4.8, 4.8))
@@ -90,6 +95,7 @@ def plot_calibration(pipeline, X_test, y_test, n_bins: int = 10, save_path: Path
     plt.close()
 
 
+@instrument
 def plot_logreg_coeffs(pipeline, feature_names: list[str], top_k: int = 12, save_path: Path | None=None):
     clf = None
     for _, step in pipeline.named_steps.items():
@@ -0,0 +1,218 @@
+from __future__ import annotations
+import hashlib
+import importlib
+import inspect
+import json
+import multiprocessing as mp
+import pickle
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+
+PROJECT_ROOT = Path(__file__).resolve().parents[2]
+BUILD_DIR = PROJECT_ROOT / "reports" / "build" / "figures"
+HASH_FILE = ".figure_hashes.json"
+
+
+@dataclass
+class FigureSpec:
+    """One figure: ``func`` is "module:function" under src.visualization, called with ``kwargs`` + ``save_path``.
+
+    With ``downsample`` set, array-like kwargs sharing the leading length are
+    subsampled to at most ``max_points`` rows (stratified on ``glaucoma`` when a
+    DataFrame carries it) before plotting; used for histograms/violins.
+    """
+    name: str
+    func: str
+    kwargs: Dict = field(default_factory=dict)
+    downsample: bool = False
+
+
+def _resolve(func: str):
+    module, name = func.split(":")
+    return getattr(importlib.import_module(f"src.visualization.{module}"), name)
+
+
+def _hash_value(h, v):
+    if isinstance(v, pd.DataFrame):
+        h.update(pickle.dumps(list(v.columns)))
+        h.update(pd.util.hash_pandas_object(v, index=True).to_numpy().tobytes())
+    elif isinstance(v, pd.Series):
+        h.update(pd.util.hash_pandas_object(v, index=True).to_numpy().tobytes())
+    elif isinstance(v, np.ndarray):
+        h.update(str((v.dtype, v.shape)).encode())
+        h.update(np.ascontiguousarray(v).tobytes() if v.dtype != object else pickle.dumps(v.tolist()))
+    elif isinstance(v, (list, tuple)):
+        for x in v:
+            _hash_value(h, x)
+    elif isinstance(v, (str, int, float, bool, type(None), Path)):
+        h.update(repr(v).encode())
+    else:
+        h.update(pickle.dumps(v))  # e.g. a fitted pipeline
+
+
+def spec_hash(spec: FigureSpec, max_points: int) -> str:
+    h = hashlib.sha256()
+    h.update(spec.func.encode())
+    h.update(inspect.getsource(_resolve(spec.func)).encode())  # re-render when the plot code changes
+    h.update(repr((spec.downsample, max_points if spec.downsample else None)).encode())
+    for k in sorted(spec.kwargs):
+        h.update(k.encode())
+        _hash_value(h, spec.kwargs[k])
+    return h.hexdigest()
+
+
+def _downsample(kwargs: Dict, max_points: int, seed: int = 0) -> Dict:
+    lengths = {len(v) for v in kwargs.values() if isinstance(v, (pd.DataFrame, pd.Series, np.ndarray))}
+    if len(lengths) != 1 or next(iter(lengths)) <= max_points:
+        return kwargs
+    n = lengths.pop()
+    rng = np.random.default_rng(seed)
+    label = next((v["glaucoma"].to_numpy() for v in kwargs.values()
+                  if isinstance(v, pd.DataFrame) and "glaucoma" in v.columns), None)
+    if label is None:
+        idx = np.sort(rng.choice(n, max_points, replace=False))
+    else:
+        # keep class proportions
+        parts = []
+        for c in np.unique(label):
+            rows = np.flatnonzero(label == c)
+            k = max(1, int(round(max_points * len(rows) / n)))
+            parts.append(rng.choice(rows, min(k, len(rows)), replace=False))
+        idx = np.sort(np.concatenate(parts))
+    out = {}
+    for k, v in kwargs.items():
+        if isinstance(v, (pd.DataFrame, pd.Series)):
+            out[k] = v.iloc[idx]
+        elif isinstance(v, np.ndarray) and len(v) == n:
+            out[k] = v[idx]
+        else:
+            out[k] = v
+    return out
+
+
+def _init_worker():
+    # pool initializer only: worker processes are ours to configure
+    import matplotlib
+    matplotlib.use("Agg", force=True)
+    warnings.filterwarnings("ignore", message=".*non-interactive.*")
+
+
+@contextmanager
+def _agg_backend():
+    """Switch pyplot to Agg for in-process rendering and restore the caller's backend afterwards.
+
+    Switching backends closes open pyplot figures, as ``plt.switch_backend`` always does.
+    """
+    import matplotlib
+    import matplotlib.pyplot as plt
+    old = matplotlib.get_backend()
+    switch = old.lower() != "agg"
+    if switch:
+        plt.switch_backend("Agg")
+    try:
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", message=".*non-interactive.*")
+            yield
+    finally:
+        if switch:
+            plt.switch_backend(old)
+
+
+def _render(spec: FigureSpec, save_path: str, max_points: int) -> str:
+    import matplotlib.pyplot as plt
+    kwargs = _downsample(spec.kwargs, max_points) if spec.downsample else spec.kwargs
+    _resolve(spec.func)(**kwargs, save_path=Path(save_path))
+    plt.close("all")
+    return spec.name
+
+
+def build_report(specs: List[FigureSpec], out_dir: Path = BUILD_DIR, n_jobs: Optional[int] = None,
+                 max_points: int = 50_000, force: bool = False) -> Dict[str, str]:
+    """Render ``specs`` to ``out_dir/<name>.png`` with the Agg backend, in parallel, skipping unchanged figures.
+
+    A figure is unchanged when its file exists and the hash of its function
+    source, inputs and parameters matches the one stored in ``.figure_hashes.json``.
+    Returns ``{name: "rendered" | "skipped"}``.
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    hash_path = out_dir / HASH_FILE
+    known = json.loads(hash_path.read_text()) if hash_path.exists() else {}
+
+    status, todo, hashes = {}, [], {}
+    for spec in specs:
+        path = out_dir / f"{spec.name}.png"
+        hashes[spec.name] = spec_hash(spec, max_points)
+        if not force and path.exists() and known.get(spec.name) == hashes[spec.name]:
+            status[spec.name] = "skipped"
+        else:
+            todo.append((spec, str(path)))
+
+    if n_jobs == 1 or len(todo) <= 1:
+        with _agg_backend():
+            for spec, path in todo:
+                _render(spec, path, max_points)
+    elif todo:
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=mp.get_context("spawn"),
+                                 initializer=_init_worker) as ex:
+            list(ex.map(_render, *zip(*todo), [max_points] * len(todo)))
+    for spec, _ in todo:
+        status[spec.name] = "rendered"
+        known[spec.name] = hashes[spec.name]
+    hash_path.write_text(json.dumps(known, indent=2, sort_keys=True))
+    return status
+
+
+def notebook_report_specs(raw_df: pd.DataFrame, test_df: pd.DataFrame, pipe, df_cp: Optional[pd.DataFrame] = None,
+                          s_gpt: float = 0.9) -> List[FigureSpec]:
+    """The EDA, baseline and CP figures produced by conformal_prediction.ipynb."""
+    from src.data.preprocess import split_X_y
+    X_test, y_test = split_X_y(test_df)
+    proba = pipe.predict_proba(X_test)
+    yhat = proba.argmax(axis=1)
+    specs = [
+        FigureSpec("eda_label_distribution", "eda:plot_label_distribution", {"df": raw_df}),
+        FigureSpec("eda_continuous_hists", "eda:plot_continuous_hists_by_label", {"df": raw_df, "bins": 35}, downsample=True),
+        FigureSpec("eda_violin", "eda:plot_violin_by_label", {"df": raw_df, "cols": ("MD", "PSD", "RNFL4.mean")}, downsample=True),
+        FigureSpec("eda_categorical_counts", "eda:plot_categorical_counts_by_label", {"df": raw_df, "cols": ["RL", "GHT"]}),
+        FigureSpec("eda_corr_heatmap", "eda:plot_corr_heatmap", {"df": raw_df}),
+        FigureSpec("baseline_confusion", "model_vis:plot_confusion_matrix", {"y_true": y_test, "y_pred": yhat}),
+        FigureSpec("baseline_probdist", "model_vis:plot_prob_distribution", {"y_true": y_test, "proba_pos": proba[:, 1]},
+                   downsample=True),
+        FigureSpec("baseline_calibration", "model_vis:plot_calibration", {"pipeline": pipe, "X_test": X_test, "y_test": y_test}),
+    ]
+    if df_cp is not None:
+        specs.append(FigureSpec("cp_fn_coverage", "cp_vis:plot_cp_results",
+                                {"df_cp": df_cp, "total_size": len(test_df), "s_gpt": s_gpt}))
+    return specs
+
+
+def main(out_dir: Path = BUILD_DIR):
+    from src.data.create_dataset import RAW_CSV, PROCESSED_DIR
+    from src.evaluation.metrics import new_errors
+    from src.models.baseline import train_logreg, evaluate
+    from src.models.conformal_prediction import cp_sweep
+
+    raw = pd.read_csv(RAW_CSV)
+    train, calib, test = (pd.read_pickle(PROCESSED_DIR / f"{n}.pkl") for n in ("train", "calib", "test"))
+    pipe = train_logreg(train)
+    df_cp = pd.DataFrame(cp_sweep(pipe, calib, test, [0.05, 0.10, 0.15, 0.20, 0.30]))
+    df_cp["FN_baseline"] = evaluate(pipe, test)[0]["FN"]
+    s_gpt = 0.9
+    df_cp["FN_oracle"] = df_cp["FN_confident"]
+    df_cp["FN_gpt"] = new_errors(df_cp["FN_confident"], df_cp["FP_confident"], df_cp["U_pos"], df_cp["U_neg"],
+                                 s_gpt, 1.0)[0]
+    status = build_report(notebook_report_specs(raw, test, pipe, df_cp, s_gpt), out_dir=out_dir)
+    for name, st in status.items():
+        print(f"{st:>8}  {name}")
+    print("Figures in:", out_dir)
+
+
+if __name__ == "__main__":
+    main()
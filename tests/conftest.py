@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data.preprocess import CONT_COLS
+
+
+def _make_df(n: int = 400, seed: int = 0) -> pd.DataFrame:
+    """Synthetic frame with the raw dataset's columns and dtypes (RL strings, GHT ints)."""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({c: rng.normal(size=n) for c in CONT_COLS})
+    df["RL"] = rng.choice(["OD", "OS"], size=n)
+    df["GHT"] = rng.integers(0, 3, size=n)
+    z = df["MD"] - df["PSD"] + 0.8 * (df["GHT"] == 2) + rng.normal(scale=0.8, size=n)
+    df["glaucoma"] = (z > 0).astype(int)
+    return df
+
+
+@pytest.fixture
+def make_df():
+    return _make_df
@@ -0,0 +1,25 @@
+import numpy as np
+
+from src.models.baseline import evaluate, train_logreg, train_logreg_streaming
+
+
+def test_streaming_lbfgs_reproduces_train_logreg(make_df, tmp_path):
+    train = make_df(2000, seed=0)
+    ref = train_logreg(train)
+    chunks = lambda: (train.iloc[i:i + 333] for i in range(0, len(train), 333))  # noqa: E731
+    got = train_logreg_streaming(chunks)
+    np.testing.assert_allclose(got[-1].coef_, ref[-1].coef_, atol=1e-8)
+    np.testing.assert_allclose(got[-1].intercept_, ref[-1].intercept_, atol=1e-8)
+
+    path = tmp_path / "train.csv"
+    train.to_csv(path, index=False)
+    from_csv = train_logreg_streaming(path, chunksize=500)
+    np.testing.assert_allclose(from_csv[-1].coef_, ref[-1].coef_, atol=1e-8)
+
+
+def test_streaming_sgd_is_approximately_as_accurate(make_df):
+    train, test = make_df(2000, seed=0), make_df(1000, seed=1)
+    chunks = lambda: (train.iloc[i:i + 500] for i in range(0, len(train), 500))  # noqa: E731
+    sgd = train_logreg_streaming(chunks, solver="sgd")
+    acc_ref = evaluate(train_logreg(train), test)[0]["ACC"]
+    assert evaluate(sgd, test)[0]["ACC"] >= acc_ref - 0.05
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.metrics import accuracy_score, confusion_matrix, precision_recall_fscore_support, roc_auc_score
+
+from src.evaluation.bootstrap_baseline import bootstrap_baseline
+
+
+def _reference(y_true, proba_pos, n_boot, threshold=0.5, random_state=42):
+    # the per-replicate sklearn loop bootstrap_baseline replaced
+    rng = np.random.default_rng(random_state)
+    rows = []
+    for _ in range(n_boot):
+        idx = rng.integers(0, len(y_true), size=len(y_true))
+        y, p = y_true[idx], proba_pos[idx]
+        y_hat = (p >= threshold).astype(int)
+        tn, fp, fn, tp = confusion_matrix(y, y_hat, labels=[0, 1]).ravel()
+        precision, recall, f1, _ = precision_recall_fscore_support(y, y_hat, average="binary", zero_division=0)
+        rows.append({"ACC": accuracy_score(y, y_hat),
+                     "AUROC": roc_auc_score(y, p) if len(np.unique(y)) == 2 else np.nan,
+                     "TP": tp, "FP": fp, "TN": tn, "FN": fn,
+                     "RECALL": recall, "PRECISION": precision, "F1": f1})
+    return pd.DataFrame(rows)
+
+
+@pytest.mark.parametrize("chunk_size", [None, 7])
+def test_bootstrap_baseline_matches_per_replicate_loop(chunk_size):
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 2, 120)
+    p = np.round(np.clip(0.35 * y + 0.65 * rng.random(120), 0, 1), 2)  # tied scores
+    df, summary = bootstrap_baseline(y, p, n_boot=60, chunk_size=chunk_size)
+    ref = _reference(y, p, 60)
+    pd.testing.assert_frame_equal(df.astype(float), ref.astype(float), check_exact=False, rtol=1e-12, atol=1e-12)
+    np.testing.assert_allclose(summary["mean"], ref.mean(), rtol=1e-12)
+
+
+def test_groups_must_match_cases():
+    with pytest.raises(ValueError):
+        bootstrap_baseline(np.r_[0, 1, 1], np.r_[0.2, 0.7, 0.9], n_boot=5, groups=np.r_[0, 1])
@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data.preprocess import split_X_y
+from src.models.baseline import train_logreg
+from src.models.conformal_prediction import (
+    calibrate_threshold, calibrate_threshold_from_proba, cp_partition, cp_partition_from_proba, cp_sweep,
+    cp_sweep_from_proba, load_scores, mondrian_calibrate_from_proba, mondrian_partition_from_proba,
+    mondrian_sweep_from_proba, summarize_counts, summarize_counts_by_stratum, StreamingCalibrator,
+)
+
+ALPHAS = [0.01, 0.05, 0.1, 0.2, 0.3, 0.5, 0.9]
+
+
+@pytest.fixture
+def fitted(make_df):
+    return train_logreg(make_df(400, seed=0)), make_df(300, seed=1), make_df(500, seed=2)
+
+
+def _reference_counts(pipe, calib, test, alpha):
+    # the per-alpha calibrate_threshold -> cp_partition -> summarize_counts loop cp_sweep replaced
+    Xc, yc = split_X_y(calib)
+    pc = pipe.predict_proba(Xc)
+    q = float(np.quantile(1.0 - pc[np.arange(len(yc)), yc], 1.0 - alpha, method="higher"))
+    X, y = split_X_y(test)
+    p = pipe.predict_proba(X)
+    region = np.where((1.0 - p.max(axis=1)) <= q, "C", "U")
+    return {"q": q, "region": region, **summarize_counts(y, p.argmax(axis=1), region)}
+
+
+def test_cp_sweep_matches_per_alpha_loop(fitted):
+    pipe, calib, test = fitted
+    sweep = cp_sweep(pipe, calib, test, ALPHAS, return_masks=True)
+    frame = pd.DataFrame({k: v for k, v in sweep.items() if k != "C_mask"})
+    for i, alpha in enumerate(ALPHAS):
+        ref = _reference_counts(pipe, calib, test, alpha)
+        assert sweep["q"][i] == ref.pop("q")
+        np.testing.assert_array_equal(sweep["C_mask"][i], ref.pop("region") == "C")
+        assert frame.iloc[i].drop(["alpha", "q"]).astype(int).to_dict() == ref
+
+
+def test_score_level_api_matches_model_level(fitted, tmp_path):
+    pipe, calib, test = fitted
+    Xc, yc = split_X_y(calib)
+    X, y = split_X_y(test)
+    pc, p = pipe.predict_proba(Xc), pipe.predict_proba(X)
+    np.save(tmp_path / "p.npy", p[:, 1])
+    p_pos = load_scores(tmp_path / "p.npy")  # memory-mapped positive-class column
+
+    for alpha in (0.05, 0.3):
+        q = calibrate_threshold(pipe, calib, alpha)
+        assert calibrate_threshold_from_proba(pc, yc, alpha) == q
+        assert calibrate_threshold_from_proba(pc[:, 1], yc, alpha) == q
+        ref = cp_partition(pipe, test, q)
+        for proba in (p, p_pos):
+            part = cp_partition_from_proba(proba, q, y)
+            np.testing.assert_array_equal(part["region"], ref["region"])
+            np.testing.assert_array_equal(part["y_pred"], ref["y_pred"])
+
+    ref = cp_sweep(pipe, calib, test, ALPHAS)
+    got = cp_sweep_from_proba(pc[:, 1], yc, p_pos, y, ALPHAS)
+    for k in ref:
+        np.testing.assert_array_equal(got[k], ref[k])
+
+
+def _stream(cal, scores, sizes):
+    for chunk in np.split(scores, np.cumsum(sizes)[:-1]):
+        cal.update(chunk)
+    return cal
+
+
+def test_streaming_calibrator_exact_and_windowed_match_quantile():
+    rng = np.random.default_rng(0)
+    scores = np.round(rng.random(5000), 3)  # ties included
+    sizes = rng.multinomial(len(scores), np.ones(23) / 23)
+    exact = _stream(StreamingCalibrator(), scores, sizes)
+    windowed = _stream(StreamingCalibrator(window=1234), scores, sizes)
+    assert len(windowed) == 1234
+    assert not exact._chunks  # unwindowed: no chunk history kept next to the sorted buffer
+    for alpha in ALPHAS:
+        assert exact.threshold(alpha) == np.quantile(scores, 1 - alpha, method="higher")
+        assert windowed.threshold(alpha) == np.quantile(scores[-1234:], 1 - alpha, method="higher")
+
+
+def test_streaming_calibrator_binned_is_within_eps_above(fitted):
+    rng = np.random.default_rng(1)
+    scores = rng.beta(0.5, 3.0, 20000)
+    binned = _stream(StreamingCalibrator(eps=1e-3), scores, [5000] * 4)
+    for alpha in ALPHAS:
+        q = np.quantile(scores, 1 - alpha, method="higher")
+        assert q <= binned.threshold(alpha) <= q + 1e-3
+
+    pipe, calib, _ = fitted
+    Xc, yc = split_X_y(calib)
+    cal = StreamingCalibrator().update_from_proba(pipe.predict_proba(Xc), yc)
+    assert cal.threshold(0.1) == calibrate_threshold(pipe, calib, 0.1)
+
+
+def test_mondrian_thresholds_are_per_stratum_quantiles():
+    rng = np.random.default_rng(0)
+    p1 = rng.random(400)
+    proba, y, ght = np.column_stack([1 - p1, p1]), rng.integers(0, 2, 400), rng.integers(0, 3, 400)
+    A = 1.0 - proba[np.arange(400), y]
+    th = mondrian_calibrate_from_proba(proba, y, ALPHAS, groups=ght)
+    for k, (cls, g) in enumerate(th.keys):
+        ref = np.quantile(A[(y == cls) & (ght == g)], 1.0 - np.asarray(ALPHAS), method="higher")
+        np.testing.assert_array_equal(th.q[k], ref)
+
+    # a single stratum is marginal CP
+    one = mondrian_calibrate_from_proba(proba, y, ALPHAS, groups=np.zeros(400), by_class=False)
+    np.testing.assert_array_equal(one.q[0], [calibrate_threshold_from_proba(proba, y, a) for a in ALPHAS])
+
+
+def test_mondrian_sweep_matches_per_alpha_partition():
+    rng = np.random.default_rng(1)
+    pc, p = rng.random(300), rng.random(500)
+    proba_c, proba = np.column_stack([1 - pc, pc]), np.column_stack([1 - p, p])
+    yc, y = rng.integers(0, 2, 300), rng.integers(0, 2, 500)
+    gc, g = rng.integers(0, 3, 300), rng.integers(0, 4, 500)  # group 3 is unseen at calibration
+    sweep = mondrian_sweep_from_proba(proba_c, yc, proba, y, ALPHAS, groups_calib=gc, groups=g)
+
+    th = mondrian_calibrate_from_proba(proba_c, yc, ALPHAS, groups=gc)
+    keys = list(th.keys) + ["<unseen>"]
+    for i, alpha in enumerate(ALPHAS):
+        part = mondrian_partition_from_proba(proba, th, groups=g, y=y, alpha_idx=i)
+        ref = summarize_counts_by_stratum(y, part["y_pred"], part["region"], part["stratum"],
+                                          proba=proba, q=part["q"])
+        ref["stratum"] = [keys[c] for c in ref["stratum"]]
+        got = sweep[sweep["alpha"] == alpha].set_index("stratum")
+        ref = ref.set_index("stratum").loc[got.index]
+        for col in ("TP_confident", "FN_confident", "FP_confident", "TN_confident", "U_pos", "U_neg",
+                    "C_size", "U_size"):
+            np.testing.assert_array_equal(got[col].to_numpy(), ref[col].to_numpy(), err_msg=col)
+        np.testing.assert_allclose(got["coverage"], ref["coverage"])
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data import create_dataset
+from src.data.patient_groups import derive_patient_ids
+
+
+@pytest.fixture
+def raw_csv(make_df, tmp_path, monkeypatch):
+    # OD row followed by the OS row of the same patient (same age), as in ds_whole.csv
+    df = make_df(300, seed=0)
+    df["RL"] = np.tile(["OD", "OS"], 150)
+    df["age"] = np.repeat(np.arange(30, 180), 2)
+    df["cornea_thickness"] = np.arange(300) + 500
+    df = df[["RL", "glaucoma"] + [c for c in df.columns if c not in ("RL", "glaucoma")]]  # raw column order
+    path = tmp_path / "raw.csv"
+    df.to_csv(path, index=False)
+    monkeypatch.setattr(create_dataset, "RAW_CSV", path)
+    return path
+
+
+def _splits(tmp_path, monkeypatch, grouped):
+    out = tmp_path / ("grouped" if grouped else "plain")
+    monkeypatch.setattr(create_dataset, "PROCESSED_DIR", out)
+    create_dataset.split_and_save(group_by_patient=grouped)
+    return {n: pd.read_pickle(out / f"{n}.pkl") for n in ("train", "calib", "test")}
+
+
+def test_grouped_split_has_no_patient_overlap(raw_csv, tmp_path, monkeypatch):
+    patient = derive_patient_ids(pd.read_csv(raw_csv))
+    splits = _splits(tmp_path, monkeypatch, grouped=True)
+    ids = {n: set(patient[f.index]) for n, f in splits.items()}
+    assert not ids["train"] & ids["calib"]
+    assert not ids["train"] & ids["test"]
+    assert not ids["calib"] & ids["test"]
+    assert sum(len(f) for f in splits.values()) == len(patient)
+
+
+def test_grouped_and_plain_splits_share_layout(raw_csv, tmp_path, monkeypatch):
+    plain = _splits(tmp_path, monkeypatch, grouped=False)
+    grouped = _splits(tmp_path, monkeypatch, grouped=True)
+    for name in plain:
+        assert list(grouped[name].columns) == list(plain[name].columns)
+        assert list(grouped[name].columns)[-1] == "glaucoma"
+        assert (grouped[name].dtypes == plain[name].dtypes).all()
+        assert type(grouped[name].index) is type(plain[name].index)
@@ -0,0 +1,37 @@
+import numpy as np
+from sklearn.model_selection import StratifiedKFold
+
+from src.data.preprocess import split_X_y
+from src.models.cross_conformal import CrossConformal
+
+
+def test_fold_scores_and_p_values_match_fold_pipelines(make_df, tmp_path):
+    train, test = make_df(300, seed=0), make_df(120, seed=1)
+    cc = CrossConformal(n_folds=4, random_state=3).fit(train)
+    X, y = split_X_y(train)
+    Xt, _ = split_X_y(test)
+    p_k = np.column_stack([pipe.predict_proba(Xt)[:, 1] for pipe in cc.pipes])
+    np.testing.assert_allclose(cc.predict_proba(Xt)[:, 1], p_k.mean(axis=1), atol=1e-12)
+
+    # out-of-fold scores: fold k's own model on its held-out rows, sorted within the fold
+    folds = [te for _, te in StratifiedKFold(4, shuffle=True, random_state=3).split(X, y)]
+    ref = []
+    for pipe, te in zip(cc.pipes, folds):
+        p = pipe.predict_proba(X.iloc[te])
+        ref.append(np.sort((1.0 - p[np.arange(len(te)), y[te]]).astype(np.float32)))
+    np.testing.assert_allclose(cc.oof_scores, np.concatenate(ref), atol=1e-6)
+
+    # p-value by direct counting over every fold
+    yhat = (p_k.mean(axis=1) > 0.5).astype(int)
+    s_k = (1.0 - np.where(yhat[:, None] == 1, p_k, 1.0 - p_k)).astype(np.float32)
+    off = cc.fold_offsets
+    ge = sum((cc.oof_scores[off[k]:off[k + 1]][None, :] >= s_k[:, k:k + 1]).sum(axis=1)
+             for k in range(4))
+    out = cc.p_values(Xt)
+    np.testing.assert_array_equal(out["y_pred"], yhat)
+    np.testing.assert_array_equal(out["p_value"], (ge + 1.0) / (len(train) + 1.0))
+
+    cc.save_scores(tmp_path / "oof.npz")
+    loaded = CrossConformal(n_folds=4).load_scores(tmp_path / "oof.npz")
+    loaded.scorer = cc.scorer
+    np.testing.assert_array_equal(loaded.partition(test, 0.1)["region"], cc.partition(test, 0.1)["region"])
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.data import create_dataset
+from src.data.dataset_store import MODEL_COLS, build_store, load_split, save_split_indices
+
+
+@pytest.fixture
+def raw_csv(make_df, tmp_path):
+    df = make_df(300, seed=0)
+    df = df[["RL", "glaucoma"] + [c for c in df.columns if c not in ("RL", "glaucoma")]]
+    df.loc[[3, 50], "RL"] = None  # missing strings are stored as code -1
+    path = tmp_path / "raw.csv"
+    df.to_csv(path, index=False)
+    return path
+
+
+def test_store_splits_match_pickled_splits(raw_csv, tmp_path, monkeypatch):
+    monkeypatch.setattr(create_dataset, "RAW_CSV", raw_csv)
+    monkeypatch.setattr(create_dataset, "PROCESSED_DIR", tmp_path / "processed")
+    create_dataset.split_and_save(random_state=7)
+    store = tmp_path / "store"
+    build_store(raw_csv, store)
+    save_split_indices(random_state=7, store_dir=store)
+    for name in ("train", "calib", "test"):
+        ref = pd.read_pickle(tmp_path / "processed" / f"{name}.pkl")[MODEL_COLS]
+        got = load_split(name, random_state=7, store_dir=store)[MODEL_COLS]
+        pd.testing.assert_frame_equal(got, ref)
+
+
+def test_missing_strings_round_trip_as_nan(raw_csv, tmp_path):
+    store = tmp_path / "store"
+    build_store(raw_csv, store)
+    got = load_split("all", cols=["RL"], store_dir=store, rows=np.arange(300))["RL"]
+    ref = pd.read_csv(raw_csv)["RL"]
+    assert got.isna().tolist() == ref.isna().tolist()
+    assert (got[ref.notna()] == ref[ref.notna()]).all()
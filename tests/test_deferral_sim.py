@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+from src.evaluation.deferral_sim import simulate_deferral, surface_frame
+from src.evaluation.metrics import new_errors
+
+SWEEP = pd.DataFrame({
+    "alpha": [0.05, 0.1, 0.3],
+    "FN_confident": [1, 3, 9], "FP_confident": [2, 5, 14],
+    "U_pos": [40, 25, 8], "U_neg": [60, 35, 12], "U_size": [100, 60, 20],
+})
+S, T = [0.6, 0.85, 1.0], [0.7, 0.95]
+
+
+def test_grid_matches_scalar_new_errors():
+    surf = simulate_deferral(SWEEP, S, T, cost_fn=10.0, cost_fp=1.0, cost_expert=0.5)
+    for i, row in SWEEP.iterrows():
+        for j, s in enumerate(S):
+            for k, t in enumerate(T):
+                fn, fp = new_errors(row["FN_confident"], row["FP_confident"], row["U_pos"], row["U_neg"], s, t)
+                assert (surf["FN"][i, j, k], surf["FP"][i, j, k]) == (fn, fp)
+                assert surf["errors"][i, j, k] == fn + fp
+                assert surf["workload"][i, j, k] == row["U_size"]
+                assert surf["cost"][i, j, k] == 10.0 * fn + 1.0 * fp + 0.5 * row["U_size"]
+    assert len(surface_frame(surf)) == len(SWEEP) * len(S) * len(T)
+    assert "cost" not in simulate_deferral(SWEEP, S, T)
+
+
+def test_mc_bands_bracket_expectation():
+    surf = simulate_deferral(SWEEP, S, T, n_sims=2000, random_state=0)
+    assert np.all(surf["FN_lo"] <= surf["FN"]) and np.all(surf["FN"] <= surf["FN_hi"])
+    assert np.all(surf["FP_lo"] <= surf["FP"]) and np.all(surf["FP"] <= surf["FP_hi"])
+    # a perfect expert adds no misses
+    np.testing.assert_array_equal(surf["FN_lo"][:, 2, 0], SWEEP["FN_confident"])
+    np.testing.assert_array_equal(surf["FN_hi"][:, 2, 0], SWEEP["FN_confident"])
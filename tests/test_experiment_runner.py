@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+
+from src.data import create_dataset
+from src.evaluation.experiment_runner import run_experiments
+from src.models.baseline import evaluate, train_logreg
+from src.models.conformal_prediction import cp_sweep
+
+ALPHAS = [0.05, 0.1, 0.3]
+COUNTS = ["TP_confident", "FN_confident", "FP_confident", "TN_confident", "U_pos", "U_neg", "C_size", "U_size"]
+
+
+def test_seed_reproduces_notebook_split_and_counts(tmp_path, monkeypatch):
+    monkeypatch.setattr(create_dataset, "PROCESSED_DIR", tmp_path / "processed")
+    create_dataset.split_and_save(random_state=42)
+    train, calib, test = (pd.read_pickle(tmp_path / "processed" / f"{n}.pkl") for n in ("train", "calib", "test"))
+    pipe = train_logreg(train)
+    ref = pd.DataFrame(cp_sweep(pipe, calib, test, ALPHAS))
+
+    kw = dict(store_dir=tmp_path / "store", cache_dir=tmp_path / "cache")
+    df = run_experiments([42], ALPHAS, expert_s=[0.9], **kw)
+    np.testing.assert_array_equal(df["q"], ref["q"])
+    pd.testing.assert_frame_equal(df[COUNTS].reset_index(drop=True), ref[COUNTS], check_dtype=False)
+    assert (df["FN_baseline"] == evaluate(pipe, test)[0]["FN"]).all()
+    np.testing.assert_allclose(df["FN_expert"], ref["FN_confident"] + 0.1 * ref["U_pos"])
+
+    # second call is served from the artifact cache and returns the same table
+    pd.testing.assert_frame_equal(run_experiments([42], ALPHAS, expert_s=[0.9], **kw), df)
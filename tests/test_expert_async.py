@@ -0,0 +1,37 @@
+import hashlib
+import json
+from types import SimpleNamespace
+
+import numpy as np
+
+from src.models.expert_async import gpt_multiple_runs_concurrent
+from src.models.expert_integration import gpt_multiple_runs
+from src.models.expert_store import MISSING, ExpertRunStore
+
+
+class HashClient:
+    """Sync client whose answer depends only on the prompt; some prompts get no prediction."""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, temperature, messages):
+        h = hashlib.sha256(messages[-1]["content"].encode("utf-8")).digest()
+        pred = None if h[0] % 5 == 0 else h[0] & 1
+        text = json.dumps({"prediction": pred, "confidence": 0.75, "rationale_1_sentence": "x"})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+def test_concurrent_runs_match_sync_runs_and_fill_store(make_df, tmp_path):
+    test_u = make_df(40, seed=3).drop(columns="glaucoma")
+    sync_store = ExpertRunStore.create(tmp_path / "sync", len(test_u), with_confidence=True)
+    conc_store = ExpertRunStore.create(tmp_path / "conc", len(test_u), with_confidence=True)
+    sync = gpt_multiple_runs(HashClient(), "m", test_u, "", n_runs=2, store=sync_store)
+    conc = gpt_multiple_runs_concurrent(HashClient(), "m", test_u, "", n_runs=2, store=conc_store)
+
+    assert conc.dtype == object and conc.shape == sync.shape == (2, len(test_u))
+    assert conc.tolist() == sync.tolist()
+    assert any(p is None for p in conc.ravel())
+    np.testing.assert_array_equal(conc_store.preds, sync_store.preds)
+    np.testing.assert_array_equal(conc_store.confidence, sync_store.confidence)
+    assert (conc_store.preds == MISSING).any()
@@ -0,0 +1,51 @@
+import json
+import re
+from types import SimpleNamespace
+
+import pytest
+
+from src.models.expert_integration import call_gpt_batched
+from src.models.response_cache import CacheMissError, ResponseCache
+
+
+class CountingBatchClient:
+    """Answers every case in a batched prompt with prediction 1 and counts requests."""
+
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, model, temperature, messages):
+        self.calls += 1
+        n = len(re.findall(r"^Case \d+:", messages[-1]["content"], flags=re.M))
+        lines = [json.dumps({"id": i, "prediction": 1, "confidence": 0.9, "rationale_1_sentence": "x"})
+                 for i in range(n)]
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="\n".join(lines)))])
+
+
+CASES = [f"- Age: {50 + i}" for i in range(7)]
+
+
+def test_cached_batched_run_makes_no_calls_second_time(tmp_path):
+    cache = ResponseCache(tmp_path / "cache.sqlite")
+    client = CountingBatchClient()
+    first = call_gpt_batched(client, "m", CASES, "", batch_size=3, cache=cache, run_index=0)
+    assert client.calls == 3
+    assert len(cache) == len(CASES)
+
+    again = CountingBatchClient()
+    second = call_gpt_batched(again, "m", CASES, "", batch_size=2, cache=cache, run_index=0)
+    assert again.calls == 0
+    assert second == first
+
+
+def test_read_only_replay_raises_on_miss(tmp_path):
+    path = tmp_path / "cache.sqlite"
+    call_gpt_batched(CountingBatchClient(), "m", CASES[:3], "", batch_size=3, cache=ResponseCache(path))
+    replay = ResponseCache(path, read_only=True)
+    client = CountingBatchClient()
+    assert len(call_gpt_batched(client, "m", CASES[:3], "", cache=replay)) == 3
+    assert client.calls == 0
+    with pytest.raises(CacheMissError):
+        call_gpt_batched(client, "m", CASES, "", cache=replay)
+    assert client.calls == 0
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from src.evaluation.metrics import confusion_from_preds, sensitivity_specificity
+from src.models.expert_integration import bootstrap_sensitivity_ci, format_case_cards, format_case_row
+
+
+def _reference_ci(preds_eval, y_true_eval, n_boot=1000, alpha=0.05, random_state=42):
+    # the per-replicate loop bootstrap_sensitivity_ci replaced
+    rng = np.random.default_rng(random_state)
+    n = len(y_true_eval)
+    s_boot = []
+    for _ in range(n_boot):
+        idx = rng.integers(0, n, size=n)
+        pred_b = (preds_eval[:, idx].mean(axis=0) >= 0.5).astype(int)
+        s, _ = sensitivity_specificity(confusion_from_preds(y_true_eval[idx], pred_b))
+        s_boot.append(s)
+    return (float(np.nanpercentile(s_boot, alpha / 2 * 100)),
+            float(np.nanpercentile(s_boot, (1 - alpha / 2) * 100)))
+
+
+@pytest.fixture
+def runs():
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 2, 150)
+    preds = np.where(rng.random((5, 150)) < 0.8, y, 1 - y)
+    return preds, y
+
+
+@pytest.mark.parametrize("chunk_size", [None, 13])
+def test_percentile_ci_matches_per_replicate_loop(runs, chunk_size):
+    preds, y = runs
+    assert bootstrap_sensitivity_ci(preds, y, n_boot=300, chunk_size=chunk_size) == _reference_ci(preds, y, 300)
+
+
+def test_parallel_ci_is_deterministic(runs):
+    preds, y = runs
+    a = bootstrap_sensitivity_ci(preds, y, n_boot=300, n_jobs=2)
+    assert a == bootstrap_sensitivity_ci(preds, y, n_boot=300, n_jobs=2)
+    lo, hi = a
+    assert lo <= sensitivity_specificity(confusion_from_preds(y, (preds.mean(axis=0) >= 0.5).astype(int)))[0] <= hi
+
+
+def test_case_cards_match_format_case_row(make_df):
+    df = make_df(200, seed=0)
+    num = df.columns.difference(["RL", "GHT", "glaucoma"])
+    df[num] = df[num] * 50.0  # negative and fractional values exercise int() truncation
+    ref = [format_case_row(r) for _, r in df.iterrows()]
+    assert format_case_cards(df, cache=None) == ref
+
+    cache = {}
+    assert format_case_cards(df, cache=cache) == ref
+    assert format_case_cards(df.iloc[::-1], cache=cache) == ref[::-1]  # served from the memo
+    legacy = df.rename(columns={"RNFL4.mean": "RNFL.mean"})
+    assert format_case_cards(legacy, cache=None) == [format_case_row(r) for _, r in legacy.iterrows()]
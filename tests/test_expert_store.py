@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from src.evaluation.metrics import confusion_from_preds, sensitivity_specificity
+from src.models.expert_integration import evaluate_gpt_runs
+from src.models.expert_store import MISSING, case_votes, evaluate_runs, fleiss_kappa
+
+
+def _reference_runs(all_preds, y_true):
+    # the object-array loop evaluate_gpt_runs replaced
+    mask_valid = ~np.any(all_preds == None, axis=0)  # noqa: E711
+    y_eval = y_true[mask_valid]
+    preds_eval = np.asarray(all_preds[:, mask_valid], dtype=int)
+    s = [sensitivity_specificity(confusion_from_preds(y_eval, r))[0] for r in preds_eval]
+    return np.asarray(s), y_eval, preds_eval
+
+
+def _reference_kappa(preds):
+    # Fleiss' kappa from the (cases x categories) rating table, complete cases only
+    preds = preds[:, np.all(preds != MISSING, axis=0)]
+    R = preds.shape[0]
+    table = np.column_stack([(preds == 0).sum(axis=0), (preds == 1).sum(axis=0)])
+    P_i = ((table ** 2).sum(axis=1) - R) / (R * (R - 1))
+    p_j = table.sum(axis=0) / table.sum()
+    P_e = (p_j ** 2).sum()
+    return (P_i.mean() - P_e) / (1 - P_e)
+
+
+@pytest.fixture
+def runs():
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 2, 200)
+    preds = np.where(rng.random((5, 200)) < 0.8, y, 1 - y).astype(object)
+    preds[rng.random((5, 200)) < 0.05] = None
+    return preds, y
+
+
+def test_evaluate_gpt_runs_matches_object_loop(runs):
+    preds, y = runs
+    ref = _reference_runs(preds, y)
+    as_int8 = np.where(preds == None, MISSING, preds).astype(np.int8)  # noqa: E711
+    for arg in (preds, as_int8):
+        for got, want in zip(evaluate_gpt_runs(arg, y), ref):
+            np.testing.assert_array_equal(got, want)
+
+
+def test_fleiss_kappa_and_missing_run(runs):
+    preds, y = runs
+    as_int8 = np.where(preds == None, MISSING, preds).astype(np.int8)  # noqa: E711
+    n_pos, n_valid = case_votes(as_int8)
+    assert fleiss_kappa(n_pos, n_valid, 5) == pytest.approx(_reference_kappa(as_int8), abs=1e-12)
+
+    as_int8[2] = MISSING  # one run never answered
+    out = evaluate_runs(as_int8, y)
+    assert out["n_complete"] == 0 and np.isnan(out["fleiss_kappa"])
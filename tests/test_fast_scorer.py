@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from src.data.preprocess import split_X_y
+from src.models.baseline import train_logreg
+from src.models.fast_scorer import FusedLogRegScorer, StackedLogRegScorer
+
+
+def _with_missing_and_unseen(X):
+    X = X.copy()
+    X["GHT"] = X["GHT"].astype(float)
+    X.loc[X.index[:5], "GHT"] = np.nan
+    X.loc[X.index[5:10], "GHT"] = 7
+    X["RL"] = X["RL"].astype(object)
+    X.loc[X.index[10:15], "RL"] = None
+    X.loc[X.index[15:20], "RL"] = "OU"
+    return X
+
+
+@pytest.mark.filterwarnings("ignore:Found unknown categories")
+def test_fused_scorer_matches_pipeline_with_nan_and_unseen(make_df):
+    pipe = train_logreg(make_df(400, seed=0))
+    X, _ = split_X_y(make_df(200, seed=1))
+    X = _with_missing_and_unseen(X)
+    fused = FusedLogRegScorer.from_pipeline(pipe)
+    np.testing.assert_allclose(fused.decision_function(X), pipe.decision_function(X), atol=1e-10)
+    assert fused.verify(pipe, X) <= 1e-9
+
+
+@pytest.mark.filterwarnings("ignore:Found unknown categories")
+def test_stacked_scorer_matches_each_pipeline(make_df):
+    pipes = [train_logreg(make_df(300, seed=s)) for s in range(3)]
+    X, _ = split_X_y(make_df(200, seed=9))
+    X = _with_missing_and_unseen(X)
+    z = StackedLogRegScorer.from_pipelines(pipes).decision_function(X)
+    for k, pipe in enumerate(pipes):
+        np.testing.assert_allclose(z[:, k], pipe.decision_function(X), atol=1e-10)
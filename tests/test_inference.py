@@ -0,0 +1,56 @@
+import threading
+import time
+
+import numpy as np
+
+from src.data.preprocess import split_X_y
+from src.models.baseline import train_logreg
+from src.models.conformal_prediction import cp_partition
+from src.models.inference import BatchInferenceService
+
+
+def _mixed_stream(X):
+    # dict rows, DataFrames and structured arrays interleaved, as a live source would send them
+    i = 0
+    while i < len(X):
+        kind = (i // 7) % 3
+        if kind == 0:
+            yield X.iloc[i].to_dict()
+            i += 1
+        elif kind == 1:
+            yield X.iloc[i:i + 5].reset_index(drop=True)
+            i += 5
+        else:
+            yield X.iloc[i:i + 3].to_records(index=False)
+            i += 3
+
+
+def test_stream_output_matches_batch_partition_in_order(make_df):
+    pipe = train_logreg(make_df(400, seed=0))
+    test = make_df(250, seed=1)
+    X, _ = split_X_y(test)
+    ref = cp_partition(pipe, test, 0.3)
+    out = list(BatchInferenceService(pipe, 0.3, batch_size=16).run(_mixed_stream(X)))
+    assert len(out) == len(X)
+    np.testing.assert_allclose([o["proba"] for o in out], ref["proba"][:, 1], rtol=0, atol=1e-12)
+    np.testing.assert_array_equal([o["y_pred"] for o in out], ref["y_pred"])
+    np.testing.assert_array_equal([o["region"] for o in out], ref["region"])
+
+
+def test_early_stop_releases_reader_thread(make_df):
+    pipe = train_logreg(make_df(400, seed=0))
+    X, _ = split_X_y(make_df(50, seed=1))
+
+    def endless():
+        while True:
+            yield X.iloc[0].to_dict()
+
+    before = threading.active_count()
+    gen = BatchInferenceService(pipe, 0.3, batch_size=4).run(endless())
+    for _, _ in zip(range(10), gen):
+        pass
+    gen.close()
+    deadline = time.time() + 2.0
+    while threading.active_count() > before and time.time() < deadline:
+        time.sleep(0.02)
+    assert threading.active_count() == before
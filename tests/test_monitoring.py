@@ -0,0 +1,40 @@
+import numpy as np
+from scipy.stats import ks_2samp
+
+from src.models.monitoring import DriftMonitor, _EPS
+
+
+def _monitor(ref, **kw):
+    kw = {"q": 0.3, "alpha": 0.1, "window": 500, "check_every": 100, "min_rows": 100, **kw}
+    return DriftMonitor(ref, **kw)
+
+
+def test_window_psi_and_ks_match_direct_computation(make_df):
+    ref, live = make_df(2000, seed=0), make_df(1500, seed=1)
+    live["MD"] += 0.5
+    mon = _monitor(ref, check_every=10**9)
+    for start in range(0, len(live), 137):  # odd chunks exercise the ring buffer wrap-around
+        mon.update(live.iloc[start:start + 137])
+    window = live.iloc[-mon.window:]
+    scores = mon.drift_scores().set_index("feature")
+
+    edges = np.r_[-np.inf, mon._edges[mon.cont_cols.index("MD")], np.inf]
+    e = np.histogram(ref["MD"], edges)[0] / len(ref)
+    a = np.histogram(window["MD"], edges)[0] / len(window)
+    a, e = np.maximum(a, _EPS), np.maximum(e, _EPS)
+    assert np.isclose(scores.loc["MD", "psi"], np.sum((a - e) * np.log(a / e)))
+    # binned KS is a lower bound of the exact two-sample statistic
+    assert scores.loc["MD", "ks"] <= ks_2samp(ref["MD"], window["MD"]).statistic + 1e-12
+    np.testing.assert_allclose(scores.loc["MD", "mean"], live["MD"].mean())
+    np.testing.assert_allclose(scores.loc["MD", "std"], live["MD"].std(ddof=1))
+
+
+def test_coverage_alert_fires_from_labels_alone(make_df):
+    mon = _monitor(make_df(1000, seed=0))
+    mon.update(make_df(300, seed=1).drop(columns="glaucoma"))
+    assert not [a for a in mon.alerts if a["kind"] == "coverage"]
+    y = np.random.default_rng(0).integers(0, 2, 300)
+    for start in range(0, 300, 50):  # confident and wrong: nothing is covered
+        yb = y[start:start + 50]
+        mon.observe_labels(np.where(yb == 1, 0.05, 0.95), yb)
+    assert [a for a in mon.alerts if a["kind"] == "coverage"]
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from sklearn.calibration import calibration_curve
+from sklearn.metrics import confusion_matrix, roc_auc_score
+
+from src.evaluation.operating_points import OperatingPoints
+
+
+@pytest.fixture
+def scored():
+    rng = np.random.default_rng(0)
+    y = rng.integers(0, 2, 500)
+    s = np.round(np.clip(0.3 * y + rng.random(500) * 0.7, 0, 1), 2)  # rounding forces ties
+    return y, s
+
+
+def test_counts_and_auroc_match_sklearn(scored):
+    y, s = scored
+    op = OperatingPoints(y, s)
+    assert op.auroc == pytest.approx(roc_auc_score(y, s), abs=1e-12)
+    for th in np.r_[np.unique(s), 0.333, 1.5, -1.0]:
+        tn, fp, fn, tp = confusion_matrix(y, (s >= th).astype(int), labels=[0, 1]).ravel()
+        got = op.at(th)
+        assert (got["TP"], got["FP"], got["TN"], got["FN"]) == (tp, fp, tn, fn)
+    assert len(op.frame()) == len(np.unique(s)) + 1
+
+
+@pytest.mark.parametrize("strategy", ["uniform", "quantile"])
+def test_calibration_matches_calibration_curve(scored, strategy):
+    y, s = scored
+    frac_pos, mean_pred = calibration_curve(y, s, n_bins=8, strategy=strategy)
+    got = OperatingPoints(y, s).calibration(n_bins=8, strategy=strategy)
+    np.testing.assert_allclose(got["frac_pos"], frac_pos, atol=1e-12)
+    np.testing.assert_allclose(got["mean_pred"], mean_pred, atol=1e-12)
+
+
+def test_threshold_for_max_fn(scored):
+    y, s = scored
+    op = OperatingPoints(y, s)
+    th = op.threshold_for_max_fn(10)
+    assert op.at(th)["FN"] <= 10
+    higher = np.unique(s)[np.unique(s) > th]
+    assert higher.size == 0 or op.at(higher.min())["FN"] > 10
+    with pytest.raises(ValueError):
+        op.threshold_for_max_fn(-1)
@@ -0,0 +1,25 @@
+import numpy as np
+import pandas as pd
+
+from src.data.create_dataset import RAW_CSV
+from src.data.patient_groups import GroupIndex, derive_patient_ids
+
+
+def test_ds_whole_patient_count():
+    assert len(np.unique(derive_patient_ids(pd.read_csv(RAW_CSV)))) == 164
+
+
+def test_group_rows_and_bootstrap_weights_match_loops():
+    rng = np.random.default_rng(0)
+    groups = rng.integers(0, 40, 300)
+    gi = GroupIndex(groups)
+    codes = pd.factorize(groups)[0]
+    pick = rng.integers(0, gi.n_groups, 25)
+    np.testing.assert_array_equal(gi.rows(pick), np.concatenate([np.flatnonzero(codes == g) for g in pick]))
+
+    W = gi.bootstrap_weights(np.random.default_rng(1), 20)
+    ref_rng = np.random.default_rng(1)
+    for b in range(20):
+        # one draw of n_groups patients per replicate; every row of a drawn patient counts once per draw
+        drawn = np.bincount(ref_rng.integers(0, gi.n_groups, gi.n_groups), minlength=gi.n_groups)
+        np.testing.assert_array_equal(W[b], drawn[codes])
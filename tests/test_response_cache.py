@@ -0,0 +1,34 @@
+from src.models.response_cache import ResponseCache
+
+
+def test_hits_buffer_access_times_until_flush(tmp_path):
+    cache = ResponseCache(tmp_path / "c.sqlite", flush_every=1000)
+    for k in "abc":
+        cache.put(k, {"prediction": 1})
+    writes = cache._conn.total_changes
+    for _ in range(10):
+        for k in "abc":
+            assert cache.get(k) == {"prediction": 1}
+    assert cache._conn.total_changes == writes  # no write per hit
+    cache.flush()
+    assert cache._conn.total_changes == writes + 3  # one update per distinct key
+    cache.close()
+
+
+def test_buffered_hits_still_drive_lru_eviction(tmp_path):
+    cache = ResponseCache(tmp_path / "c.sqlite", max_entries=2)
+    cache.put("a", {"v": 1})
+    cache.put("b", {"v": 2})
+    cache.get("a")  # a is now more recent than b
+    cache.put("c", {"v": 3})
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": 1}
+
+
+def test_read_only_hits_do_not_touch_access_times(tmp_path):
+    path = tmp_path / "c.sqlite"
+    ResponseCache(path).put("a", {"v": 1})
+    replay = ResponseCache(path, read_only=True, flush_every=1)
+    assert replay.get("a") == {"v": 1}
+    assert replay._touched == {}
+    replay.close()